@@ -0,0 +1,5 @@
+# benchmarks/__init__.py
+
+"""
+Benchmarks for the bug-fixing pipeline (run from the repository root, e.g. `python -m benchmarks.startup`).
+"""
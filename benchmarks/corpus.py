@@ -0,0 +1,439 @@
+"""
+Synthetic bug corpus
+====================
+올바른 Java 클래스 템플릿(StringUtil, Calculator, ArrayUtil, MathUtil)에
+한 줄짜리 mutation(경계 조건, 비교/산술 연산자, boolean 반환값)을 넣어
+N개의 버그 변형과 대응 JUnit 테스트를 만듭니다.
+
+출력 디렉토리 구조 (pipeline의 작업 디렉토리로 바로 사용 가능):
+    <out>/data/target/[bench/pK/]<Class>NNNN.java
+    <out>/data/test/[bench/pK/]<Class>NNNNTest.java
+    <out>/manifest.json   클래스 이름 -> 버그 위치와 정답 줄 (fake LLM oracle용)
+
+Usage:
+    python -m benchmarks.corpus --out /tmp/bench --files 200 [--seed 0] [--packages 10]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+
+TEMPLATES = {
+    'StringUtil': ('''public class StringUtil {
+
+    public static String reverse(String str) {
+        if (str == null || str.isEmpty()) {
+            return str;
+        }
+
+        StringBuilder sb = new StringBuilder();
+        for (int i = str.length() - 1; i >= 0; i--) {
+            sb.append(str.charAt(i));
+        }
+        return sb.toString();
+    }
+
+    public static boolean isPalindrome(String str) {
+        if (str == null || str.isEmpty()) {
+            return true;
+        }
+
+        String lower = str.toLowerCase();
+        int left = 0;
+        int right = lower.length() - 1;
+
+        while (left < right) {
+            if (lower.charAt(left) != lower.charAt(right)) {
+                return false;
+            }
+            left++;
+            right--;
+        }
+        return true;
+    }
+
+    public static int countVowels(String str) {
+        if (str == null || str.isEmpty()) {
+            return 0;
+        }
+
+        int count = 0;
+        String vowels = "aeiouAEIOU";
+
+        for (char c : str.toCharArray()) {
+            if (vowels.indexOf(c) != -1) {
+                count++;
+            }
+        }
+        return count;
+    }
+}
+''', '''import org.junit.Test;
+import static org.junit.Assert.*;
+
+public class StringUtilTest {
+
+    @Test
+    public void testReverse() {
+        assertEquals("olleh", StringUtil.reverse("hello"));
+        assertEquals("a", StringUtil.reverse("a"));
+        assertEquals("", StringUtil.reverse(""));
+        assertNull(StringUtil.reverse(null));
+    }
+
+    @Test
+    public void testIsPalindrome() {
+        assertTrue(StringUtil.isPalindrome("racecar"));
+        assertTrue(StringUtil.isPalindrome("A"));
+        assertFalse(StringUtil.isPalindrome("hello"));
+        assertTrue(StringUtil.isPalindrome("Racecar"));
+    }
+
+    @Test
+    public void testCountVowels() {
+        assertEquals(2, StringUtil.countVowels("hello"));
+        assertEquals(5, StringUtil.countVowels("AEIOU"));
+        assertEquals(0, StringUtil.countVowels("xyz"));
+        assertEquals(5, StringUtil.countVowels("Education"));
+    }
+}
+'''),
+    'Calculator': ('''public class Calculator {
+
+    public int add(int a, int b) {
+        return a + b;
+    }
+
+    public int subtract(int a, int b) {
+        return a - b;
+    }
+
+    public int multiply(int a, int b) {
+        return a * b;
+    }
+
+    public double divide(int a, int b) {
+        if (b == 0) {
+            throw new ArithmeticException("Division by zero");
+        }
+        return (double) a / b;
+    }
+
+    public int factorial(int n) {
+        if (n == 0 || n == 1) {
+            return 1;
+        }
+        int result = 1;
+        for (int i = 2; i <= n; i++) {
+            result *= i;
+        }
+        return result;
+    }
+}
+''', '''import org.junit.Test;
+import static org.junit.Assert.*;
+
+public class CalculatorTest {
+
+    private Calculator calculator = new Calculator();
+
+    @Test
+    public void testAdd() {
+        assertEquals(5, calculator.add(2, 3));
+        assertEquals(-1, calculator.add(-3, 2));
+    }
+
+    @Test
+    public void testSubtract() {
+        assertEquals(2, calculator.subtract(5, 3));
+        assertEquals(-5, calculator.subtract(0, 5));
+    }
+
+    @Test
+    public void testMultiply() {
+        assertEquals(6, calculator.multiply(2, 3));
+        assertEquals(-10, calculator.multiply(-5, 2));
+    }
+
+    @Test
+    public void testDivide() {
+        assertEquals(2.0, calculator.divide(6, 3), 0.001);
+        assertEquals(2.5, calculator.divide(5, 2), 0.001);
+    }
+
+    @Test(expected = ArithmeticException.class)
+    public void testDivideByZero() {
+        calculator.divide(5, 0);
+    }
+
+    @Test
+    public void testFactorial() {
+        assertEquals(1, calculator.factorial(0));
+        assertEquals(1, calculator.factorial(1));
+        assertEquals(120, calculator.factorial(5));
+    }
+}
+'''),
+    'ArrayUtil': ('''public class ArrayUtil {
+
+    public static int indexOf(int[] values, int target) {
+        for (int i = 0; i < values.length; i++) {
+            if (values[i] == target) {
+                return i;
+            }
+        }
+        return -1;
+    }
+
+    public static int max(int[] values) {
+        int best = values[0];
+        for (int i = 1; i < values.length; i++) {
+            if (values[i] > best) {
+                best = values[i];
+            }
+        }
+        return best;
+    }
+
+    public static int sum(int[] values) {
+        int total = 0;
+        for (int value : values) {
+            total += value;
+        }
+        return total;
+    }
+
+    public static boolean isSorted(int[] values) {
+        for (int i = 1; i < values.length; i++) {
+            if (values[i - 1] > values[i]) {
+                return false;
+            }
+        }
+        return true;
+    }
+}
+''', '''import org.junit.Test;
+import static org.junit.Assert.*;
+
+public class ArrayUtilTest {
+
+    @Test
+    public void testIndexOf() {
+        assertEquals(2, ArrayUtil.indexOf(new int[] {4, 5, 6}, 6));
+        assertEquals(0, ArrayUtil.indexOf(new int[] {4, 5, 6}, 4));
+        assertEquals(-1, ArrayUtil.indexOf(new int[] {4, 5, 6}, 7));
+    }
+
+    @Test
+    public void testMax() {
+        assertEquals(9, ArrayUtil.max(new int[] {3, 9, 2}));
+        assertEquals(-1, ArrayUtil.max(new int[] {-5, -1, -3}));
+        assertEquals(7, ArrayUtil.max(new int[] {1, 2, 7}));
+    }
+
+    @Test
+    public void testSum() {
+        assertEquals(10, ArrayUtil.sum(new int[] {1, 2, 3, 4}));
+        assertEquals(0, ArrayUtil.sum(new int[] {}));
+    }
+
+    @Test
+    public void testIsSorted() {
+        assertTrue(ArrayUtil.isSorted(new int[] {1, 2, 2, 5}));
+        assertFalse(ArrayUtil.isSorted(new int[] {3, 1, 2}));
+        assertFalse(ArrayUtil.isSorted(new int[] {1, 2, 0}));
+    }
+}
+'''),
+    'MathUtil': ('''public class MathUtil {
+
+    public static int gcd(int a, int b) {
+        while (b != 0) {
+            int t = a % b;
+            a = b;
+            b = t;
+        }
+        return a;
+    }
+
+    public static boolean isPrime(int n) {
+        if (n < 2) {
+            return false;
+        }
+        for (int i = 2; i * i <= n; i++) {
+            if (n % i == 0) {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    public static int clamp(int value, int low, int high) {
+        if (value < low) {
+            return low;
+        }
+        if (value > high) {
+            return high;
+        }
+        return value;
+    }
+}
+''', '''import org.junit.Test;
+import static org.junit.Assert.*;
+
+public class MathUtilTest {
+
+    @Test
+    public void testGcd() {
+        assertEquals(6, MathUtil.gcd(12, 18));
+        assertEquals(1, MathUtil.gcd(7, 9));
+        assertEquals(5, MathUtil.gcd(5, 0));
+    }
+
+    @Test
+    public void testIsPrime() {
+        assertFalse(MathUtil.isPrime(1));
+        assertTrue(MathUtil.isPrime(2));
+        assertTrue(MathUtil.isPrime(13));
+        assertFalse(MathUtil.isPrime(9));
+        assertFalse(MathUtil.isPrime(25));
+    }
+
+    @Test
+    public void testClamp() {
+        assertEquals(3, MathUtil.clamp(3, 0, 5));
+        assertEquals(0, MathUtil.clamp(-2, 0, 5));
+        assertEquals(5, MathUtil.clamp(9, 0, 5));
+        assertEquals(5, MathUtil.clamp(5, 0, 5));
+    }
+}
+'''),
+}
+
+# (정규식, 치환, 설명) - 한 줄에서 첫 번째 일치만 바꿈
+# ++/-- 처럼 무한 루프를 만들 수 있는 mutation은 사용하지 않음
+MUTATIONS = [
+    (r' <= ', ' < ', "Boundary condition excludes the upper bound"),
+    (r' < ', ' <= ', "Boundary condition includes the upper bound"),
+    (r' >= ', ' > ', "Boundary condition excludes the lower bound"),
+    (r' > ', ' >= ', "Comparison should be strict"),
+    (r' == ', ' != ', "Equality check is inverted"),
+    (r' != ', ' == ', "Inequality check is inverted"),
+    (r' \+ ', ' - ', "Wrong arithmetic operator (+ replaced by -)"),
+    (r' - ', ' + ', "Wrong arithmetic operator (- replaced by +)"),
+    (r'return true;', 'return false;', "Method returns wrong boolean value"),
+    (r'return false;', 'return true;', "Method returns wrong boolean value"),
+]
+
+
+def mutation_sites(code):
+    """
+    적용 가능한 (줄 index, mutation) 목록
+    """
+    sites = []
+    for index, line in enumerate(code.split('\n')):
+        stripped = line.strip()
+        if not stripped or stripped.startswith(('public class', 'import', '//', 'package')):
+            continue
+        for mutation in MUTATIONS:
+            if re.search(mutation[0], line):
+                sites.append((index, mutation))
+    return sites
+
+
+def make_variant(base, index, rng, package=None):
+    """
+    템플릿 하나로 버그 변형 생성
+
+    Returns:
+        dict: {'class_name', 'code', 'test_code', 'line', 'buggy_line', 'fixed_line', 'mutation'}
+    """
+    code, test_code = TEMPLATES[base]
+    class_name = f"{base}{index:04d}"
+
+    def rename(source):
+        source = re.sub(rf'\b{base}Test\b', f'{class_name}Test', source)
+        source = re.sub(rf'\b{base}\b', class_name, source)
+        if package:
+            source = f"package {package};\n\n{source}"
+        return source
+
+    code = rename(code)
+    test_code = rename(test_code)
+
+    lines = code.split('\n')
+    line_index, (pattern, replacement, description) = rng.choice(mutation_sites(code))
+    fixed_line = lines[line_index]
+    lines[line_index] = re.sub(pattern, replacement, fixed_line, count=1)
+
+    return {
+        'class_name': class_name,
+        'code': '\n'.join(lines),
+        'test_code': test_code,
+        'line': line_index + 1,
+        'buggy_line': lines[line_index],
+        'fixed_line': fixed_line,
+        'mutation': description,
+    }
+
+
+def generate_corpus(out_dir, num_files, seed=0, packages=0):
+    """
+    out_dir 아래에 num_files개의 버그 파일, 테스트, manifest.json 생성
+
+    Returns:
+        str: manifest 경로
+    """
+    rng = random.Random(seed)
+    target_root = os.path.join(out_dir, 'data', 'target')
+    test_root = os.path.join(out_dir, 'data', 'test')
+    manifest = {}
+    bases = sorted(TEMPLATES)
+
+    for index in range(num_files):
+        base = bases[index % len(bases)]
+        package = f"bench.p{index % packages}" if packages else None
+        variant = make_variant(base, index, rng, package)
+
+        package_dir = package.replace('.', os.sep) if package else ''
+        rel_path = os.path.join(package_dir, f"{variant['class_name']}.java")
+        for root, name, content in (
+            (target_root, f"{variant['class_name']}.java", variant['code']),
+            (test_root, f"{variant['class_name']}Test.java", variant['test_code']),
+        ):
+            directory = os.path.join(root, package_dir)
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+                f.write(content)
+
+        manifest[variant['class_name']] = {
+            'path': rel_path,
+            'line': variant['line'],
+            'buggy_line': variant['buggy_line'],
+            'fixed_line': variant['fixed_line'],
+            'mutation': variant['mutation'],
+        }
+
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Java bug corpus")
+    parser.add_argument('--out', required=True, help="output directory")
+    parser.add_argument('--files', type=int, default=100, help="number of buggy files (default: 100)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument('--packages', type=int, default=0,
+                        help="spread files over N nested packages (default: 0, flat)")
+    args = parser.parse_args(argv)
+
+    manifest_path = generate_corpus(args.out, args.files, args.seed, args.packages)
+    print(f"Generated {args.files} buggy file(s) in {args.out} (manifest: {manifest_path})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Fake LLM backend
+================
+llm_client.call_llm / call_llm_batch와 같은 인터페이스로, 모델 없이 응답을 만들고
+토큰 수에 비례하는 시간만큼 sleep 합니다 (prefill + decode latency 흉내).
+
+mode:
+    oracle: benchmarks.corpus의 manifest에서 버그 위치와 정답 줄을 찾아 응답 (테스트 통과)
+    canned: 항상 같은 FL 응답과 원본 코드를 돌려줌 (테스트 실패, LLM 품질과 무관한 처리량 측정용)
+
+prefix_caching=True면 이미 본 공유 prefix(src.prompts)는 prefill 시간을 치르지 않습니다
+(vLLM automatic prefix caching 흉내, prefix hit 비율은 metrics에 기록).
+"""
+
+import re
+import threading
+import time
+
+from metrics import metrics
+from src.prompts import split_prefix
+
+CLASS_RE = re.compile(r'\bclass\s+(\w+)')
+ORIGINAL_CODE_RE = re.compile(
+    r'Original Code(?: \(with line numbers\))?:\n(.*?)\n(?:\nIdentified Faults:|=== END OF CODE ===)', re.S
+)
+# shared prefix의 줄 번호 ("12: ")
+LINE_NUMBER_RE = re.compile(r'^\d+: ', re.M)
+
+
+def estimate_tokens(text):
+    # Java 코드 기준 대략 4글자당 1토큰
+    return max(1, len(text) // 4)
+
+
+class FakeLLM:
+    def __init__(self, manifest, mode='oracle', token_latency=0.0, prefill_latency=0.0, prefix_caching=False):
+        """
+        Args:
+            manifest: benchmarks.corpus manifest (class name -> bug entry)
+            mode: 'oracle' or 'canned'
+            token_latency: decode 시간 (초 / completion 토큰)
+            prefill_latency: prefill 시간 (초 / prompt 토큰)
+            prefix_caching: 공유 prefix의 prefill을 한 번만 계산
+        """
+        if mode not in ('oracle', 'canned'):
+            raise ValueError(f"Unsupported fake LLM mode: {mode}")
+        self.manifest = manifest
+        self.mode = mode
+        self.token_latency = token_latency
+        self.prefill_latency = prefill_latency
+        self.prefix_caching = prefix_caching
+        self._prefixes = set()
+        self._prefix_lock = threading.Lock()
+
+    def respond(self, prompt):
+        """
+        프롬프트 종류(FL / 전체 수정 / edit 수정)에 맞는 응답 텍스트
+        """
+        match = CLASS_RE.search(prompt)
+        entry = self.manifest.get(match.group(1)) if match else None
+        oracle = self.mode == 'oracle' and entry is not None
+        tail = prompt.rstrip()
+
+        if tail.endswith('Faults:'):
+            if oracle:
+                return f"Line {entry['line']}: {entry['mutation']}"
+            return "Line 1: Possible logic error"
+
+        if tail.endswith('Edits:'):
+            if entry is None:
+                return ''
+            replacement = entry['fixed_line'] if oracle else entry['buggy_line']
+            return (f"EDIT {entry['line']}-{entry['line']}\n"
+                    f"<<<<<<< ORIGINAL\n{entry['buggy_line']}\n=======\n{replacement}\n>>>>>>> FIXED")
+
+        # 전체 코드 수정: 프롬프트의 원본 코드에서 버그 줄만 교체
+        code_match = ORIGINAL_CODE_RE.search(prompt)
+        code = LINE_NUMBER_RE.sub('', code_match.group(1)) if code_match else ''
+        if oracle:
+            lines = code.split('\n')
+            index = entry['line'] - 1
+            if index < len(lines) and lines[index] == entry['buggy_line']:
+                lines[index] = entry['fixed_line']
+                code = '\n'.join(lines)
+        return code
+
+    def _cached_tokens(self, prompt):
+        """
+        이전 요청과 공유하는 prefix 토큰 수 (prefix caching을 흉내내지 않으면 None)
+        """
+        if not self.prefix_caching:
+            return None
+        prefix = split_prefix(prompt)
+        if prefix is None:
+            return 0
+        with self._prefix_lock:
+            if prefix in self._prefixes:
+                return estimate_tokens(prefix)
+            self._prefixes.add(prefix)
+        return 0
+
+    def _result(self, prompt, text, n):
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(text) * n
+        result = {
+            'text': text,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+        if n > 1:
+            result['texts'] = [text] * n
+        return result
+
+    def call_llm(self, prompt, max_tokens=None, temperature=None, use_cache=True, n=1):
+        start = time.perf_counter()
+        result = self._result(prompt, self.respond(prompt), n)
+        cached = self._cached_tokens(prompt)
+        ttft = self.prefill_latency * (result['prompt_tokens'] - (cached or 0))
+        time.sleep(ttft + self.token_latency * result['completion_tokens'] / n)
+        metrics.record_llm_call(result['prompt_tokens'], result['completion_tokens'],
+                                time.perf_counter() - start, ttft=ttft, prefix_cached_tokens=cached,
+                                backend='fake', batch_size=1, n=n)
+        return result
+
+    def call_llm_batch(self, prompts, max_tokens=None, temperature=None, batch_size=None, use_cache=True, n=1):
+        """
+        배치 하나로 처리: prefill은 프롬프트 합계, decode는 가장 긴 응답 기준
+        """
+        start = time.perf_counter()
+        results = [self._result(prompt, self.respond(prompt), n) for prompt in prompts]
+        if not results:
+            return results
+        cached = [self._cached_tokens(prompt) for prompt in prompts]
+        ttft = self.prefill_latency * sum(r['prompt_tokens'] - (c or 0) for r, c in zip(results, cached))
+        time.sleep(ttft + self.token_latency * max(r['completion_tokens'] // n for r in results))
+        seconds = time.perf_counter() - start
+        for r, c in zip(results, cached):
+            metrics.record_llm_call(r['prompt_tokens'], r['completion_tokens'], seconds, ttft=ttft,
+                                    prefix_cached_tokens=c, backend='fake', batch_size=len(results), n=n,
+                                    batched=True)
+        metrics.record_llm_batch(seconds, len(results), backend='fake', n=n)
+        return results
@@ -0,0 +1,224 @@
+"""
+Pipeline benchmark
+==================
+benchmarks.corpus로 만든 합성 버그 corpus를 benchmarks.fake_llm backend로 처리하며
+실행 모드(scenario)별 처리량을 측정합니다. 모델/GPU 없이 pipeline 자체(FL/Fix 조립,
+javac/JUnit, 결과 저장)의 비용과 LLM latency가 겹치는 정도를 비교할 수 있습니다.
+
+Scenario마다 새 Python 프로세스와 새 작업 디렉토리(output/ 분리)에서 실행하며 다음을 보고합니다.
+- files/min, wall seconds
+- stage별 누적 시간 (metrics span: fl_generation, fix_generation, javac, junit, ...)
+- peak RSS (Python 프로세스 / 가장 큰 자식 JVM)
+- JVM 시간 (javac/junit/jvm_daemon span 합계, 자식 프로세스 CPU 시간)
+- 테스트 통과 파일 수 (result sink 집계)
+- prefix cache hit 비율 (fake backend가 흉내낸 공유 prefix 재사용)
+
+Usage:
+    python -m benchmarks.run [--files 50] [--scenarios sequential,streaming]
+                             [--token-latency 0.005] [--prefill-latency 0.0002]
+                             [--mode oracle|canned] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import generate_corpus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# scenario 이름 -> 덮어쓸 config 값
+SCENARIOS = {
+    'sequential': {},
+    'batched': {'BATCH_MODE': True},
+    'streaming': {'STREAMING_MODE': True},
+    'streaming_batched': {'STREAMING_MODE': True, 'BATCH_MODE': True},
+    'edit_mode': {'FIX_MODE': 'edit'},
+    'jvm_daemon': {'USE_JVM_DAEMON': True},
+    'legacy_prompts': {'PROMPT_LAYOUT': 'legacy'},
+}
+
+# 모든 scenario 공통: 캐시/incremental 없이 매번 전부 처리
+BASE_CONFIG = {
+    'LLM_CACHE_ENABLED': False,
+    'INCREMENTAL_MODE': False,
+    'RESULT_SINK': 'jsonl',
+    # fake backend에는 모델 설정이 없으므로 context 길이를 고정
+    'MODEL_CONTEXT_LENGTH': 8192,
+}
+
+JVM_STAGES = ('javac', 'junit', 'jvm_daemon')
+
+# 측정용 자식 프로세스에서 실행할 코드 (config 수정 → fake backend 연결 → main 실행)
+PROBE = """
+import json, resource, sys, time
+settings = json.loads(sys.argv[1])
+
+import config
+for name, value in settings['config'].items():
+    setattr(config, name, value)
+
+import llm_client
+from benchmarks.fake_llm import FakeLLM
+with open(settings['manifest'], encoding='utf-8') as f:
+    fake = FakeLLM(json.load(f), settings['mode'], settings['token_latency'], settings['prefill_latency'],
+                   prefix_caching=config.PREFIX_CACHING)
+llm_client.call_llm = fake.call_llm
+llm_client.call_llm_batch = fake.call_llm_batch
+
+import main
+from metrics import metrics
+from src.jvm_daemon import shutdown_daemons
+from src.result_sink import summarize
+
+start = time.perf_counter()
+main.main([])
+wall = time.perf_counter() - start
+shutdown_daemons()
+
+own = resource.getrusage(resource.RUSAGE_SELF)
+children = resource.getrusage(resource.RUSAGE_CHILDREN)
+print('BENCH_RESULT ' + json.dumps({
+    'wall_seconds': wall,
+    'metrics': metrics.summary(),
+    'peak_rss_kb': own.ru_maxrss,
+    'peak_child_rss_kb': children.ru_maxrss,
+    'child_cpu_seconds': children.ru_utime + children.ru_stime,
+    'results': summarize(config.RESULT_SINK_PATH),
+}))
+"""
+
+
+def run_scenario(name, corpus_dir, manifest_path, args):
+    """
+    새 작업 디렉토리(data는 corpus를 symlink)에서 scenario 하나 실행
+
+    Returns:
+        dict: 측정 결과 (실패하면 None)
+    """
+    workspace = tempfile.mkdtemp(prefix=f'bench_{name}_')
+    try:
+        os.symlink(os.path.join(corpus_dir, 'data'), os.path.join(workspace, 'data'))
+        settings = {
+            'config': {**BASE_CONFIG, **SCENARIOS[name]},
+            'manifest': manifest_path,
+            'mode': args.mode,
+            'token_latency': args.token_latency,
+            'prefill_latency': args.prefill_latency,
+        }
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_ROOT, env.get('PYTHONPATH')]))
+
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, json.dumps(settings)],
+            cwd=workspace,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+        for line in result.stdout.splitlines():
+            if line.startswith('BENCH_RESULT '):
+                return json.loads(line[len('BENCH_RESULT '):])
+        print(f"Scenario {name} failed:\n{result.stderr.strip()[-2000:]}")
+        return None
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def report(name, files, measured):
+    """
+    scenario 하나의 요약 dict
+    """
+    stages = measured['metrics']['stages']
+    wall = measured['wall_seconds']
+    return {
+        'scenario': name,
+        'files': files,
+        'wall_seconds': round(wall, 3),
+        'files_per_min': round(files / wall * 60, 1) if wall > 0 else None,
+        'passed': measured['results']['all_tests_passed'],
+        'peak_rss_mb': round(measured['peak_rss_kb'] / 1024, 1),
+        'peak_child_rss_mb': round(measured['peak_child_rss_kb'] / 1024, 1),
+        'jvm_seconds': round(sum(stages.get(stage, {}).get('total_seconds', 0) for stage in JVM_STAGES), 3),
+        'child_cpu_seconds': round(measured['child_cpu_seconds'], 3),
+        'stages': {stage: s['total_seconds'] for stage, s in sorted(stages.items())},
+        'llm': measured['metrics']['llm'],
+    }
+
+
+def format_table(reports):
+    header = (f"{'scenario':<18} {'files/min':>10} {'wall s':>8} {'passed':>7} "
+              f"{'RSS MB':>7} {'JVM RSS':>8} {'JVM s':>7} {'JVM CPU':>8} {'prefix hit':>10}")
+    lines = [header, '-' * len(header)]
+    for r in reports:
+        lines.append(f"{r['scenario']:<18} {r['files_per_min']!s:>10} {r['wall_seconds']:>8} "
+                     f"{r['passed']:>7} {r['peak_rss_mb']:>7} {r['peak_child_rss_mb']:>8} "
+                     f"{r['jvm_seconds']:>7} {r['child_cpu_seconds']:>8} {r['llm']['prefix_hit_rate']!s:>10}")
+    lines.append('')
+    lines.append("Stage breakdown (total seconds):")
+    for r in reports:
+        breakdown = ', '.join(f"{stage} {seconds}" for stage, seconds in r['stages'].items())
+        lines.append(f"  - {r['scenario']}: {breakdown}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pipeline modes on a synthetic bug corpus")
+    parser.add_argument('--files', type=int, default=50, help="number of buggy files (default: 50)")
+    parser.add_argument('--seed', type=int, default=0, help="corpus random seed (default: 0)")
+    parser.add_argument('--packages', type=int, default=0, help="spread files over N packages (default: 0)")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"comma-separated scenarios (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--mode', choices=('oracle', 'canned'), default='oracle',
+                        help="fake LLM answers: oracle fixes or unchanged code (default: oracle)")
+    parser.add_argument('--token-latency', type=float, default=0.005,
+                        help="fake decode seconds per completion token (default: 0.005)")
+    parser.add_argument('--prefill-latency', type=float, default=0.0002,
+                        help="fake prefill seconds per prompt token (default: 0.0002)")
+    parser.add_argument('--corpus', help="reuse/keep the corpus in this directory")
+    parser.add_argument('--json', help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else tempfile.mkdtemp(prefix='bench_corpus_')
+    try:
+        manifest_path = os.path.join(corpus_dir, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            print(f"Generating {args.files} buggy file(s) in {corpus_dir}...")
+            generate_corpus(corpus_dir, args.files, args.seed, args.packages)
+        with open(manifest_path, encoding='utf-8') as f:
+            files = len(json.load(f))
+
+        reports = []
+        for name in scenarios:
+            print(f"Running scenario {name}...")
+            start = time.perf_counter()
+            measured = run_scenario(name, corpus_dir, manifest_path, args)
+            if measured is None:
+                continue
+            reports.append(report(name, files, measured))
+            print(f"  done in {time.perf_counter() - start:.1f}s")
+    finally:
+        if not args.corpus:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    print()
+    print(format_table(reports))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nResults saved to: {args.json}")
+    return 0 if len(reports) == len(scenarios) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Startup benchmark
+=================
+새 Python 프로세스에서 다음 시간을 따로 측정합니다.
+1. pipeline import: main.py와 src 모듈 import (backend 제외)
+2. backend import: BACKEND에 필요한 torch / vllm / transformers / requests import
+3. model load: 모델 로드 (--load-model, 실제 모델이 필요)
+
+Usage:
+    python -m benchmarks.startup [--repeat N] [--load-model]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+# 측정용 자식 프로세스에서 실행할 코드 (매번 새 인터프리터 → cold import)
+PROBE = """
+import json, sys, time
+timings = {}
+start = time.perf_counter()
+import main
+timings['pipeline_import'] = time.perf_counter() - start
+
+import llm_client
+start = time.perf_counter()
+llm_client.import_backend()
+timings['backend_import'] = time.perf_counter() - start
+
+if sys.argv[1] == '1':
+    start = time.perf_counter()
+    llm_client.get_llm_instance()
+    timings['model_load'] = time.perf_counter() - start
+print('STARTUP_TIMINGS ' + json.dumps(timings))
+"""
+
+
+def measure_once(load_model):
+    """
+    자식 프로세스 하나에서 단계별 시간 측정
+
+    Returns:
+        dict: stage -> seconds (실패하면 None)
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, '1' if load_model else '0'],
+        capture_output=True,
+        text=True
+    )
+    total = time.perf_counter() - start
+    for line in result.stdout.splitlines():
+        if line.startswith('STARTUP_TIMINGS '):
+            timings = json.loads(line[len('STARTUP_TIMINGS '):])
+            timings['process_total'] = total
+            return timings
+    print(f"Probe failed:\n{result.stderr.strip()}")
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import and model-load time")
+    parser.add_argument('--repeat', type=int, default=3, help="number of fresh processes (default: 3)")
+    parser.add_argument('--load-model', action='store_true', help="also measure model load time")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for _ in range(args.repeat):
+        timings = measure_once(args.load_model)
+        if timings is None:
+            return 1
+        runs.append(timings)
+
+    print(f"Startup timings over {len(runs)} fresh process(es) (min / mean seconds):")
+    for stage in runs[0]:
+        values = [run[stage] for run in runs]
+        print(f"  - {stage}: {min(values):.3f} / {sum(values) / len(values):.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
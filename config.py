@@ -6,8 +6,7 @@ import os
 
 # hf tokens - Set via environment variable before running:
 # export HF_TOKEN='your_token_here'
-if 'HF_TOKEN' not in os.environ:
-    print("Warning: HF_TOKEN environment variable not set!")
+# (없으면 로컬 모델을 로드할 때 llm_client가 경고 출력)
 
 # Input and output directories
 INPUT_DIR = os.path.join('data', 'target')
@@ -16,6 +15,11 @@ OUTPUT_DIR = 'output'
 FIXES_OUTPUT_DIR = os.path.join(OUTPUT_DIR, 'fixes')
 LOGS_OUTPUT_DIR = os.path.join(OUTPUT_DIR, 'logs')
 
+# Corpus scan - INPUT_DIR 아래 .java 파일을 하위 디렉토리까지 탐색
+# glob은 INPUT_DIR 기준 상대 경로 (예: include ['com/acme/*'], exclude ['**/generated/**'])
+SCAN_INCLUDE = []
+SCAN_EXCLUDE = []
+
 # Model parameters - vLLM 로컬 인스턴스
 '''
 models
@@ -37,13 +41,170 @@ LLM_MODEL_NAME = ''
 TRUST_REMOTE_CODE = True
 MAX_TOKENS = 2000
 TEMPERATURE = 0.7
-BACKEND = "transformers"
+BACKEND = "transformers"  # "vllm", "transformers" or "openai"
+
+# OpenAI 호환 HTTP 서버 (BACKEND = "openai", 예: `vllm serve <LLM_MODEL_NAME>`)
+# 여러 파이프라인 프로세스가 이미 로드된 서버 하나를 공유 (서버 측 continuous batching)
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL', 'http://localhost:8000/v1')
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+HTTP_MAX_CONCURRENCY = 16   # 동시에 보내는 요청 수 (keep-alive 연결 풀 크기)
+HTTP_TIMEOUT = 300          # 요청당 timeout (초)
+HTTP_MAX_RETRIES = 3        # 연결 오류/429/5xx 재시도 횟수
+HTTP_RETRY_BACKOFF = 1.0    # 재시도 대기 시간 (초, 시도마다 2배)
+
+# CPU inference profile (BACKEND = "transformers", GPU가 없을 때 적용)
+# CPU_DTYPE: "float32" (기본, 기존 출력 그대로), 필요 시 선택: "int8" (nn.Linear 가중치 dynamic int8
+# quantization - 출력 품질이 달라질 수 있음), "bfloat16" (CPU가 bf16을 지원할 때만, 아니면 float32)
+# safetensors 가중치는 mmap으로 필요한 부분만 읽고(low_cpu_mem_usage), 로드 후 warm-up 생성으로
+# 초기화 비용을 미리 치르며 peak RSS / tokens/sec를 출력
+CPU_DTYPE = "float32"
+CPU_THREADS = 0             # intra-op 스레드 수 (0: CPU_CORES 개수, 둘 다 없으면 torch 기본값)
+CPU_INTEROP_THREADS = 1     # inter-op 스레드 수
+CPU_CORES = []              # 프로세스를 고정할 코어 번호 (예: [0, 1, 2, 3]; javac/JUnit 자식 프로세스도 상속)
+CPU_WARMUP_TOKENS = 16      # warm-up 생성 토큰 수 (0이면 생략)
+
+# Accelerated decoding - fix 생성처럼 출력 대부분이 프롬프트의 원본 코드를 그대로 복사하는 경우에 효과적
+# "none" | "prompt_lookup" (프롬프트 n-gram으로 다음 토큰 제안) | "draft" (작은 draft 모델로 제안)
+# 제안 토큰은 본 모델이 검증하므로 greedy(TEMPERATURE=0) 출력은 일반 decoding과 동일
+SPECULATIVE_MODE = "none"
+SPECULATIVE_NUM_TOKENS = 10     # 한 번에 제안할 토큰 수
+PROMPT_LOOKUP_MAX_NGRAM = 4     # prompt lookup 시 일치를 찾을 최대 n-gram 길이 (vLLM)
+DRAFT_MODEL_NAME = ''           # SPECULATIVE_MODE="draft"일 때 사용 (본 모델과 같은 tokenizer)
+
+# Prompt layout / prefix caching - prefill은 긴 Java 파일 처리 시간의 큰 부분
+# PROMPT_LAYOUT "shared_prefix": 공통 지시문 + 원본 코드를 프롬프트 앞에 두고 FL/Fix 작업 지시는 뒤에 붙임
+# (같은 파일의 FL과 Fix 프롬프트가 같은 prefix로 시작, 배치 모드도 파일 묶음별로 FL → Fix를 연달아 실행)
+# "legacy": 작업 지시 뒤에 코드가 오는 기존 프롬프트
+# PREFIX_CACHING: vLLM enable_prefix_caching / transformers는 공통 prefix의 past_key_values를 재사용
+# (prefix hit 비율은 실행 로그의 LLM 요약에 출력)
+PROMPT_LAYOUT = "shared_prefix"
+PREFIX_CACHING = True
+PREFIX_KV_CACHE_ENTRIES = 8     # transformers: 보관할 prefix KV cache 수 (파일당 하나)
+
+# Batched execution - LLM_BATCH_SIZE개 파일씩 FL 프롬프트 → 배치 생성, 이어서 Fix 프롬프트 → 배치 생성
+BATCH_MODE = False
+LLM_BATCH_SIZE = 16
+# transformers 백엔드: 길이가 비슷한 프롬프트끼리 묶고, 배치 하나의 padding 포함 토큰 수
+# (행 수 × (가장 긴 프롬프트 + max_tokens))를 이 값 이하로 제한 (OOM 시 절반으로 줄여 재시도)
+LLM_MAX_BATCH_TOKENS = 32768
+
+# Token budget planner - 요청마다 프롬프트를 tokenize해 모델 context 안에서 max_tokens를 정함
+# FL: min(MAX_TOKENS, 코드 토큰 × FL_OUTPUT_RATIO + OUTPUT_MARGIN_TOKENS)
+# Fix: 원본 코드 토큰 × FIX_OUTPUT_RATIO + OUTPUT_MARGIN_TOKENS (edit 모드는 EDIT_FIX_MAX_TOKENS 이하)
+# 작은 파일은 KV cache를 필요한 만큼만 예약해 vLLM 배치에 더 많은 요청이 들어감
+# context에 들어가지 않는 파일: FL은 메서드 단위 chunk 프롬프트로 전환,
+# Fix는 생성하지 않고 결과 JSON에 'status': 'input_too_large' 기록 (전체 파일을 출력할 공간이 없음)
+# False면 고정값 사용 (FL MAX_TOKENS, Fix FIX_MAX_TOKENS / EDIT_FIX_MAX_TOKENS)
+TOKEN_BUDGET_ENABLED = True
+MODEL_CONTEXT_LENGTH = 0        # 0: vLLM/transformers는 HF 모델 설정(max_position_embeddings 등), 그 외 4096
+FL_OUTPUT_RATIO = 0.25
+FIX_OUTPUT_RATIO = 1.2
+OUTPUT_MARGIN_TOKENS = 256
+
+# LLM response cache - 프롬프트/모델/백엔드/max_tokens/temperature 해시 기준
+# 재실행 시 동일 요청은 GPU 생성 없이 캐시에서 반환 (False면 캐시 우회)
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = os.path.join(OUTPUT_DIR, 'cache', 'llm_cache.sqlite3')
+LLM_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Incremental mode - 대상/테스트 파일, 프롬프트 템플릿, 모델 설정의 fingerprint가
+# 기존 결과 JSON과 같으면 해당 파일을 건너뜀 (중단 후 재실행 시 이어서 처리)
+INCREMENTAL_MODE = False
+
+# Test execution - 파일별로 독립된 빌드 디렉토리(가능하면 tmpfs)에서 javac/JUnit 병렬 실행
+JUNIT_CLASSPATH = '/usr/share/java/junit4.jar'
+TEST_WORKERS = os.cpu_count() or 1
+TEST_SCRATCH_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+TEST_OUTPUT_MAX_CHARS = 4000    # 결과에 남길 JUnit stdout/stderr (마지막 N글자)
+
+# Test scheduling - 같은 테스트 클래스에서 이전에 실패한 테스트, 수정된 메서드를 호출하는 테스트를 먼저 실행
+# FAIL_FAST_CANDIDATES: 후보 검증은 첫 실패에서 중단 (통과 후보만 전체 suite 실행,
+# 모든 후보가 실패하면 선택된 후보만 전체 suite로 다시 실행)
+PRIORITIZE_TESTS = True
+FAIL_FAST_CANDIDATES = True
+
+# JVM daemon - 실행당 한 번 띄운 helper JVM에서 메모리 내 컴파일 + JUnit 실행
+# (JVM 시작/JIT 워밍업 비용 제거, 실패 시 javac/java subprocess 방식으로 대체)
+USE_JVM_DAEMON = False
+JVM_DAEMON_TIMEOUT = 30
+# 연속으로 이 횟수만큼 데몬 요청이 실패하면 이번 실행에서는 subprocess 방식만 사용
+JVM_DAEMON_MAX_FAILURES = 3
+
+# Streaming mode - 생성/테스트/저장 stage를 동시에 실행 (파일별로 생성 직후 테스트)
+# stage 간 큐 크기를 STAGE_QUEUE_SIZE로 제한해 backpressure 적용
+# vLLM/transformers 인스턴스는 thread-safe하지 않으므로 GENERATION_WORKERS는 보통 1
+STREAMING_MODE = False
+GENERATION_WORKERS = 1
+STAGE_QUEUE_SIZE = 32
+
+# Fix output format
+# - "full": 수정된 전체 파일을 생성
+# - "edit": 변경된 줄 범위만 생성 후 원본에 적용 (적용 실패 시 "full"로 재시도)
+FIX_MODE = "full"
+
+# Chunked fault localization - FL_CHUNK_MAX_LINES보다 긴 파일은 메서드 단위로 나눠
+# 원본 줄 번호 + 필요한 context(import, 클래스 선언, 필드)만 담은 프롬프트로 FL 수행
+FL_CHUNKING = False
+FL_CHUNK_MAX_LINES = 200
+
+# Spectrum-based fault localization - 수정 전 코드에 줄 단위 coverage probe를 넣고 JUnit 테스트를 실행해
+# 실패/통과 테스트가 실행한 줄로 의심도(SBFL_FORMULA: "ochiai" | "tarantula") 계산
+# - 의심도 SBFL_SKIP_LLM_SCORE 이상인 줄이 SBFL_SKIP_MAX_LINES개 이하면 LLM FL 호출 생략
+# - 그 외에는 상위 SBFL_TOP_K개 줄이 속한 메서드와 실패 테스트만 LLM에 전달
+# - 실패하는 테스트가 없거나 instrumentation/컴파일에 실패하면 기존 LLM FL
+SBFL_ENABLED = False
+SBFL_FORMULA = "ochiai"
+SBFL_SKIP_LLM_SCORE = 1.0
+SBFL_SKIP_MAX_LINES = 2
+SBFL_TOP_K = 5
+SBFL_TIMEOUT = 30           # coverage 테스트 실행 timeout (초)
+
+# Corpus dedup - 주석/공백(DEDUP_IGNORE_PACKAGE면 package 선언도) 차이를 무시하면 같은 클래스이고
+# 대응 테스트도 같은 파일들은 첫 번째 파일만 FL/Fix/테스트를 실행하고, 결과를 나머지 파일 경로로 복사
+# (수정 코드는 각 파일의 package로 바꿔 저장, 결과 JSON에 'dedup': {'representative'} 기록)
+# 메서드 단위로 다른 클래스에 반복되는 메서드 수도 함께 출력
+DEDUP_ENABLED = False
+DEDUP_IGNORE_PACKAGE = True
+
+# Multi-candidate fix generation - 한 요청으로 후보 NUM_CANDIDATES개를 샘플링
+# (vLLM SamplingParams(n=...) / transformers num_return_sequences)
+# 중복 제거 후 CANDIDATE_WORKERS개씩 병렬 검증, 하나라도 통과하면 나머지 검증 취소
+NUM_CANDIDATES = 1
+CANDIDATE_WORKERS = 4
+
+# Repair loop - 수정 코드가 컴파일/테스트에 실패하면 javac 오류(줄, 메시지) 또는 실패 테스트 메시지와
+# 해당 줄 주변 코드만 이전 프롬프트 + 이전 수정 코드 뒤에 이어 붙여 다시 생성
+# (프롬프트 앞부분이 그대로이므로 prefix caching 백엔드는 KV cache 재사용)
+# 테스트 통과 / REPAIR_MAX_ITERATIONS회 / 파일당 REPAIR_TOKEN_BUDGET 토큰 / REPAIR_TIME_BUDGET초 중 먼저 도달하면 중단
+REPAIR_LOOP_ENABLED = False
+REPAIR_MAX_ITERATIONS = 3
+REPAIR_TOKEN_BUDGET = 24000     # 반복 전체의 prompt + completion 토큰
+REPAIR_TIME_BUDGET = 300        # 반복 전체의 생성 + 테스트 시간 (초)
+REPAIR_SNIPPET_CONTEXT = 3      # 오류 줄 앞뒤로 함께 보여줄 줄 수
+
+# Server mode (python main.py --serve) - 모델을 한 번만 로드해 두고 Unix socket으로 수리 작업을 받음
+# 작업은 SERVER_MAX_JOBS개씩 동시에 처리, 대기 작업이 SERVER_MAX_PENDING개를 넘으면 새 작업 거절
+SERVER_SOCKET_PATH = os.path.join(OUTPUT_DIR, 'server.sock')
+SERVER_MAX_JOBS = 2
+SERVER_MAX_PENDING = 64
+
+# Result sink - 파일 처리가 끝나는 즉시 결과 한 건을 추가 (실행 도중 중단돼도 완료분 보존)
+# "jsonl": RESULT_SINK_PATH에 한 줄씩 추가 (.gz로 끝나면 실행이 끝날 때 gzip member 하나로 압축), "sqlite": SQLite 테이블, None: 사용 안 함
+# 집계: python main.py --summary [PATH]
+RESULT_SINK = "jsonl"
+RESULT_SINK_PATH = os.path.join(OUTPUT_DIR, 'results.jsonl')
+RESULT_SINK_FSYNC_EVERY = 50    # N건마다 fsync (SQLite는 commit)
+WRITE_RESULT_JSON = True        # 파일별 JSON (output/fixes/<name>.json)도 저장
 
 # Logging settings
 LOG_LEVEL = 'INFO'
 LOG_FILE = os.path.join(LOGS_OUTPUT_DIR, 'pipeline.log')
 
-# Ensure output directories exist
-os.makedirs(FIXES_OUTPUT_DIR, exist_ok=True)
-os.makedirs(LOGS_OUTPUT_DIR, exist_ok=True)
-os.makedirs(OUTPUT_DIR, exist_ok=True)
\ No newline at end of file
+
+def ensure_output_dirs():
+    """
+    Ensure output directories exist (import 시점이 아니라 실행 시작 시 호출)
+    """
+    os.makedirs(FIXES_OUTPUT_DIR, exist_ok=True)
+    os.makedirs(LOGS_OUTPUT_DIR, exist_ok=True)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
\ No newline at end of file
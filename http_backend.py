@@ -0,0 +1,120 @@
+"""
+OpenAI 호환 HTTP 백엔드
+======================
+`vllm serve` 같은 OpenAI 호환 서버의 /completions 엔드포인트를 호출합니다.
+keep-alive 연결 풀을 공유하고, 동시에 보내는 요청 수를 제한하며,
+연결 오류/429/5xx 응답은 backoff 후 재시도합니다. 응답은 streaming으로 받아
+첫 토큰 시각(TTFT)을 기록합니다.
+"""
+
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 재시도할 HTTP 상태 코드
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class HTTPBackendError(Exception):
+    """Raised when the server cannot complete a request after all retries."""
+
+
+class OpenAICompletionsClient:
+    def __init__(self, base_url, model, api_key=None, max_concurrency=16, timeout=300,
+                 max_retries=3, backoff=1.0):
+        self.url = base_url.rstrip('/') + '/completions'
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        # 동시 요청 수만큼 keep-alive 연결을 유지
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers['Content-Type'] = 'application/json'
+        if api_key:
+            self._session.headers['Authorization'] = f'Bearer {api_key}'
+
+    def complete(self, prompt, max_tokens, temperature, n=1):
+        """
+        프롬프트 하나에 대한 completion (streaming)
+
+        Returns:
+            dict: {'texts': [str] (n개), 'prompt_tokens': int, 'completion_tokens': int,
+                   'cached_tokens': int or None, 'ttft': float or None, 'seconds': float}
+        """
+        payload = {
+            'model': self.model,
+            'prompt': prompt,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'n': n,
+            'stream': True,
+            'stream_options': {'include_usage': True},
+        }
+
+        with self._slots:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return self._stream(payload, n)
+                except HTTPBackendError:
+                    raise
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise HTTPBackendError(f"{self.url} failed after {attempt + 1} attempt(s): {e}")
+                    delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                    print(f"    LLM server request failed ({e}); retrying in {delay:.1f}s")
+                    time.sleep(delay)
+
+    def _stream(self, payload, n):
+        start = time.perf_counter()
+        ttft = None
+        texts = [''] * n
+        chunks = 0
+        usage = None
+
+        with self._session.post(self.url, json=payload, stream=True, timeout=self.timeout) as response:
+            if response.status_code in RETRY_STATUS:
+                raise requests.HTTPError(f"HTTP {response.status_code}")
+            if response.status_code != 200:
+                raise HTTPBackendError(f"HTTP {response.status_code}: {response.text[:500]}")
+
+            # 서버가 charset을 생략하면 response.encoding이 ISO-8859-1이 되므로 직접 UTF-8로 decode
+            for raw_line in response.iter_lines():
+                line = raw_line.decode('utf-8')
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                event = json.loads(data)
+                if event.get('usage'):
+                    usage = event['usage']
+                for choice in event.get('choices', []):
+                    if not choice.get('text'):
+                        continue
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    texts[choice.get('index', 0)] += choice['text']
+                    chunks += 1
+
+        # 서버가 usage를 보내지 않으면 streaming chunk 수로 completion 토큰 수를 근사
+        return {
+            'texts': texts,
+            'prompt_tokens': usage.get('prompt_tokens', 0) if usage else 0,
+            'completion_tokens': usage.get('completion_tokens', chunks) if usage else chunks,
+            # prefix cache에서 재사용한 프롬프트 토큰 (vLLM: --enable-prompt-tokens-details)
+            'cached_tokens': ((usage or {}).get('prompt_tokens_details') or {}).get('cached_tokens'),
+            'ttft': ttft,
+            'seconds': time.perf_counter() - start,
+        }
+
+    def close(self):
+        self._session.close()
@@ -1,134 +1,851 @@
-import torch
+import copy
+import os
+import resource
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from config import (
     LLM_MODEL_NAME,
     TRUST_REMOTE_CODE,
     MAX_TOKENS,
     TEMPERATURE,
-    BACKEND,  # "vllm" or "transformers")
+    BACKEND,  # "vllm", "transformers" or "openai"
+    OPENAI_BASE_URL,
+    OPENAI_API_KEY,
+    HTTP_MAX_CONCURRENCY,
+    HTTP_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_RETRY_BACKOFF,
+    LLM_BATCH_SIZE,
+    LLM_MAX_BATCH_TOKENS,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_MAX_BYTES,
+    SPECULATIVE_MODE,  # "none", "prompt_lookup" or "draft"
+    SPECULATIVE_NUM_TOKENS,
+    PROMPT_LOOKUP_MAX_NGRAM,
+    DRAFT_MODEL_NAME,
+    CPU_DTYPE,  # "float32", "int8" or "bfloat16"
+    CPU_THREADS,
+    CPU_INTEROP_THREADS,
+    CPU_CORES,
+    CPU_WARMUP_TOKENS,
+    PREFIX_CACHING,
+    PREFIX_KV_CACHE_ENTRIES,
+    TOKEN_BUDGET_ENABLED,
+    MODEL_CONTEXT_LENGTH,
+    OUTPUT_MARGIN_TOKENS,
 )
+from llm_cache import LLMCache
+from metrics import metrics
+from src.prompts import split_prefix
 
-# backend별 모듈 import
-if BACKEND == "vllm":
-    from vllm import LLM, SamplingParams
-elif BACKEND == "transformers":
-    from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-else:
+if BACKEND not in ("vllm", "transformers", "openai"):
     raise ValueError(f"Unsupported BACKEND: {BACKEND}")
 
+if SPECULATIVE_MODE not in ("none", "prompt_lookup", "draft"):
+    raise ValueError(f"Unsupported SPECULATIVE_MODE: {SPECULATIVE_MODE}")
+
+if CPU_DTYPE not in ("int8", "bfloat16", "float32"):
+    raise ValueError(f"Unsupported CPU_DTYPE: {CPU_DTYPE}")
+
 # 전역 인스턴스
 _llm_instance = None
 _tokenizer = None
 _pipeline = None
+_draft_model = None
+_cache = None
+_max_batch_tokens = LLM_MAX_BATCH_TOKENS
+# vLLM/transformers 인스턴스는 thread-safe하지 않음
+# (streaming/server 모드에서 생성 stage와 테스트 stage의 repair loop가 동시에 호출할 수 있음)
+_generate_lock = threading.Lock()
+# transformers: 공유 prefix 텍스트 -> (prefix 토큰 수, past_key_values), 최근 사용 순
+_prefix_kv = OrderedDict()
+
+# backend 모듈은 첫 생성 시점에 import_backend()에서 로드
+# (torch/vllm/transformers는 import만으로 수 초가 걸리므로 캐시 hit, 테스트 전용 실행에서는 로드하지 않음)
+torch = None
+LLM = SamplingParams = None
+AutoModelForCausalLM = AutoTokenizer = pipeline = None
+OpenAICompletionsClient = None
+
+# Token budget planner: 로컬 백엔드(vLLM/transformers)는 모델 대신 tokenizer/모델 설정만 한 번 읽음
+# (캐시 hit만으로 끝나는 실행에서도 같은 max_tokens → 같은 캐시 key)
+# OpenAI 호환 서버나 TOKEN_BUDGET_ENABLED=False면 아무것도 import하지 않고
+# MODEL_CONTEXT_LENGTH와 글자 수 기반 추정만 사용
+_budget_tokenizer = None
+_context_length = None
+_budget_lock = threading.Lock()
+DEFAULT_CONTEXT_LENGTH = 4096
+# tokenizer를 로드할 수 없을 때 (OpenAI 호환 서버의 비-HF 모델 등) 글자 수 기반 추정, 코드 기준 보수적으로
+CHARS_PER_TOKEN = 3
+# HF 모델 설정에서 context 길이를 나타내는 key (앞에서부터 사용)
+CONTEXT_LENGTH_KEYS = ("max_position_embeddings", "n_positions", "max_sequence_length", "seq_length")
+
+
+class ContextLengthError(Exception):
+    """
+    프롬프트 뒤에 필요한 출력 토큰을 모델 context 안에 확보할 수 없음
+    """
+
+
+class PartialBatchError(Exception):
+    """
+    배치 중 일부 프롬프트만 실패 (results: 성공한 프롬프트의 결과, 실패한 자리는 None / errors: index -> 예외)
+    """
+
+    def __init__(self, results, errors):
+        self.results = results
+        self.errors = errors
+        first = next(iter(errors.values()))
+        super().__init__(f"{len(errors)} of {len(results)} prompt(s) failed: {first}")
+
+
+# 캐시 응답 형식이 바뀌면 증가 (2: transformers 응답에서 프롬프트 echo 제거, 실제 토큰 수)
+CACHE_KEY_VERSION = 2
+
+
+def import_backend():
+    """
+    BACKEND에 필요한 모듈을 import (이미 로드했으면 아무것도 하지 않음)
+    """
+    global torch, LLM, SamplingParams, AutoModelForCausalLM, AutoTokenizer, pipeline, OpenAICompletionsClient
+
+    if BACKEND == "vllm" and LLM is None:
+        from vllm import LLM, SamplingParams
+    elif BACKEND == "transformers" and pipeline is None:
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+    elif BACKEND == "openai" and OpenAICompletionsClient is None:
+        from http_backend import OpenAICompletionsClient
+
+
+def _check_hf_token():
+    # hf tokens - 실행 전에 환경 변수로 설정: export HF_TOKEN='your_token_here'
+    if 'HF_TOKEN' not in os.environ:
+        print("Warning: HF_TOKEN environment variable not set!")
 
 
 def get_llm_instance():
     """
     싱글톤 패턴으로 LLM 인스턴스를 가져옵니다.
     """
-    global _llm_instance, _tokenizer, _pipeline
+    global _llm_instance, _tokenizer, _pipeline, _draft_model
+
+    import_backend()
 
     if BACKEND == "vllm":
         if _llm_instance is None:
+            _check_hf_token()
             print(f"[Backend: vLLM] Loading model: {LLM_MODEL_NAME}...")
+            # automatic prefix caching: 같은 prefix로 시작하는 요청은 prefix의 KV cache block을 재사용
+            kwargs = {'enable_prefix_caching': PREFIX_CACHING}
+            speculative_config = _vllm_speculative_config()
+            if speculative_config is not None:
+                print(f"Speculative decoding: {speculative_config}")
+                kwargs['speculative_config'] = speculative_config
             _llm_instance = LLM(
                 model=LLM_MODEL_NAME,
                 trust_remote_code=TRUST_REMOTE_CODE,
+                **kwargs,
             )
             print("vLLM model loaded successfully!")
         return _llm_instance
 
     elif BACKEND == "transformers":
         if _pipeline is None:
+            _check_hf_token()
             print(f"[Backend: Transformers] Loading model: {LLM_MODEL_NAME}...")
+            load_start = time.perf_counter()
+            cpu = not torch.cuda.is_available()
+            if cpu:
+                _apply_cpu_threads()
             _tokenizer = AutoTokenizer.from_pretrained(
                 LLM_MODEL_NAME, trust_remote_code=TRUST_REMOTE_CODE
             )
-            model = AutoModelForCausalLM.from_pretrained(
-                LLM_MODEL_NAME,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                device_map="auto",
-                trust_remote_code=TRUST_REMOTE_CODE,
-            )
+            # decoder-only 모델 배치 생성: 왼쪽 padding, pad 토큰이 없으면 eos로 대체
+            _tokenizer.padding_side = "left"
+            if _tokenizer.pad_token is None:
+                _tokenizer.pad_token = _tokenizer.eos_token
+            model = _load_transformers_model(LLM_MODEL_NAME)
+            if SPECULATIVE_MODE == "draft":
+                print(f"Loading draft model: {DRAFT_MODEL_NAME}...")
+                _draft_model = _load_transformers_model(DRAFT_MODEL_NAME)
             _pipeline = pipeline(
                 "text-generation",
                 model=model,
                 tokenizer=_tokenizer,
-                device=0 if torch.cuda.is_available() else -1,
+                device=-1 if cpu else 0,
             )
             print("Transformers model loaded successfully!")
+            if cpu:
+                _report_cpu_load(time.perf_counter() - load_start)
         return _pipeline
 
+    elif BACKEND == "openai":
+        if _llm_instance is None:
+            print(f"[Backend: OpenAI-compatible server] {OPENAI_BASE_URL} (model: {LLM_MODEL_NAME})")
+            _llm_instance = OpenAICompletionsClient(
+                OPENAI_BASE_URL,
+                LLM_MODEL_NAME,
+                api_key=OPENAI_API_KEY,
+                max_concurrency=HTTP_MAX_CONCURRENCY,
+                timeout=HTTP_TIMEOUT,
+                max_retries=HTTP_MAX_RETRIES,
+                backoff=HTTP_RETRY_BACKOFF,
+            )
+        return _llm_instance
+
+
+def _cpu_supports_bf16():
+    """
+    CPU가 bf16 연산을 지원하는지 (AVX512-BF16 / AMX, Linux /proc/cpuinfo 기준)
+    """
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+
+def _cpu_dtype():
+    """
+    CPU_DTYPE에 맞는 로드 dtype과 int8 dynamic quantization 여부
+    """
+    if CPU_DTYPE == "bfloat16":
+        if _cpu_supports_bf16():
+            return torch.bfloat16, False
+        print("Warning: CPU has no native bf16 support, using float32")
+    return torch.float32, CPU_DTYPE == "int8"
+
+
+def _apply_cpu_threads():
+    """
+    모델 로드 전에 코어 고정과 torch 스레드 수 설정
+    """
+    if CPU_CORES and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, CPU_CORES)
+    threads = CPU_THREADS or len(CPU_CORES)
+    if threads:
+        torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(CPU_INTEROP_THREADS)
+    except RuntimeError:
+        # 이미 병렬 작업이 실행된 뒤에는 변경할 수 없음 (server mode 재로드 등)
+        pass
+
+
+def _load_transformers_model(model_name):
+    """
+    GPU: float16 + device_map="auto"
+    CPU: CPU_DTYPE 프로필 (safetensors mmap 로드, 필요하면 int8 dynamic quantization)
+    """
+    if torch.cuda.is_available():
+        return AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=torch.float16,
+            device_map="auto",
+            trust_remote_code=TRUST_REMOTE_CODE,
+        )
+
+    dtype, quantize = _cpu_dtype()
+    # low_cpu_mem_usage: 빈 모델에 safetensors(mmap)의 가중치를 바로 채워 넣어 가중치 사본을 만들지 않음
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        torch_dtype=dtype,
+        low_cpu_mem_usage=True,
+        trust_remote_code=TRUST_REMOTE_CODE,
+    )
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model.eval()
+
+
+def _report_cpu_load(load_seconds):
+    """
+    CPU 로드 결과 출력 (dtype, 스레드, peak RSS) + warm-up 생성으로 tokens/sec 측정
+    """
+    tokens_per_sec = None
+    if CPU_WARMUP_TOKENS > 0:
+        start = time.perf_counter()
+        _pipeline(
+            "public class Main {",
+            max_new_tokens=CPU_WARMUP_TOKENS,
+            min_new_tokens=CPU_WARMUP_TOKENS,
+            do_sample=False,
+            return_full_text=False,
+        )
+        warmup_seconds = time.perf_counter() - start
+        tokens_per_sec = CPU_WARMUP_TOKENS / warmup_seconds
+        metrics.record_span('warmup', warmup_seconds, tokens_per_sec=round(tokens_per_sec, 2))
+
+    # Linux: ru_maxrss는 KB 단위
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    metrics.record_span('model_load', load_seconds, dtype=CPU_DTYPE, threads=torch.get_num_threads(),
+                        peak_rss_mb=round(peak_rss_mb, 1))
+    print(f"CPU profile: dtype={CPU_DTYPE}, threads={torch.get_num_threads()}"
+          f"{f', cores={CPU_CORES}' if CPU_CORES else ''}, load {load_seconds:.1f}s, "
+          f"peak RSS {peak_rss_mb:.0f} MB"
+          f"{f', warm-up {tokens_per_sec:.1f} tokens/sec' if tokens_per_sec is not None else ''}")
+
+
+def _vllm_speculative_config():
+    """
+    SPECULATIVE_MODE에 해당하는 vLLM speculative_config (사용하지 않으면 None)
+    """
+    if SPECULATIVE_MODE == "prompt_lookup":
+        return {
+            "method": "ngram",
+            "num_speculative_tokens": SPECULATIVE_NUM_TOKENS,
+            "prompt_lookup_max": PROMPT_LOOKUP_MAX_NGRAM,
+            "prompt_lookup_min": 1,
+        }
+    if SPECULATIVE_MODE == "draft":
+        return {
+            "model": DRAFT_MODEL_NAME,
+            "num_speculative_tokens": SPECULATIVE_NUM_TOKENS,
+        }
+    return None
+
+
+def _transformers_speculative_kwargs(n):
+    """
+    SPECULATIVE_MODE에 해당하는 generate() 인자
+
+    transformers의 assisted generation은 한 번에 시퀀스 하나만 지원하므로
+    n > 1 샘플링에서는 일반 decoding을 사용합니다.
+    """
+    if n > 1:
+        return {}
+    if SPECULATIVE_MODE == "prompt_lookup":
+        return {"prompt_lookup_num_tokens": SPECULATIVE_NUM_TOKENS}
+    if SPECULATIVE_MODE == "draft":
+        return {"assistant_model": _draft_model}
+    return {}
+
+
+def get_cache():
+    """
+    싱글톤 LLM 응답 캐시 (LLM_CACHE_ENABLED=False이면 None)
+    """
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = LLMCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES)
+    return _cache
+
+
+def get_cache_stats():
+    """
+    캐시 hit/miss 통계 (캐시를 사용하지 않았으면 None)
+    """
+    if _cache is None:
+        return None
+    return _cache.stats()
+
+
+def _cache_key(prompt, max_tokens, temperature, n=1):
+    params = {
+        'version': CACHE_KEY_VERSION,
+        'model': LLM_MODEL_NAME,
+        'backend': BACKEND,
+        'max_tokens': max_tokens,
+        'temperature': temperature,
+    }
+    if n > 1:
+        params['n'] = n
+    return LLMCache.make_key(prompt, **params)
+
+
+class _FirstTokenTimer:
+    """
+    transformers generate()용 streamer: 첫 생성 토큰 시각 기록
+    (첫 번째 put은 프롬프트 input_ids, 두 번째 put부터 생성 토큰)
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.ttft = None
+        self._puts = 0
+
+    def put(self, value):
+        self._puts += 1
+        if self._puts == 2:
+            self.ttft = time.perf_counter() - self.start
+
+    def end(self):
+        pass
+
+
+def _vllm_ttft(output):
+    request_metrics = getattr(output, "metrics", None)
+    if request_metrics is None:
+        return None
+    first_token_time = getattr(request_metrics, "first_token_time", None)
+    arrival_time = getattr(request_metrics, "arrival_time", None)
+    if first_token_time is None or arrival_time is None:
+        return None
+    return first_token_time - arrival_time
+
+
+def _decoding_mode(n=1):
+    """
+    metrics 기록용 decoding 방식
+    """
+    if BACKEND == "openai":
+        return "server"
+    if BACKEND == "transformers" and n > 1:
+        return "none"
+    return SPECULATIVE_MODE
+
+
+def _local_budget():
+    """
+    예산 계산에 모델의 tokenizer/설정 파일을 읽을지 (로컬 백엔드 + TOKEN_BUDGET_ENABLED)
+    """
+    return TOKEN_BUDGET_ENABLED and BACKEND in ("vllm", "transformers") and bool(LLM_MODEL_NAME)
+
+
+def _load_budget_tokenizer():
+    """
+    예산 계산용 tokenizer (transformers 백엔드가 로드돼 있으면 그것을, 아니면 tokenizer만 한 번 로드)
+
+    Returns:
+        tokenizer or None: 로컬 백엔드가 아니거나 로드할 수 없으면 None (글자 수 기반 추정)
+    """
+    global _budget_tokenizer
+    if _tokenizer is not None:
+        return _tokenizer
+    if not _local_budget():
+        return None
+    with _budget_lock:
+        if _budget_tokenizer is None:
+            try:
+                from transformers import AutoTokenizer as BudgetTokenizer
+                _budget_tokenizer = BudgetTokenizer.from_pretrained(
+                    LLM_MODEL_NAME, trust_remote_code=TRUST_REMOTE_CODE
+                )
+            except Exception as e:
+                print(f"Warning: cannot load tokenizer for token budgets ({e}); "
+                      f"estimating {CHARS_PER_TOKEN} characters per token")
+                _budget_tokenizer = False
+    return _budget_tokenizer or None
+
+
+def prompt_token_count(text):
+    """
+    예산 계산용 토큰 수 (모델 tokenizer, 없으면 글자 수 기반 추정)
+    """
+    tokenizer = _load_budget_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text))
+
+
+def get_context_length():
+    """
+    모델 context 길이 (MODEL_CONTEXT_LENGTH, 0이면 로컬 백엔드는 HF 모델 설정, 그 외에는 DEFAULT_CONTEXT_LENGTH)
+    """
+    global _context_length
+    if MODEL_CONTEXT_LENGTH:
+        return MODEL_CONTEXT_LENGTH
+    if not _local_budget():
+        return DEFAULT_CONTEXT_LENGTH
+    with _budget_lock:
+        if _context_length is None:
+            try:
+                from transformers import AutoConfig
+                model_config = AutoConfig.from_pretrained(LLM_MODEL_NAME, trust_remote_code=TRUST_REMOTE_CODE)
+                _context_length = next(
+                    getattr(model_config, key) for key in CONTEXT_LENGTH_KEYS if getattr(model_config, key, None)
+                )
+            except Exception as e:
+                print(f"Warning: cannot read context length of {LLM_MODEL_NAME!r} ({e}); "
+                      f"using {DEFAULT_CONTEXT_LENGTH} (set MODEL_CONTEXT_LENGTH)")
+                _context_length = DEFAULT_CONTEXT_LENGTH
+            else:
+                print(f"Model context length: {_context_length} tokens")
+    return _context_length
+
+
+def expected_output_tokens(source, ratio, limit=None):
+    """
+    source 길이에 비례한 출력 토큰 수 (source 토큰 × ratio + OUTPUT_MARGIN_TOKENS, limit 이하)
+    """
+    expected = int(prompt_token_count(source) * ratio) + OUTPUT_MARGIN_TOKENS
+    return min(expected, limit) if limit else expected
+
+
+def plan_max_tokens(prompt, expected, required=None):
+    """
+    프롬프트 뒤에 남는 context 안에서 요청의 max_tokens를 정합니다.
+
+    필요한 만큼만 요청하면 vLLM이 시퀀스마다 예약하는 KV cache가 줄어
+    scheduler가 한 배치에 더 많은 요청을 묶을 수 있습니다.
+
+    Args:
+        expected (int): 예상 출력 토큰 수 (expected_output_tokens)
+        required (int): 최소한 필요한 출력 토큰 수 (기본값: min(expected, OUTPUT_MARGIN_TOKENS))
+
+    Returns:
+        int: min(expected, context 길이 - 프롬프트 토큰 수)
+
+    Raises:
+        ContextLengthError: 남는 공간이 required보다 작을 때
+    """
+    if required is None:
+        required = min(expected, OUTPUT_MARGIN_TOKENS)
+    prompt_tokens = prompt_token_count(prompt)
+    context_length = get_context_length()
+    available = context_length - prompt_tokens
+    if available < required:
+        raise ContextLengthError(
+            f"prompt of {prompt_tokens} tokens leaves {max(available, 0)} of {context_length} context tokens, "
+            f"{required} needed for the output"
+        )
+    return min(expected, available)
+
+
+def _prefix_kv_kwargs(prompt):
+    """
+    transformers: 프롬프트의 공유 prefix(src.prompts)에 대한 past_key_values
+
+    파일의 첫 호출에서 prefix만 한 번 forward해 KV cache를 보관하고, 같은 prefix로 시작하는
+    이후 호출(FL → Fix → repair)은 사본을 generate()에 넘겨 prefix prefill을 생략합니다.
+
+    Returns:
+        tuple: (generate kwargs, 재사용한 prefix 토큰 수)
+    """
+    prefix = split_prefix(prompt)
+    if prefix is None:
+        return {}, 0
+
+    entry = _prefix_kv.get(prefix)
+    hit = entry is not None
+    if hit:
+        _prefix_kv.move_to_end(prefix)
+    else:
+        prefix_ids = _tokenizer(prefix, return_tensors="pt").input_ids
+        if _tokenizer(prompt).input_ids[:prefix_ids.shape[1]] != prefix_ids[0].tolist():
+            # prefix 경계에서 토큰이 합쳐지면 재사용할 수 없음
+            entry = (0, None)
+        else:
+            model = _pipeline.model
+            with torch.no_grad():
+                output = model(prefix_ids.to(model.device), use_cache=True)
+            entry = (prefix_ids.shape[1], output.past_key_values)
+        _prefix_kv[prefix] = entry
+        while len(_prefix_kv) > PREFIX_KV_CACHE_ENTRIES:
+            _prefix_kv.popitem(last=False)
+
+    prefix_tokens, past_key_values = entry
+    if past_key_values is None:
+        return {}, 0
+    # generate()가 cache를 이어서 채우므로 매번 사본 사용
+    return {"past_key_values": copy.deepcopy(past_key_values)}, prefix_tokens if hit else 0
+
+
+def _generate(prompts, max_tokens, temperature, n=1):
+    """
+    백엔드별 생성 (캐시 없이 항상 생성)
+
+    max_tokens는 int 또는 프롬프트별 list입니다.
+
+    토큰 수는 vLLM 출력 token id / transformers tokenizer / 서버 usage 기준입니다.
+
+    Returns:
+        list: 프롬프트 순서대로 call_llm 형식의 dict
+              (n > 1이면 'texts'에 후보 n개, 'text'는 첫 번째 후보)
 
-def call_llm(prompt, max_tokens=None, temperature=None):
+    Raises:
+        PartialBatchError: OpenAI 호환 서버 요청 중 일부만 실패 (성공한 결과는 예외에 담김)
     """
-    LLM 호출 (vLLM 또는 Transformers 백엔드 자동 분기)
+    start = time.perf_counter()
+    max_tokens_list = _per_prompt(max_tokens, len(prompts))
+    errors = {}
+
+    if BACKEND == "vllm":
+        llm = get_llm_instance()
+        # n개 후보는 한 요청으로 생성 → 공통 프롬프트 prefill은 한 번만 수행
+        # 요청별 max_tokens: scheduler가 시퀀스마다 필요한 만큼만 KV cache block을 예약
+        sampling_params = [
+            SamplingParams(max_tokens=tokens, temperature=temperature, n=n) for tokens in max_tokens_list
+        ]
+        with _generate_lock:
+            outputs = llm.generate(prompts, sampling_params)
+        texts_per_prompt = [[c.text for c in o.outputs] for o in outputs]
+        prompt_counts = [len(o.prompt_token_ids) for o in outputs]
+        completion_counts = [sum(len(c.token_ids) for c in o.outputs) for o in outputs]
+        ttfts = [_vllm_ttft(o) for o in outputs]
+        cached_counts = [getattr(o, "num_cached_tokens", None) for o in outputs]
+
+    elif BACKEND == "transformers":
+        pipe = get_llm_instance()
+        timer = _FirstTokenTimer(start)
+        # return_full_text=False: 프롬프트를 제외한 생성 텍스트만 반환
+        kwargs = {'return_full_text': False, 'streamer': timer}
+        if n > 1:
+            kwargs.update({'num_return_sequences': n, 'do_sample': True})
+        speculative_kwargs = _transformers_speculative_kwargs(n)
+        kwargs.update(speculative_kwargs)
+        # 배치 생성(왼쪽 padding)과 n > 1, assisted generation에서는 prefix KV cache를 쓰지 않음
+        # padding 배치는 max_new_tokens가 하나이므로 배치에서 가장 큰 값 사용 (각 행은 EOS에서 끝남)
+        batch_max_tokens = max(max_tokens_list)
+        cached_counts = [0 if PREFIX_CACHING else None] * len(prompts)
+        with _generate_lock:
+            if len(prompts) == 1:
+                if PREFIX_CACHING and n == 1 and not speculative_kwargs:
+                    prefix_kwargs, cached_counts[0] = _prefix_kv_kwargs(prompts[0])
+                    kwargs.update(prefix_kwargs)
+                outputs = [pipe(prompts[0], max_new_tokens=batch_max_tokens, temperature=temperature, **kwargs)]
+            elif speculative_kwargs:
+                # assisted generation은 batch 크기 1만 지원 → 프롬프트별로 생성
+                outputs = [
+                    pipe(prompt, max_new_tokens=tokens, temperature=temperature, **kwargs)
+                    for prompt, tokens in zip(prompts, max_tokens_list)
+                ]
+            else:
+                outputs = pipe(
+                    prompts,
+                    max_new_tokens=batch_max_tokens,
+                    temperature=temperature,
+                    batch_size=len(prompts),
+                    **kwargs,
+                )
+        texts_per_prompt = [[r["generated_text"] for r in output] for output in outputs]
+        prompt_counts = [len(_tokenizer.encode(prompt)) for prompt in prompts]
+        completion_counts = [
+            sum(len(_tokenizer.encode(text, add_special_tokens=False)) for text in texts)
+            for texts in texts_per_prompt
+        ]
+        ttfts = [timer.ttft] * len(prompts)
+
+    elif BACKEND == "openai":
+        client = get_llm_instance()
+
+        def complete(prompt, tokens):
+            # 요청 하나가 실패해도 나머지 응답은 받아서 캐시할 수 있도록 예외를 결과로 반환
+            try:
+                return client.complete(prompt, tokens, temperature, n)
+            except Exception as e:
+                return e
+
+        # 프롬프트별 요청을 동시에 전송 (동시 요청 수는 client가 제한, 배치는 서버가 구성)
+        with ThreadPoolExecutor(max_workers=min(len(prompts), HTTP_MAX_CONCURRENCY)) as executor:
+            outputs = list(executor.map(complete, prompts, max_tokens_list))
+        errors = {i: o for i, o in enumerate(outputs) if isinstance(o, Exception)}
+        outputs = [None if i in errors else o for i, o in enumerate(outputs)]
+        texts_per_prompt = [o["texts"] if o else None for o in outputs]
+        prompt_counts = [o["prompt_tokens"] if o else None for o in outputs]
+        completion_counts = [o["completion_tokens"] if o else None for o in outputs]
+        ttfts = [o["ttft"] if o else None for o in outputs]
+        cached_counts = [o.get("cached_tokens") if o else None for o in outputs]
+
+    seconds = time.perf_counter() - start
+    if BACKEND == "openai":
+        durations = [o["seconds"] if o else None for o in outputs]
+    else:
+        durations = [seconds] * len(prompts)
+
+    results = []
+    for texts, prompt_tokens, completion_tokens, ttft, duration, cached_tokens in zip(
+        texts_per_prompt, prompt_counts, completion_counts, ttfts, durations, cached_counts
+    ):
+        if texts is None:
+            results.append(None)
+            continue
+        metrics.record_llm_call(
+            prompt_tokens, completion_tokens, duration, ttft=ttft, prefix_cached_tokens=cached_tokens,
+            backend=BACKEND, batch_size=len(prompts), n=n, decoding=_decoding_mode(n), batched=True,
+        )
+        result = _token_result(texts[0], prompt_tokens, completion_tokens)
+        if n > 1:
+            result["texts"] = texts
+        results.append(result)
+    # 배치 wall time은 한 번만 집계 (프롬프트 수만큼 더하면 tokens/sec가 배치 크기배 낮아짐)
+    metrics.record_llm_batch(seconds, len(prompts), backend=BACKEND, n=n)
+    if errors:
+        raise PartialBatchError(results, errors)
+    return results
+
+
+def call_llm(prompt, max_tokens=None, temperature=None, use_cache=True, n=1):
+    """
+    LLM 호출 (vLLM / Transformers / OpenAI 호환 서버 백엔드 자동 분기)
+
+    use_cache=False이면 응답 캐시를 건너뛰고 항상 새로 생성합니다.
+    n > 1이면 후보 n개를 한 번에 샘플링하여 'texts'로 반환합니다.
     """
     if max_tokens is None:
         max_tokens = MAX_TOKENS
     if temperature is None:
         temperature = TEMPERATURE
 
-    try:
-        if BACKEND == "vllm":
-            llm = get_llm_instance()
-            sampling_params = SamplingParams(
-                max_tokens=max_tokens,
-                temperature=temperature,
+    cache = get_cache() if use_cache else None
+    if cache is not None:
+        key = _cache_key(prompt, max_tokens, temperature, n)
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.record_llm_call(
+                cached.get("prompt_tokens", 0), cached.get("completion_tokens", 0), 0.0,
+                cached=True, backend=BACKEND,
             )
-            outputs = llm.generate([prompt], sampling_params)
-            output = outputs[0].outputs[0]
-            prompt_tokens = len(prompt.split())
-            completion_tokens = len(output.text.split())
-
-            return {
-                "text": output.text,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": prompt_tokens + completion_tokens,
-            }
-
-        elif BACKEND == "transformers":
-            pipe = get_llm_instance()
-            result = pipe(prompt, max_new_tokens=max_tokens, temperature=temperature)
-            text = result[0]["generated_text"]
-
-            prompt_tokens = len(prompt.split())
-            completion_tokens = len(text.split()) - prompt_tokens
-
-            return {
-                "text": text,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": prompt_tokens + completion_tokens,
-            }
+            return cached
 
+    try:
+        result = _generate([prompt], max_tokens, temperature, n)[0]
     except Exception as e:
         raise Exception(f"LLM call failed: {str(e)}")
 
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
 
-def call_llm_batch(prompts, max_tokens=None, temperature=None):
+def call_llm_batch(prompts, max_tokens=None, temperature=None, batch_size=None, use_cache=True, n=1):
     """
     여러 프롬프트를 배치로 처리
+
+    캐시에 있는 프롬프트는 제외하고 나머지만 배치로 생성합니다.
+    max_tokens는 모든 프롬프트에 같은 int 또는 프롬프트별 list (plan_max_tokens)입니다.
+
+    Returns:
+        list: 입력 순서대로 call_llm과 같은 형식의 dict 리스트
+              ({'text', 'prompt_tokens', 'completion_tokens', 'total_tokens'})
     """
     if max_tokens is None:
         max_tokens = MAX_TOKENS
     if temperature is None:
         temperature = TEMPERATURE
+    if batch_size is None:
+        batch_size = LLM_BATCH_SIZE
+    max_tokens = _per_prompt(max_tokens, len(prompts))
+
+    results = [None] * len(prompts)
+    keys = [None] * len(prompts)
+    pending = []
+
+    cache = get_cache() if use_cache else None
+    for i, prompt in enumerate(prompts):
+        if cache is not None:
+            keys[i] = _cache_key(prompt, max_tokens[i], temperature, n)
+            results[i] = cache.get(keys[i])
+            if results[i] is not None:
+                metrics.record_llm_call(
+                    results[i].get("prompt_tokens", 0), results[i].get("completion_tokens", 0), 0.0,
+                    cached=True, backend=BACKEND,
+                )
+        if results[i] is None:
+            pending.append(i)
+
+    def store(chunk_idx, chunk_results):
+        for i, result in zip(chunk_idx, chunk_results):
+            if result is None:
+                continue
+            results[i] = result
+            if cache is not None:
+                cache.put(keys[i], result)
 
     try:
-        if BACKEND == "vllm":
-            llm = get_llm_instance()
-            sampling_params = SamplingParams(
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
-            outputs = llm.generate(prompts, sampling_params)
-            return [o.outputs[0].text for o in outputs]
+        if BACKEND == "transformers":
+            _generate_bucketed(prompts, pending, max_tokens, temperature, batch_size, n, store)
+        elif BACKEND == "openai":
+            # 서버가 continuous batching으로 묶으므로 전체를 한 번에 전송
+            if pending:
+                try:
+                    store(pending, _generate([prompts[i] for i in pending], [max_tokens[i] for i in pending],
+                                             temperature, n))
+                except PartialBatchError as e:
+                    # 성공한 응답은 캐시해 두고 (재시도 시 실패한 프롬프트만 다시 요청) 예외 전달
+                    store(pending, e.results)
+                    raise
+        else:
+            for start in range(0, len(pending), batch_size):
+                chunk_idx = pending[start:start + batch_size]
+                chunk = [prompts[i] for i in chunk_idx]
+                store(chunk_idx, _generate(chunk, [max_tokens[i] for i in chunk_idx], temperature, n))
 
-        elif BACKEND == "transformers":
-            pipe = get_llm_instance()
-            results = pipe(prompts, max_new_tokens=max_tokens, temperature=temperature)
-            return [r[0]["generated_text"] for r in results]
+        return results
 
     except Exception as e:
         raise Exception(f"LLM batch call failed: {str(e)}")
+
+
+def _per_prompt(max_tokens, count):
+    """
+    max_tokens (int 또는 list)를 프롬프트별 list로
+    """
+    if isinstance(max_tokens, (list, tuple)):
+        return list(max_tokens)
+    return [max_tokens] * count
+
+
+def _is_oom(error):
+    message = str(error).lower()
+    return "out of memory" in message or "can't allocate memory" in message
+
+
+def _generate_bucketed(prompts, indices, max_tokens, temperature, batch_size, n, store):
+    """
+    transformers 배치 scheduler
+
+    프롬프트를 토큰 길이 순으로 정렬해 길이가 비슷한 것끼리 묶고, 배치의 padding 포함
+    토큰 수가 _max_batch_tokens를 넘지 않게 자릅니다. OOM이 나면 budget을 실패한 배치의 절반으로 줄여
+    같은 위치부터 다시 묶습니다 (프롬프트 하나로도 OOM이면 예외).
+    결과는 store(index 리스트, 결과 리스트)로 전달되므로 입력 순서와 무관합니다.
+    max_tokens는 프롬프트별 list입니다 (배치에는 그중 가장 큰 값을 적용).
+    """
+    global _max_batch_tokens
+
+    # 모두 캐시에 있으면 모델/tokenizer를 로드하지 않음
+    if not indices:
+        return
+    get_llm_instance()
+    lengths = {i: len(_tokenizer.encode(prompts[i])) for i in indices}
+    order = sorted(indices, key=lambda i: lengths[i])
+
+    position = 0
+    while position < len(order):
+        # 오름차순 정렬이므로 마지막에 추가한 프롬프트가 배치에서 가장 김
+        # (max_new_tokens는 배치에서 가장 큰 값이 모든 행에 적용됨)
+        end = position + 1
+        batch_max_tokens = max_tokens[order[position]]
+        while end < len(order) and end - position < batch_size:
+            next_max_tokens = max(batch_max_tokens, max_tokens[order[end]])
+            if (end - position + 1) * n * (lengths[order[end]] + next_max_tokens) > _max_batch_tokens:
+                break
+            batch_max_tokens = next_max_tokens
+            end += 1
+        chunk_idx = order[position:end]
+
+        try:
+            chunk_results = _generate([prompts[i] for i in chunk_idx], [max_tokens[i] for i in chunk_idx],
+                                      temperature, n)
+        except Exception as e:
+            if len(chunk_idx) == 1 or not _is_oom(e):
+                raise
+            batch_tokens = len(chunk_idx) * n * (lengths[chunk_idx[-1]] + batch_max_tokens)
+            _max_batch_tokens = max(1, min(_max_batch_tokens, batch_tokens) // 2)
+            print(f"    Out of memory with a batch of {len(chunk_idx)} prompt(s); "
+                  f"retrying with max {_max_batch_tokens} tokens per batch")
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            continue
+
+        store(chunk_idx, chunk_results)
+        position = end
+
+
+def _token_result(text, prompt_tokens, completion_tokens):
+    """
+    call_llm / call_llm_batch 공통 반환 형식
+    """
+    return {
+        "text": text,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
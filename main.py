@@ -10,48 +10,49 @@ Automated bug fixing pipeline using LLM:
 
 import os
 import json
+import argparse
 from datetime import datetime
-from src.file_utils import get_all_files
+from src.file_utils import get_all_files, output_relpath
 from src.find_FL import FaultLocalizer
-from src.fix_code import CodeFixer
-from src.test_fix import run_tests
-from config import INPUT_DIR, LOGS_OUTPUT_DIR
-from llm_client import call_llm
+from src.fix_code import CodeFixer, update_test_result
+from src.test_fix import run_tests, find_test_file
+from src.repair_loop import test_and_repair
+from src.incremental import filter_changed_files
+from src.dedup import deduplicate, fan_out_results
+from src.stream_pipeline import run_streaming
+from src.repair_server import RepairServer, submit_jobs
+from src.result_sink import open_result_sink, format_summary
+from config import (
+    INPUT_DIR, FIXES_OUTPUT_DIR, LOGS_OUTPUT_DIR, BATCH_MODE, LLM_BATCH_SIZE, INCREMENTAL_MODE,
+    STREAMING_MODE, SPECULATIVE_MODE, BACKEND, LLM_MODEL_NAME, SCAN_INCLUDE, SCAN_EXCLUDE,
+    RESULT_SINK, RESULT_SINK_PATH, RESULT_SINK_FSYNC_EVERY, DEDUP_ENABLED, ensure_output_dirs
+)
+from llm_client import call_llm, call_llm_batch, get_cache_stats, get_llm_instance
+from metrics import metrics
 
-def main():
-    print("=" * 80)
-    print("Starting Bug Fixing Pipeline with vLLM Local Instance")
-    print("=" * 80)
-    
-    # 시작 시간 기록
-    start_time = datetime.now()
-    
-    # 전체 토큰 사용량 추적
-    total_tokens = {
-        'prompt_tokens': 0,
-        'completion_tokens': 0,
-        'total_tokens': 0
-    }
-    
-    # Step 1: Get all buggy files
-    print("\n[Step 1] Loading buggy files...")
-    buggy_files = get_all_files(INPUT_DIR, extension='.java')
-    
-    if not buggy_files:
-        print(f"No Java files found in {INPUT_DIR}")
-        print("Please check if the directory exists and contains .java files")
-        return
-    
-    print(f"Found {len(buggy_files)} Java file(s):")
-    for f in buggy_files:
-        print(f"  - {os.path.basename(f)}")
+def accumulate_tokens(total_tokens, tokens):
+    """
+    파일별 토큰 사용량을 전체 합계에 누적
+    """
+    total_tokens['prompt_tokens'] += tokens.get('prompt_tokens', 0)
+    total_tokens['completion_tokens'] += tokens.get('completion_tokens', 0)
+    total_tokens['total_tokens'] += tokens.get('total_tokens', 0)
 
-    # Step 2 & 3: FL and Fix for each file
-    print("\n[Step 2 & 3] Fault Localization and Fix Generation...")
-    fault_localizer = FaultLocalizer(call_llm)
-    code_fixer = CodeFixer(call_llm)
-    
-    # 각 파일의 FL, Fix 결과 저장
+
+def drop_large_fields(fl_result, fix_result):
+    """
+    테스트/저장 단계까지 보관할 필요 없는 큰 필드 제거
+    (LLM 원문 응답, 수정 코드 - 수정 코드는 이미 output/fixes에 저장됨)
+    """
+    for result in (fl_result, fix_result):
+        result['tokens'] = {key: value for key, value in result.get('tokens', {}).items() if key != 'text'}
+    fix_result.pop('fixed_code', None)
+
+
+def run_sequential(buggy_files, fault_localizer, code_fixer, total_tokens):
+    """
+    파일 하나씩 FL → Fix 순서로 처리
+    """
     file_results = {}
     
     for file in buggy_files:
@@ -61,63 +62,323 @@ def main():
         # Fault Localization
         print(f"    → Localizing faults...")
         fl_result = fault_localizer.localize_faults(file)
-        fl_tokens = fl_result.get('tokens', {})
-        
-        # 토큰 누적
-        total_tokens['prompt_tokens'] += fl_tokens.get('prompt_tokens', 0)
-        total_tokens['completion_tokens'] += fl_tokens.get('completion_tokens', 0)
-        total_tokens['total_tokens'] += fl_tokens.get('total_tokens', 0)
+        accumulate_tokens(total_tokens, fl_result.get('tokens', {}))
         
         print(f"    → Faults found: {len(fl_result.get('faults', []))}")
         
         # Fix Generation
         print(f"    → Generating fix...")
         fix_result = code_fixer.generate_fix(file, fl_result)
-        fix_tokens = fix_result.get('tokens', {})
-        
-        # 토큰 누적
-        total_tokens['prompt_tokens'] += fix_tokens.get('prompt_tokens', 0)
-        total_tokens['completion_tokens'] += fix_tokens.get('completion_tokens', 0)
-        total_tokens['total_tokens'] += fix_tokens.get('total_tokens', 0)
+        accumulate_tokens(total_tokens, fix_result.get('tokens', {}))
+        drop_large_fields(fl_result, fix_result)
         
         # 결과 저장
         file_results[file] = {
             'fl_result': fl_result,
             'fix_result': fix_result
         }
+    
+    return file_results
 
-    # Step 4: Run tests on all fixed code
-    print("\n[Step 4] Running tests...")
-    fixed_files_info = {
-        file: results['fix_result'] 
-        for file, results in file_results.items()
-    }
-    test_results = run_tests(fixed_files_info)
+
+def run_batched(buggy_files, fault_localizer, code_fixer, total_tokens):
+    """
+    배치 처리: LLM_BATCH_SIZE개 파일씩 FL 프롬프트를 배치로 생성한 뒤,
+    곧바로 같은 파일들의 Fix 프롬프트를 배치로 생성
+    (FL과 Fix 프롬프트가 같은 prefix로 시작하므로 prefix cache가 밀려나기 전에 재사용)
+    """
+    file_results = {}
+    for start in range(0, len(buggy_files), LLM_BATCH_SIZE):
+        files = buggy_files[start:start + LLM_BATCH_SIZE]
+        print(f"\n  Batch {start // LLM_BATCH_SIZE + 1}: Localizing faults for {len(files)} file(s)...")
+        fl_results = fault_localizer.localize_faults_batch(files)
+        for file in files:
+            fl_result = fl_results[file]
+            accumulate_tokens(total_tokens, fl_result.get('tokens', {}))
+            print(f"    {os.path.basename(file)} → Faults found: {len(fl_result.get('faults', []))}")
+
+        print(f"  Batch {start // LLM_BATCH_SIZE + 1}: Generating fixes for {len(files)} file(s)...")
+        fix_results = code_fixer.generate_fix_batch(fl_results)
+        for file in files:
+            fix_result = fix_results[file]
+            accumulate_tokens(total_tokens, fix_result.get('tokens', {}))
+            drop_large_fields(fl_results[file], fix_result)
+            file_results[file] = {
+                'fl_result': fl_results[file],
+                'fix_result': fix_result
+            }
+
+    return file_results
+
+
+def run_staged(buggy_files, fault_localizer, code_fixer, total_tokens, fingerprints, duplicates=None):
+    """
+    전체 파일 FL/Fix 생성이 끝난 뒤 테스트 및 저장
+    (duplicates: 대표 파일 -> 같은 결과를 복사할 중복 파일)
+    """
+    # Step 2 & 3: FL and Fix for each file
+    print("\n[Step 2 & 3] Fault Localization and Fix Generation...")
     
-    # Step 5: Save complete results (FL + Fix + Test) to JSON files
-    print("\n[Step 5] Saving complete results...")
-    for file, results in file_results.items():
-        filename = os.path.basename(file)
-        test_result = test_results.get(filename, {
-            'compiled': False,
-            'tests_run': 0,
-            'passed': 0,
-            'failed': 0,
-            'errors': ['Test not executed']
-        })
-        
-        code_fixer.save_complete_result(
+    # 각 파일의 FL, Fix 결과 저장
+    if BATCH_MODE:
+        file_results = run_batched(buggy_files, fault_localizer, code_fixer, total_tokens)
+    else:
+        file_results = run_sequential(buggy_files, fault_localizer, code_fixer, total_tokens)
+
+    # Step 4 & 5: Run tests and save complete results (FL + Fix + Test) to JSON files
+    # 테스트는 TEST_WORKERS개씩 병렬 실행, 끝나는 파일부터 바로 저장
+    # → 중간에 중단돼도 완료된 파일은 다음 실행에서 건너뜀
+    print("\n[Step 4 & 5] Running tests and saving complete results...")
+
+    def save_result(file, test_result):
+        # 저장이 끝난 파일의 결과는 바로 해제
+        results = file_results.pop(file)
+        accumulate_tokens(total_tokens, results['fix_result'].get('repair', {}).get('token_usage', {}))
+        complete_result = code_fixer.save_complete_result(
             file,
             results['fl_result'],
             results['fix_result'],
-            test_result
+            test_result,
+            fingerprint=fingerprints.get(file)
         )
+        if duplicates and file in duplicates:
+            fan_out_results(code_fixer, file, duplicates[file], complete_result, fingerprints)
+
+    fixed_files_info = {
+        file: results['fix_result']
+        for file, results in file_results.items()
+    }
+    fl_results = {file: results['fl_result'] for file, results in file_results.items()}
+    # REPAIR_LOOP_ENABLED: 실패한 fix는 javac/JUnit 피드백으로 다시 생성
+    run_tests(
+        fixed_files_info,
+        on_result=save_result,
+        test=lambda file, fix_result: test_and_repair(code_fixer, file, fl_results[file], fix_result)
+    )
+
+
+def run_dry_run(buggy_files, duplicates=None):
+    """
+    처리 대상과 설정만 출력 (LLM 호출, 테스트 실행, 파일 쓰기 없음)
+    """
+    print("\n[Dry Run] Files that would be processed:")
+    for file in buggy_files:
+        test_status = 'test found' if os.path.exists(find_test_file(file)) else 'test file missing'
+        members = (duplicates or {}).get(file, [])
+        dedup_status = f", +{len(members)} duplicate(s)" if members else ''
+        print(f"  - {output_relpath(file)} ({test_status}{dedup_status})")
+    print(f"\nBackend: {BACKEND} (model: {LLM_MODEL_NAME or 'not set'})")
+    print(f"Execution Mode: {'batched' if BATCH_MODE else 'sequential'}"
+          f"{' (streaming)' if STREAMING_MODE else ''}")
+
+
+def run_tests_only(buggy_files, result_sink=None):
+    """
+    output/fixes에 이미 있는 수정 코드로 테스트만 다시 실행하고 결과 JSON의 'test' 항목 갱신
+    (LLM 백엔드를 로드하지 않음)
+
+    Returns:
+        list: 테스트한 파일
+    """
+    print("\n[Tests Only] Re-running tests on existing fixes...")
+    fixed_files_info = {}
+    for file in buggy_files:
+        if os.path.exists(os.path.join(FIXES_OUTPUT_DIR, output_relpath(file))):
+            fixed_files_info[file] = None
+        else:
+            print(f"  Skipping {output_relpath(file)}: no fixed file in {FIXES_OUTPUT_DIR}")
+
+    run_tests(
+        fixed_files_info,
+        on_result=lambda file, test_result: update_test_result(file, test_result, result_sink)
+    )
+    return list(fixed_files_info)
+
+
+def run_server(run_id):
+    """
+    모델을 한 번 로드한 뒤 Unix socket으로 수리 작업을 받아 처리 (SIGINT/SIGTERM으로 종료)
+    """
+    ensure_output_dirs()
+    metrics.open(os.path.join(LOGS_OUTPUT_DIR, f'metrics_server_{run_id}.jsonl'))
+    result_sink = open_result_sink(RESULT_SINK, RESULT_SINK_PATH, RESULT_SINK_FSYNC_EVERY)
+    try:
+        get_llm_instance()
+        code_fixer = CodeFixer(call_llm, call_llm_batch, result_sink=result_sink)
+        server = RepairServer(FaultLocalizer(call_llm, call_llm_batch), code_fixer)
+        server.serve_forever()
+    finally:
+        if result_sink is not None:
+            result_sink.close()
+        print(metrics.format_summary())
+        metrics.close()
+
+
+def run_submit(file_paths):
+    """
+    실행 중인 서버에 파일별 수리 작업을 보내고 응답(JSON lines)을 그대로 출력
+    """
+    jobs = [
+        {'id': str(i), 'file': os.path.abspath(file_path)}
+        for i, file_path in enumerate(file_paths)
+    ]
+    for response in submit_jobs(jobs):
+        print(json.dumps(response, ensure_ascii=False))
+
+
+def parse_shard(value):
+    """
+    '--shard i/N' → (i, N)
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, N): {value!r}")
+    return index, count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="LLM Bug Fixer Pipeline")
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N',
+                        help="process only shard i of N (stable hash of the path under INPUT_DIR)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--tests-only', action='store_true',
+                      help="re-run tests on existing fixes in output/fixes without loading the model")
+    mode.add_argument('--dry-run', action='store_true',
+                      help="list the files that would be processed and exit")
+    mode.add_argument('--serve', action='store_true',
+                      help="keep the model loaded and accept repair jobs on SERVER_SOCKET_PATH")
+    mode.add_argument('--submit', nargs='+', metavar='FILE',
+                      help="send repair jobs for FILE(s) to a running server and print the results")
+    mode.add_argument('--summary', nargs='?', const=RESULT_SINK_PATH, metavar='PATH',
+                      help=f"aggregate a result sink (.jsonl, .jsonl.gz or SQLite; default: {RESULT_SINK_PATH})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.submit:
+        run_submit(args.submit)
+        return
+    if args.summary:
+        if not os.path.exists(args.summary):
+            raise SystemExit(f"No results at {args.summary}")
+        print(format_summary(args.summary))
+        return
+
+    print("=" * 80)
+    print("Starting Bug Fixing Pipeline with vLLM Local Instance")
+    print("=" * 80)
+    
+    # 시작 시간 기록
+    start_time = datetime.now()
+    run_id = start_time.strftime("%Y%m%d_%H%M%S")
+
+    if args.serve:
+        run_server(run_id)
+        return
+    
+    # 전체 토큰 사용량 추적
+    total_tokens = {
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'total_tokens': 0
+    }
+    
+    # Step 1: Get all buggy files
+    print("\n[Step 1] Loading buggy files...")
+    buggy_files = get_all_files(INPUT_DIR, extension='.java', include=SCAN_INCLUDE, exclude=SCAN_EXCLUDE,
+                                shard=args.shard)
+    
+    if not buggy_files:
+        print(f"No Java files found in {INPUT_DIR}")
+        print("Please check if the directory exists and contains .java files")
+        return
+    
+    shard_info = f" in shard {args.shard[0]}/{args.shard[1]}" if args.shard else ""
+    print(f"Found {len(buggy_files)} Java file(s){shard_info}:")
+    for f in buggy_files:
+        print(f"  - {output_relpath(f)}")
+
+    # Incremental mode: 입력(소스/테스트/프롬프트/모델)이 그대로인 파일은 건너뜀
+    fingerprints = {}
+    skipped_files = []
+    if INCREMENTAL_MODE and not args.tests_only:
+        total_found = len(buggy_files)
+        buggy_files, skipped_files, fingerprints = filter_changed_files(buggy_files)
+        print(f"Incremental mode: {len(skipped_files)} unchanged file(s) skipped, "
+              f"{len(buggy_files)} of {total_found} to process")
+
+    # Corpus dedup: 같은 클래스 + 같은 테스트는 대표 파일 하나만 처리하고 결과를 복사
+    duplicates = {}
+    if DEDUP_ENABLED and not args.tests_only:
+        buggy_files, duplicates = deduplicate(buggy_files)
+
+    if args.dry_run:
+        run_dry_run(buggy_files, duplicates)
+        return
+
+    ensure_output_dirs()
+
+    # stage별 timing / LLM 호출 기록 (JSONL)
+    metrics_path = os.path.join(LOGS_OUTPUT_DIR, f'metrics_{run_id}.jsonl')
+    metrics.open(metrics_path)
+
+    # 파일별 결과를 완료 즉시 추가하는 sink
+    result_sink = open_result_sink(RESULT_SINK, RESULT_SINK_PATH, RESULT_SINK_FSYNC_EVERY)
+
+    fault_localizer = FaultLocalizer(call_llm, call_llm_batch)
+    code_fixer = CodeFixer(call_llm, call_llm_batch, result_sink=result_sink)
+
+    execution_mode = f"{'batched' if BATCH_MODE else 'sequential'}{' (streaming)' if STREAMING_MODE else ''}"
+    if args.tests_only:
+        buggy_files = run_tests_only(buggy_files, result_sink)
+        execution_mode = 'tests-only'
+    elif STREAMING_MODE:
+        # Step 2-5: 생성 → 테스트 → 저장 stage를 동시에 실행
+        print("\n[Step 2-5] Streaming Fault Localization, Fix Generation, Tests and Saving...")
+
+        def complete_file(file, fl_result, fix_result, test_result):
+            accumulate_tokens(total_tokens, fl_result.get('tokens', {}))
+            accumulate_tokens(total_tokens, fix_result.get('tokens', {}))
+            accumulate_tokens(total_tokens, fix_result.get('repair', {}).get('token_usage', {}))
+            complete_result = code_fixer.save_complete_result(
+                file,
+                fl_result,
+                fix_result,
+                test_result,
+                fingerprint=fingerprints.get(file)
+            )
+            if file in duplicates:
+                fan_out_results(code_fixer, file, duplicates[file], complete_result, fingerprints)
+
+        run_streaming(buggy_files, fault_localizer, code_fixer, complete_file)
+    else:
+        run_staged(buggy_files, fault_localizer, code_fixer, total_tokens, fingerprints, duplicates)
     
+    if result_sink is not None:
+        result_sink.close()
+        sink_log = f"Result sink ({RESULT_SINK}): {RESULT_SINK_PATH}"
+    else:
+        sink_log = "Result sink: disabled"
+
     # 콘솔 로그 저장
     end_time = datetime.now()
     duration = (end_time - start_time).total_seconds()
     
-    log_path = os.path.join(LOGS_OUTPUT_DIR, f'pipeline_{start_time.strftime("%Y%m%d_%H%M%S")}.log')
+    log_path = os.path.join(LOGS_OUTPUT_DIR, f'pipeline_{run_id}.log')
+    cache_stats = get_cache_stats()
+    if cache_stats is not None:
+        cache_log = (f"LLM Cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es), "
+                     f"{cache_stats['evictions']} eviction(s), "
+                     f"{cache_stats['entries']} entries / {cache_stats['size_bytes']} bytes")
+    else:
+        cache_log = "LLM Cache: disabled"
+    metrics_log = metrics.format_summary()
+    metrics.close()
     log_content = f"""Bug Fixing Pipeline Execution Log
 ================================================================================
 Start Time: {start_time.isoformat()}
@@ -125,11 +386,21 @@ End Time: {end_time.isoformat()}
 Duration: {duration:.2f} seconds
 
 Files Processed: {len(buggy_files)}
+Shard: {f"{args.shard[0]}/{args.shard[1]}" if args.shard else 'all'}
+Files Skipped (unchanged): {len(skipped_files)}
+Files Deduplicated (results copied): {sum(len(members) for members in duplicates.values())}
+Execution Mode: {execution_mode}
+Decoding Mode: {SPECULATIVE_MODE}
 Total Tokens Used: {total_tokens['total_tokens']}
   - Prompt Tokens: {total_tokens['prompt_tokens']}
   - Completion Tokens: {total_tokens['completion_tokens']}
+{cache_log}
+
+{metrics_log}
 
 Results saved to: output/fixes/
+{sink_log}
+Metrics saved to: {metrics_path}
 ================================================================================
 """
     
@@ -140,8 +411,12 @@ Results saved to: output/fixes/
     print("Bug Fixing Pipeline Completed!")
     print(f"Duration: {duration:.2f} seconds")
     print(f"Total tokens used: {total_tokens['total_tokens']}")
+    print(cache_log)
+    print(metrics_log)
     print(f"Complete results saved to: output/fixes/")
+    print(sink_log)
     print(f"Log saved to: {log_path}")
+    print(f"Metrics saved to: {metrics_path}")
     print("=" * 80)
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+"""
+파이프라인 계측
+===============
+stage별 timing span, LLM 호출별 토큰/지연 시간, 큐 대기 시간을 기록합니다.
+open()으로 파일을 지정하면 각 기록이 JSONL 한 줄로 즉시 추가되고,
+summary()는 실행 전체의 stage별 집계를 반환합니다.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class MetricsRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file = None
+        self._stages = {}
+        self._llm = {
+            'calls': 0,
+            'cached_calls': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'generation_seconds': 0.0,
+            'ttft_total': 0.0,
+            'ttft_count': 0,
+            # 백엔드가 prefix cache 재사용량을 알려준 호출만 집계
+            'prefix_prompt_tokens': 0,
+            'prefix_cached_tokens': 0,
+        }
+
+    def open(self, path):
+        """
+        이후 기록을 path(JSONL)에 추가
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, record):
+        if self._file is not None:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def record_span(self, stage, seconds, **fields):
+        with self._lock:
+            stats = self._stages.setdefault(stage, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stats['count'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            self._write({'type': 'span', 'stage': stage, 'seconds': round(seconds, 6),
+                         'timestamp': time.time(), **fields})
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """
+        with metrics.span('javac', file=path): ...
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_span(stage, time.perf_counter() - start, **fields)
+
+    def record_llm_call(self, prompt_tokens, completion_tokens, seconds, ttft=None, cached=False,
+                        prefix_cached_tokens=None, batched=False, **fields):
+        """
+        LLM 호출 한 건 (프롬프트 하나 기준) 기록
+        prefix_cached_tokens: 백엔드 prefix cache에서 재사용한 프롬프트 토큰 수 (알 수 없으면 None)
+        batched: 배치의 일부이면 True - 생성 시간은 record_llm_batch()로 배치당 한 번만 집계
+        """
+        tokens_per_sec = completion_tokens / seconds if seconds > 0 and not cached else None
+        with self._lock:
+            llm = self._llm
+            llm['calls'] += 1
+            if cached:
+                llm['cached_calls'] += 1
+            else:
+                llm['prompt_tokens'] += prompt_tokens
+                llm['completion_tokens'] += completion_tokens
+                if not batched:
+                    llm['generation_seconds'] += seconds
+                if ttft is not None:
+                    llm['ttft_total'] += ttft
+                    llm['ttft_count'] += 1
+                if prefix_cached_tokens is not None:
+                    llm['prefix_prompt_tokens'] += prompt_tokens
+                    llm['prefix_cached_tokens'] += prefix_cached_tokens
+            self._write({
+                'type': 'llm_call',
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'seconds': round(seconds, 6),
+                'ttft': round(ttft, 6) if ttft is not None else None,
+                'prefix_cached_tokens': prefix_cached_tokens,
+                'tokens_per_sec': round(tokens_per_sec, 2) if tokens_per_sec is not None else None,
+                'cached': cached,
+                'timestamp': time.time(),
+                **fields,
+            })
+
+    def record_llm_batch(self, seconds, batch_size, **fields):
+        """
+        배치 생성 한 번의 wall time 기록 (프롬프트별 기록은 record_llm_call(batched=True))
+        """
+        with self._lock:
+            self._llm['generation_seconds'] += seconds
+            self._write({
+                'type': 'llm_batch',
+                'seconds': round(seconds, 6),
+                'batch_size': batch_size,
+                'timestamp': time.time(),
+                **fields,
+            })
+
+    def summary(self):
+        """
+        Returns:
+            dict: {'stages': {stage: {count, total_seconds, mean_seconds, max_seconds}},
+                   'llm': {calls, cached_calls, prompt_tokens, completion_tokens,
+                           tokens_per_sec, mean_ttft, prefix_hit_rate}}
+        """
+        with self._lock:
+            stages = {
+                stage: {
+                    'count': s['count'],
+                    'total_seconds': round(s['total_seconds'], 3),
+                    'mean_seconds': round(s['total_seconds'] / s['count'], 3),
+                    'max_seconds': round(s['max_seconds'], 3),
+                }
+                for stage, s in self._stages.items()
+            }
+            llm = self._llm
+            return {
+                'stages': stages,
+                'llm': {
+                    'calls': llm['calls'],
+                    'cached_calls': llm['cached_calls'],
+                    'prompt_tokens': llm['prompt_tokens'],
+                    'completion_tokens': llm['completion_tokens'],
+                    'tokens_per_sec': round(llm['completion_tokens'] / llm['generation_seconds'], 2)
+                    if llm['generation_seconds'] > 0 else None,
+                    'mean_ttft': round(llm['ttft_total'] / llm['ttft_count'], 4)
+                    if llm['ttft_count'] else None,
+                    # prefix cache에서 재사용한 프롬프트 토큰 비율
+                    'prefix_hit_rate': round(llm['prefix_cached_tokens'] / llm['prefix_prompt_tokens'], 4)
+                    if llm['prefix_prompt_tokens'] else None,
+                },
+            }
+
+    def format_summary(self):
+        """
+        pipeline 로그용 텍스트 요약
+        """
+        summary = self.summary()
+        lines = ["Stage Timings (count / total / mean / max seconds):"]
+        for stage, s in sorted(summary['stages'].items()):
+            lines.append(f"  - {stage}: {s['count']} / {s['total_seconds']} / "
+                         f"{s['mean_seconds']} / {s['max_seconds']}")
+        llm = summary['llm']
+        lines.append(f"LLM Calls: {llm['calls']} ({llm['cached_calls']} cached), "
+                     f"{llm['tokens_per_sec']} tokens/sec, mean TTFT {llm['mean_ttft']} s, "
+                     f"prefix cache hit rate {llm['prefix_hit_rate']}")
+        return '\n'.join(lines)
+
+
+# 프로세스 전역 recorder
+metrics = MetricsRecorder()
\ No newline at end of file
@@ -0,0 +1,40 @@
+import hashlib
+
+
+def normalize_code(code):
+    """
+    공백/빈 줄 차이를 무시한 비교용 코드
+    """
+    return '\n'.join(line.strip() for line in code.split('\n') if line.strip())
+
+
+def dedupe_candidates(candidates):
+    """
+    Mark candidates whose code is identical (ignoring whitespace) to an earlier one.
+
+    Args:
+        candidates (list): [{'index': int, 'fixed_code': str or None, ...}]
+
+    Returns:
+        list: the same dicts; duplicates get 'duplicate_of' (index of the first copy)
+    """
+    seen = {}
+    for candidate in candidates:
+        if candidate.get('fixed_code') is None:
+            continue
+        digest = hashlib.sha256(normalize_code(candidate['fixed_code']).encode('utf-8')).hexdigest()
+        if digest in seen:
+            candidate['duplicate_of'] = seen[digest]
+        else:
+            seen[digest] = candidate['index']
+    return candidates
+
+
+def unique_candidates(candidates):
+    """
+    검증이 필요한 후보만 반환 (파싱 실패/중복 제외)
+    """
+    return [
+        c for c in candidates
+        if c.get('fixed_code') is not None and 'duplicate_of' not in c
+    ]
\ No newline at end of file
@@ -0,0 +1,130 @@
+import copy
+import hashlib
+import os
+import re
+from config import FIXES_OUTPUT_DIR, DEDUP_IGNORE_PACKAGE
+from src.file_utils import read_file, write_file, output_relpath
+from src.java_index import index_java
+from src.test_fix import PACKAGE_RE, find_test_file
+
+# 텍스트 블록/문자열/문자 리터럴, 주석, 식별자, 기호 단위 토큰 (리터럴 내부의 공백은 그대로 유지)
+TOKEN_RE = re.compile(
+    r'"""[\s\S]*?"""|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|//[^\n]*|/\*[\s\S]*?\*/|[\w$]+|\S'
+)
+# 정규화된 코드 맨 앞의 package 선언 ("package com . acme ;")
+NORMALIZED_PACKAGE_RE = re.compile(r'^package [\w$. ]+ ;\s*')
+
+
+def normalize_source(code, ignore_package=None):
+    """
+    주석과 공백 차이를 없앤 코드 (ignore_package면 package 선언도 제외)
+    """
+    tokens = [token for token in TOKEN_RE.findall(code) if not token.startswith(('//', '/*'))]
+    normalized = ' '.join(tokens)
+    if DEDUP_IGNORE_PACKAGE if ignore_package is None else ignore_package:
+        normalized = NORMALIZED_PACKAGE_RE.sub('', normalized, count=1)
+    return normalized
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def class_key(file_path, code):
+    """
+    동치 클래스 key: 정규화한 대상 코드 + 대응 테스트 코드
+    (테스트가 다르면 테스트 결과를 공유할 수 없으므로 다른 클래스로 봄)
+    """
+    test_file = find_test_file(file_path)
+    test_code = read_file(test_file) if os.path.exists(test_file) else None
+    test_part = normalize_source(test_code) if test_code is not None else '<no test>'
+    return _digest(normalize_source(code) + '\0' + test_part)
+
+
+def method_keys(code):
+    """
+    메서드별 정규화 hash (파일이 달라도 같은 메서드가 반복되는지 집계용)
+    """
+    lines = code.split('\n')
+    return {
+        _digest(normalize_source('\n'.join(lines[method.start - 1:method.end]), ignore_package=False))
+        for method in index_java(code).methods
+    }
+
+
+def deduplicate(files):
+    """
+    같은 클래스(주석/공백/package 차이 무시)와 같은 테스트를 가진 파일을 묶습니다.
+    각 묶음의 첫 번째 파일만 FL/Fix/테스트를 실행하고 나머지는 fan_out_results로 결과를 받습니다.
+
+    Returns:
+        tuple: (대표 파일 list (입력 순서), {대표 파일: [중복 파일, ...]})
+    """
+    representatives = []
+    duplicates = {}
+    by_key = {}
+    method_classes = {}
+    for file_path in files:
+        code = read_file(file_path)
+        if code is None:
+            representatives.append(file_path)
+            continue
+        key = class_key(file_path, code)
+        representative = by_key.get(key)
+        if representative is not None:
+            duplicates.setdefault(representative, []).append(file_path)
+            continue
+        by_key[key] = file_path
+        representatives.append(file_path)
+        for method_key in method_keys(code):
+            method_classes.setdefault(method_key, set()).add(key)
+
+    shared_methods = sum(1 for classes in method_classes.values() if len(classes) > 1)
+    skipped = sum(len(members) for members in duplicates.values())
+    print(f"Dedup: {len(files)} file(s) -> {len(representatives)} unique class(es), "
+          f"{skipped} duplicate(s) skipped, {shared_methods} method(s) repeated in other classes")
+    return representatives, duplicates
+
+
+def with_package(code, package):
+    """
+    code의 package 선언을 package로 교체 (None이면 선언 제거, 줄 번호는 유지)
+    """
+    match = PACKAGE_RE.search(code)
+    if match:
+        if package:
+            return code[:match.start(1)] + package + code[match.end(1):]
+        start = match.start(0) + len(match.group(0)) - len(match.group(0).lstrip())
+        return code[:start] + code[match.end(0):]
+    return f"package {package};\n{code}" if package else code
+
+
+def fan_out_results(code_fixer, representative, members, complete_result, fingerprints=None):
+    """
+    대표 파일의 결과를 중복 파일마다 복사해 저장합니다.
+    수정 코드는 각 파일의 package로 바꿔 output/fixes/<파일 경로>에 쓰고,
+    토큰 사용량은 대표 파일에만 남깁니다 (합계 중복 방지).
+    """
+    fixed_code = None
+    representative_fixed = complete_result['fix'].get('fixed_file')
+    if representative_fixed and os.path.exists(representative_fixed):
+        fixed_code = read_file(representative_fixed)
+
+    for member in members:
+        result = copy.deepcopy(complete_result)
+        result['file'] = os.path.basename(member)
+        result['original_path'] = member
+        result['fix']['fixed_file'] = None
+        if fixed_code is not None:
+            match = PACKAGE_RE.search(read_file(member) or '')
+            fixed_file = os.path.join(FIXES_OUTPUT_DIR, output_relpath(member))
+            write_file(fixed_file, with_package(fixed_code, match.group(1) if match else None))
+            result['fix']['fixed_file'] = fixed_file
+        for stage in ('fl', 'fix'):
+            result[stage]['token_usage'] = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        result['dedup'] = {'representative': representative}
+        result.pop('fingerprint', None)
+        # 대표 파일 결과가 실패라 fingerprint가 없으면 중복 파일도 다음 실행에서 다시 처리
+        if 'fingerprint' in complete_result and fingerprints and fingerprints.get(member) is not None:
+            result['fingerprint'] = fingerprints[member]
+        code_fixer.store_result(member, result)
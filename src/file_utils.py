@@ -1,29 +1,105 @@
 import os
+import hashlib
+from fnmatch import fnmatch
+from config import INPUT_DIR
 
-def get_all_files(directory, extension='.java'):
+def glob_match(rel_path, pattern):
     """
-    디렉토리에서 모든 파일을 가져옵니다.
+    상대 경로 glob 비교 (fnmatch, 앞의 '**/'는 디렉토리 0개 이상과 일치 → '**/generated/**'가 최상위 generated/도 제외)
+    """
+    if fnmatch(rel_path, pattern):
+        return True
+    while pattern.startswith('**/'):
+        pattern = pattern[3:]
+        if fnmatch(rel_path, pattern):
+            return True
+    return False
+
+def iter_files(directory, extension='.java', include=None, exclude=None, shard=None):
+    """
+    디렉토리 아래의 파일을 재귀적으로 하나씩 반환합니다 (generator).
+    각 디렉토리의 항목은 이름 순으로 탐색하므로 순서가 항상 같습니다.
+    
+    Args:
+        directory (str): 파일을 찾을 디렉토리
+        extension (str): 파일 확장자 (기본값: .java, None이면 모든 파일)
+        include (list): directory 기준 상대 경로 glob, 하나라도 맞는 파일만 반환 (없으면 전체)
+        exclude (list): directory 기준 상대 경로 glob, 맞는 파일/디렉토리는 제외 (예: '**/generated/**')
+        shard (tuple): (i, N)이면 상대 경로 해시 기준 N개 중 i번째 shard의 파일만 반환
+        
+    Yields:
+        str: 파일 경로
+    """
+    include = include or []
+    exclude = exclude or []
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Error scanning directory {current}: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            rel_path = os.path.relpath(entry.path, directory).replace(os.sep, '/')
+            if entry.is_dir(follow_symlinks=False):
+                if not any(glob_match(rel_path + '/', pattern) for pattern in exclude):
+                    subdirs.append(entry.path)
+                continue
+            if not entry.is_file():
+                continue
+            if extension and not entry.name.endswith(extension):
+                continue
+            if include and not any(glob_match(rel_path, pattern) for pattern in include):
+                continue
+            if any(glob_match(rel_path, pattern) for pattern in exclude):
+                continue
+            if shard is not None and shard_index(rel_path, shard[1]) != shard[0]:
+                continue
+            yield entry.path
+
+        # 이름 순 탐색을 위해 역순으로 push
+        stack.extend(reversed(subdirs))
+
+def shard_index(rel_path, num_shards):
+    """
+    상대 경로 해시로 정한 shard 번호 (호스트 간 조율 없이 같은 결과)
+    """
+    digest = hashlib.sha1(rel_path.encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % num_shards
+
+def get_all_files(directory, extension='.java', include=None, exclude=None, shard=None):
+    """
+    디렉토리에서 모든 파일을 가져옵니다 (하위 디렉토리 포함, iter_files 참고).
     
     Args:
         directory (str): 파일을 찾을 디렉토리
         extension (str): 파일 확장자 (기본값: .java)
+        include (list): 포함할 상대 경로 glob
+        exclude (list): 제외할 상대 경로 glob
+        shard (tuple): (i, N) shard 지정
         
     Returns:
         list: 파일 경로 리스트
     """
-    files = []
-    
     if not os.path.exists(directory):
         print(f"Error: Directory not found: {directory}")
-        return files
+        return []
     
-    for filename in os.listdir(directory):
-        if filename.endswith(extension):
-            file_path = os.path.join(directory, filename)
-            if os.path.isfile(file_path):
-                files.append(file_path)
-    
-    return sorted(files)
+    return list(iter_files(directory, extension, include=include, exclude=exclude, shard=shard))
+
+def output_relpath(file_path):
+    """
+    출력 파일 이름으로 쓸 상대 경로 (INPUT_DIR 아래 파일은 패키지 디렉토리 유지, 그 외에는 파일 이름)
+    예: data/target/com/acme/Util.java -> com/acme/Util.java
+    """
+    rel_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(INPUT_DIR))
+    if rel_path.startswith(os.pardir + os.sep) or rel_path == os.pardir:
+        return os.path.basename(file_path)
+    return rel_path
 
 def read_file(file_path):
     """
@@ -55,4 +131,19 @@ def write_file(file_path, content):
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(content)
     except Exception as e:
-        print(f"Error writing file {file_path}: {e}")
\ No newline at end of file
+        print(f"Error writing file {file_path}: {e}")
+
+def number_lines(code, start=1):
+    """
+    코드 각 줄 앞에 줄 번호를 붙입니다. (예: "12: return a - b;")
+    
+    Args:
+        code (str): 코드
+        start (int): 첫 줄 번호 (기본값: 1)
+        
+    Returns:
+        str: 줄 번호가 붙은 코드
+    """
+    return '\n'.join(
+        f"{i}: {line}" for i, line in enumerate(code.split('\n'), start=start)
+    )
@@ -1,50 +1,295 @@
-from src.file_utils import read_file
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    FL_CHUNKING, FL_CHUNK_MAX_LINES, SBFL_ENABLED, TEST_WORKERS, PROMPT_LAYOUT, MAX_TOKENS, TOKEN_BUDGET_ENABLED,
+    FL_OUTPUT_RATIO
+)
+from llm_client import ContextLengthError, expected_output_tokens, plan_max_tokens
+from metrics import metrics
+from src.file_utils import read_file, number_lines
+from src.java_index import build_chunks, render_ranges
+from src.prompts import FL_INSTRUCTIONS, fl_prompt
+from src.sbfl import spectrum_localize, spectrum_faults, suspicious_regions, spectrum_summary
+
+# 개선된 프롬프트 (지시 부분은 src.prompts.FL_INSTRUCTIONS 공통)
+FL_PROMPT_TEMPLATE = """Analyze the following Java code and identify potential bugs.
+
+Code (with line numbers):
+{code}
+
+Instructions:
+""" + FL_INSTRUCTIONS
+
+# Chunk 단위 FL: 원본 줄 번호가 붙은 메서드 묶음 + 필요한 context(import, 클래스 선언, 필드)만 전달
+FL_CHUNK_PROMPT_TEMPLATE = """Analyze the following part of a Java file and identify potential bugs.
+
+Context (package, imports, class declarations and fields):
+{context}
+
+Code (with original line numbers):
+{code}
+
+Instructions:
+- Only report faults in the Code section
+""" + FL_INSTRUCTIONS
+
+# SBFL로 좁힌 FL: 실패 테스트가 실행한 의심 줄이 속한 메서드 + 실패 테스트 메시지만 전달
+FL_SBFL_PROMPT_TEMPLATE = """Analyze the following part of a Java file and identify potential bugs.
+The methods shown contain the statements most often executed by the failing tests.
+
+Context (package, imports, class declarations and fields):
+{context}
+
+Failing tests:
+{failures}
+
+Code (with original line numbers):
+{code}
+
+Instructions:
+- Only report faults in the Code section
+""" + FL_INSTRUCTIONS
+
+LINE_NUMBER_RE = re.compile(r'^Line\s+(\d+)')
+
 
 class FaultLocalizer:
-    def __init__(self, llm_client):
+    def __init__(self, llm_client, llm_batch_client=None):
         self.llm_client = llm_client
+        self.llm_batch_client = llm_batch_client
 
     def localize_faults(self, file_path):
         """
         Analyze a file to localize potential faults using LLM.
         """
-        code = read_file(file_path)
+        with metrics.span('file_read', file=file_path):
+            code = read_file(file_path)
         if code is None:
-            return {'faults': [], 'tokens': {}}
-        
-        # 개선된 프롬프트
-        prompt = f"""Analyze the following Java code and identify potential bugs.
+            return {'faults': [], 'tokens': {}, 'error': 'Could not read file'}
 
-Code:
-{code}
+        spectrum = spectrum_localize(file_path, code) if SBFL_ENABLED else None
+        if spectrum is not None and spectrum['confident']:
+            return self._spectrum_result(file_path, spectrum)
 
-Instructions:
-- List each fault on a new line
-- Format: "Line X: [brief description]"
-- Focus on logical errors, missing returns, type mismatches, etc.
-- Do NOT use markdown formatting
-- Example format:
-  Line 5: Method returns wrong value
-  Line 12: Missing return statement
-
-Faults:
-"""
-        
         try:
-            response = self.llm_client(prompt)
-            faults = self._parse_fault_response(response['text'])
-            
-            fl_result = {
-                'faults': faults,
-                'tokens': response
-            }
-            
-            return fl_result
+            requests = self._planned_prompts(file_path, code, spectrum)
+        except ContextLengthError as e:
+            return self._too_large_result(file_path, e)
+
+        try:
+            with metrics.span('fl_generation', file=file_path):
+                responses = [self.llm_client(prompt, **kwargs) for prompt, kwargs in requests]
+            return self._build_result(responses, spectrum)
         except Exception as e:
             print(f"Error calling LLM for fault localization: {e}")
-            return {'faults': [], 'tokens': {}}
-    
-    def _parse_fault_response(self, response):
+            return {'faults': [], 'tokens': {}, 'error': str(e)}
+
+    def localize_faults_batch(self, file_paths):
+        """
+        Localize faults for many files with a single batched LLM call.
+
+        Returns:
+            dict: file_path -> fl_result (same shape as localize_faults)
+        """
+        results = {}
+        prompts = []
+        prompt_max_tokens = []
+        prompt_files = []
+        codes = {}
+        for file_path in file_paths:
+            with metrics.span('file_read', file=file_path):
+                code = read_file(file_path)
+            if code is None:
+                results[file_path] = {'faults': [], 'tokens': {}, 'error': 'Could not read file'}
+                continue
+            codes[file_path] = code
+
+        # SBFL coverage 실행은 파일별 javac/JUnit이므로 테스트 worker 수만큼 병렬 실행
+        spectra = {}
+        if SBFL_ENABLED and codes:
+            with ThreadPoolExecutor(max_workers=max(1, min(TEST_WORKERS, len(codes)))) as executor:
+                spectra = dict(zip(codes, executor.map(lambda item: spectrum_localize(*item), codes.items())))
+
+        for file_path, code in codes.items():
+            spectrum = spectra.get(file_path)
+            if spectrum is not None and spectrum['confident']:
+                results[file_path] = self._spectrum_result(file_path, spectrum)
+                continue
+            try:
+                requests = self._planned_prompts(file_path, code, spectrum)
+            except ContextLengthError as e:
+                results[file_path] = self._too_large_result(file_path, e)
+                continue
+            for prompt, kwargs in requests:
+                prompts.append(prompt)
+                prompt_max_tokens.append(kwargs.get('max_tokens', MAX_TOKENS))
+                prompt_files.append(file_path)
+
+        if not prompts:
+            return results
+
+        try:
+            with metrics.span('fl_generation', files=len(set(prompt_files)), prompts=len(prompts)):
+                responses = self.llm_batch_client(prompts, max_tokens=prompt_max_tokens)
+            file_responses = {}
+            for file_path, response in zip(prompt_files, responses):
+                file_responses.setdefault(file_path, []).append(response)
+            for file_path, chunk_responses in file_responses.items():
+                results[file_path] = self._build_result(chunk_responses, spectra.get(file_path))
+        except Exception as e:
+            print(f"Error calling LLM for batched fault localization: {e}")
+            for file_path in prompt_files:
+                results[file_path] = {'faults': [], 'tokens': {}, 'error': str(e)}
+
+        return results
+
+    def build_prompt(self, code):
+        if PROMPT_LAYOUT == 'shared_prefix':
+            # Fix 프롬프트와 같은 prefix (공통 지시문 + 코드)
+            return fl_prompt(code)
+        return FL_PROMPT_TEMPLATE.format(code=number_lines(code))
+
+    def build_prompts(self, code):
+        """
+        FL 프롬프트 목록 (FL_CHUNKING이면 메서드 묶음 단위, 아니면 파일 전체 하나)
+        """
+        if not FL_CHUNKING:
+            return [self.build_prompt(code)]
+        return [prompt for prompt, source in self._chunk_prompts(code)]
+
+    def _chunk_prompts(self, code, max_lines=None):
+        """
+        Returns:
+            list: [(chunk 프롬프트, chunk의 코드 부분)]
+        """
+        lines = code.split('\n')
+        prompts = []
+        for chunk in build_chunks(code, max_lines or FL_CHUNK_MAX_LINES):
+            chunk_code = render_ranges(lines, chunk['ranges'])
+            prompts.append((
+                FL_CHUNK_PROMPT_TEMPLATE.format(
+                    context=render_ranges(lines, chunk['context']) or '(none)',
+                    code=chunk_code
+                ),
+                chunk_code
+            ))
+        return prompts
+
+    def build_spectrum_prompt(self, code, spectrum):
+        """
+        SBFL 상위 의심 줄이 속한 메서드만 담은 FL 프롬프트
+        """
+        lines = code.split('\n')
+        context, ranges = suspicious_regions(code, spectrum)
+        failures = '\n'.join(
+            f"- {t['name']}: {t['message']}" if t['message'] else f"- {t['name']}"
+            for t in spectrum['failing_tests'][:5]
+        )
+        return FL_SBFL_PROMPT_TEMPLATE.format(
+            context=render_ranges(lines, context) or '(none)',
+            failures=failures,
+            code=render_ranges(lines, ranges)
+        )
+
+    def _prompts(self, code, spectrum):
+        """
+        Returns:
+            list: [(프롬프트, 프롬프트에 담긴 코드)] - 출력 토큰 예산 계산용
+        """
+        if spectrum is not None:
+            prompt = self.build_spectrum_prompt(code, spectrum)
+            return [(prompt, prompt)]
+        if FL_CHUNKING:
+            return self._chunk_prompts(code)
+        return [(self.build_prompt(code), code)]
+
+    def _planned_prompts(self, file_path, code, spectrum):
+        """
+        LLM 요청 목록 [(prompt, call kwargs)]
+
+        TOKEN_BUDGET_ENABLED이면 요청마다 코드 길이에 맞춘 max_tokens를 정하고,
+        프롬프트가 context에 들어가지 않으면 모든 chunk가 들어갈 때까지 chunk 크기를 절반씩 줄입니다.
+
+        Raises:
+            ContextLengthError: 메서드 하나짜리 chunk도 context에 들어가지 않을 때 (또는 SBFL 프롬프트)
+        """
+        prompts = self._prompts(code, spectrum)
+        if not TOKEN_BUDGET_ENABLED:
+            return [(prompt, {}) for prompt, source in prompts]
+
+        max_lines = FL_CHUNK_MAX_LINES if FL_CHUNKING else None
+        shrunk = False
+        while True:
+            try:
+                requests = [(prompt, {'max_tokens': self._plan(prompt, source)}) for prompt, source in prompts]
+                break
+            except ContextLengthError:
+                if spectrum is not None or max_lines == 1:
+                    raise
+                max_lines = max(1, max_lines // 2) if max_lines else FL_CHUNK_MAX_LINES
+                shrunk = True
+            prompts = self._chunk_prompts(code, max_lines)
+        if shrunk:
+            print(f"    {os.path.basename(file_path)} does not fit the model context, "
+                  f"localizing faults in {len(requests)} chunk(s) of up to {max_lines} lines")
+        return requests
+
+    def _plan(self, prompt, source):
+        return plan_max_tokens(prompt, expected_output_tokens(source, FL_OUTPUT_RATIO, limit=MAX_TOKENS))
+
+    def _too_large_result(self, file_path, error):
+        print(f"    Skipping fault localization for {os.path.basename(file_path)}: {error}")
+        return {'faults': [], 'tokens': {}, 'status': 'input_too_large', 'error': str(error)}
+
+    def _spectrum_result(self, file_path, spectrum):
+        """
+        SBFL 의심도가 충분히 높으면 LLM 호출 없이 결과 생성
+        """
+        faults = spectrum_faults(spectrum)
+        print(f"    SBFL: {len(faults)} suspicious line(s) in {os.path.basename(file_path)}, skipping LLM FL")
+        return {
+            'faults': faults,
+            'tokens': {},
+            'sbfl': spectrum_summary(spectrum, llm_skipped=True)
+        }
+
+    def _build_result(self, responses, spectrum=None):
+        """
+        Chunk별 응답을 파일 단위 결과로 병합 (fault는 줄 번호 순, 토큰은 합산)
+        """
+        if len(responses) == 1:
+            faults = self._parse_fault_response(responses[0]['text'])
+            tokens = responses[0]
+        else:
+            faults = []
+            for response in responses:
+                # "Line N" 항목이 없는 chunk 응답 (fault 없음 등)은 건너뜀
+                for fault in self._parse_fault_response(response['text'], fallback=False):
+                    if fault not in faults:
+                        faults.append(fault)
+            faults.sort(key=self._fault_line)
+            tokens = {
+                'text': '\n'.join(r['text'] for r in responses),
+                'prompt_tokens': sum(r.get('prompt_tokens', 0) for r in responses),
+                'completion_tokens': sum(r.get('completion_tokens', 0) for r in responses),
+                'total_tokens': sum(r.get('total_tokens', 0) for r in responses),
+                'chunks': len(responses)
+            }
+        result = {
+            'faults': faults,
+            'tokens': tokens
+        }
+        if spectrum is not None:
+            result['sbfl'] = spectrum_summary(spectrum, llm_skipped=False)
+        return result
+
+    @staticmethod
+    def _fault_line(fault):
+        match = LINE_NUMBER_RE.match(fault)
+        return int(match.group(1)) if match else float('inf')
+
+    def _parse_fault_response(self, response, fallback=True):
         faults = []
         lines = response.split('\n')
         for line in lines:
@@ -52,6 +297,8 @@ Faults:
             # "Line X:" 형식 찾기
             if line.startswith('Line') and ':' in line:
                 faults.append(line)
-        
-        # 아무것도 못 찾으면 전체 응답 반환
-        return faults if faults else [response.strip()]
\ No newline at end of file
+
+        # 아무것도 못 찾으면 전체 응답 반환 (fallback=False면 빈 목록)
+        if faults or not fallback:
+            return faults
+        return [response.strip()]
\ No newline at end of file
@@ -1,4 +1,4 @@
-import os
+from src.file_utils import get_all_files
 
 def find_buggy_files(directory):
     """
@@ -10,15 +10,4 @@ def find_buggy_files(directory):
     Returns:
         list: List of file paths
     """
-    buggy_files = []
-    
-    if not os.path.exists(directory):
-        print(f"Directory not found: {directory}")
-        return buggy_files
-    
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-        if os.path.isfile(file_path):
-            buggy_files.append(file_path)
-    
-    return buggy_files
\ No newline at end of file
+    return get_all_files(directory, extension=None)
\ No newline at end of file
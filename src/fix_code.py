@@ -1,86 +1,342 @@
 import os
 import json
 import re
-from config import FIXES_OUTPUT_DIR
-from src.file_utils import read_file, write_file
+from config import (
+    FIXES_OUTPUT_DIR, FIX_MODE, NUM_CANDIDATES, WRITE_RESULT_JSON, PROMPT_LAYOUT, TOKEN_BUDGET_ENABLED,
+    FIX_OUTPUT_RATIO
+)
+from llm_client import ContextLengthError, expected_output_tokens, plan_max_tokens, prompt_token_count
+from metrics import metrics
+from src.candidates import dedupe_candidates
+from src.file_utils import read_file, write_file, number_lines, output_relpath
+from src.patch_apply import LINE_NUMBER_PREFIX_RE, PatchApplyError, parse_edits, apply_edits
+from src.prompts import EDIT_FIX_INSTRUCTIONS, FIX_INSTRUCTIONS, fix_prompt
+from src.result_sink import compact_record
+
+
+FIX_MAX_TOKENS = 4000
+
+# 개선된 프롬프트: 명확한 지시 + 예시 제공 (지시 부분은 src.prompts.FIX_INSTRUCTIONS 공통)
+FIX_PROMPT_TEMPLATE = """Fix the following Java code based on the identified faults.
+
+Original Code:
+{code}
+
+Identified Faults:
+{faults}
+
+Instructions:
+""" + FIX_INSTRUCTIONS
+
+EDIT_FIX_MAX_TOKENS = 1000
+
+# Edit 모드: 전체 파일 대신 변경된 줄만 출력 → completion 토큰 대폭 감소
+# (지시 부분은 src.prompts.EDIT_FIX_INSTRUCTIONS 공통)
+EDIT_FIX_PROMPT_TEMPLATE = """Fix the following Java code based on the identified faults.
+Return ONLY edits for the lines that change, not the whole file.
+
+Original Code (with line numbers):
+{code}
+
+Identified Faults:
+{faults}
+
+Instructions:
+""" + EDIT_FIX_INSTRUCTIONS
+
+
+def result_json_path(file_path):
+    """
+    파일별 결과 JSON 경로 (output/fixes/<package dirs>/<name>.json)
+    """
+    return os.path.join(FIXES_OUTPUT_DIR, f"{output_relpath(file_path)}.json")
+
+
+def test_summary(test_result):
+    """
+    결과 JSON의 'test' 항목
+    """
+    return {
+        'compiled': test_result.get('compiled', False),
+        'tests_run': test_result.get('tests_run', 0),
+        'passed': test_result.get('passed', 0),
+        'failed': test_result.get('failed', 0),
+        'errors': test_result.get('errors', []),
+        # 컴파일 실패 시 javac 오류 (file, line, message)
+        'diagnostics': test_result.get('diagnostics', []),
+        'all_passed': test_result.get('all_passed', False),
+        # 테스트 메서드별 결과 (이름, 통과 여부, 시간, 실패 메시지/stack trace)
+        'tests': test_result.get('tests', [])
+    }
+
+
+def is_successful(fl_result, fix_result):
+    """
+    FL이 오류 없이 끝나고 수정 코드가 생성됐으면 True (incremental fingerprint 기록 기준)
+    fixed_code는 저장 전에 메모리에서 해제될 수 있으므로 fixed_file로 판단합니다.
+    """
+    return 'error' not in fl_result and bool(fix_result.get('fixed_file'))
+
+
+def _write_result_json(file_path, json_output_path, result):
+    # 임시 파일에 쓴 뒤 교체 → 중단되더라도 깨진 JSON이 남지 않음
+    os.makedirs(os.path.dirname(json_output_path), exist_ok=True)
+    tmp_path = json_output_path + '.tmp'
+    with metrics.span('json_write', file=file_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, json_output_path)
+
+
+def update_test_result(file_path, test_result, result_sink=None):
+    """
+    기존 결과 JSON의 'test' 항목만 새 테스트 결과로 교체 (--tests-only)
+    결과 JSON이 없으면 테스트 결과만 담아 새로 만들고, result_sink가 있으면 갱신된 레코드를 추가합니다.
+    """
+    json_output_path = result_json_path(file_path)
+    try:
+        with open(json_output_path, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        result = {'file': os.path.basename(file_path), 'original_path': file_path}
+
+    result['test'] = test_summary(test_result)
+    if WRITE_RESULT_JSON:
+        _write_result_json(file_path, json_output_path, result)
+        print(f"    Test result updated: {json_output_path}")
+    if result_sink is not None:
+        result_sink.append(compact_record(output_relpath(file_path), result))
 
 
 class CodeFixer:
-    def __init__(self, llm_client):
+    def __init__(self, llm_client, llm_batch_client=None, result_sink=None):
         """
         Initialize the CodeFixer with an LLM client.
+        Complete results are also appended to result_sink when given.
         """
         self.llm_client = llm_client
+        self.result_sink = result_sink
+        self.llm_batch_client = llm_batch_client
 
     def generate_fix(self, file_path, fl_result):
         """
         Generate a fix for the identified faults using LLM.
 
+        In edit mode the model returns only line-range edits; if they cannot
+        be parsed or applied, the full-file prompt is used as a fallback.
+
         Returns:
             dict: {
                 'fixed_code': str,
                 'fixed_file': str,
-                'tokens': dict
+                'tokens': dict,
+                'fix_mode': str,
+                'candidates': list  # NUM_CANDIDATES > 1
             }
         """
-        code = read_file(file_path)
+        with metrics.span('file_read', file=file_path):
+            code = read_file(file_path)
         if code is None:
             return {'fixed_code': None, 'fixed_file': None, 'tokens': {}}
 
+        prompt = self.build_prompt(code, fl_result)
+        try:
+            max_tokens = self.plan_max_tokens(code, prompt)
+        except ContextLengthError as e:
+            return self._too_large_result(file_path, e)
+
+        try:
+            with metrics.span('fix_generation', file=file_path):
+                response = self.llm_client(prompt, max_tokens=max_tokens, **self._sampling_kwargs())
+        except Exception as e:
+            print(f"    Error generating fix: {e}")
+            return {'fixed_code': None, 'fixed_file': None, 'tokens': {}}
+
+        return self._finish(file_path, code, fl_result, response)
+
+    def generate_fix_batch(self, fl_results):
+        """
+        Generate fixes for many files with a single batched LLM call.
+
+        Args:
+            fl_results (dict): file_path -> fl_result
+
+        Returns:
+            dict: file_path -> fix_result (same shape as generate_fix)
+        """
+        results = {}
+        prompts = []
+        prompt_max_tokens = []
+        prompt_files = []
+        codes = {}
+        for file_path, fl_result in fl_results.items():
+            with metrics.span('file_read', file=file_path):
+                code = read_file(file_path)
+            if code is None:
+                results[file_path] = {'fixed_code': None, 'fixed_file': None, 'tokens': {},
+                                      'error': 'Could not read file'}
+                continue
+            prompt = self.build_prompt(code, fl_result)
+            try:
+                max_tokens = self.plan_max_tokens(code, prompt)
+            except ContextLengthError as e:
+                results[file_path] = self._too_large_result(file_path, e)
+                continue
+            codes[file_path] = code
+            prompts.append(prompt)
+            prompt_max_tokens.append(max_tokens)
+            prompt_files.append(file_path)
+
+        if not prompts:
+            return results
+
+        try:
+            with metrics.span('fix_generation', files=len(prompts)):
+                responses = self.llm_batch_client(prompts, max_tokens=prompt_max_tokens, **self._sampling_kwargs())
+        except Exception as e:
+            print(f"    Error generating batched fix: {e}")
+            for file_path in prompt_files:
+                results[file_path] = {'fixed_code': None, 'fixed_file': None, 'tokens': {}, 'error': str(e)}
+            return results
+
+        for file_path, response in zip(prompt_files, responses):
+            results[file_path] = self._finish(file_path, codes[file_path], fl_results[file_path], response)
+
+        return results
+
+    def build_prompt(self, code, fl_result, mode=None):
         faults = fl_result.get('faults', [])
         faults_description = '\n'.join(faults)
+        if PROMPT_LAYOUT == 'shared_prefix':
+            # FL 프롬프트와 같은 prefix (공통 지시문 + 코드) 뒤에 fix 지시
+            return fix_prompt(code, faults_description, mode)
+        if (mode or FIX_MODE) == 'edit':
+            return EDIT_FIX_PROMPT_TEMPLATE.format(code=number_lines(code), faults=faults_description)
+        return FIX_PROMPT_TEMPLATE.format(code=code, faults=faults_description)
 
-        # 개선된 프롬프트: 명확한 지시 + 예시 제공
-        prompt = f"""Fix the following Java code based on the identified faults.
+    def _max_tokens(self, mode=None):
+        return EDIT_FIX_MAX_TOKENS if (mode or FIX_MODE) == 'edit' else FIX_MAX_TOKENS
 
-Original Code:
-{code}
+    def expected_fix_tokens(self, code, mode=None):
+        """
+        예상 출력 토큰 수 (full: 수정된 전체 파일이므로 원본 코드 길이에 비례, edit: EDIT_FIX_MAX_TOKENS 이하)
+        """
+        if (mode or FIX_MODE) == 'edit':
+            return expected_output_tokens(code, FIX_OUTPUT_RATIO, limit=EDIT_FIX_MAX_TOKENS)
+        return expected_output_tokens(code, FIX_OUTPUT_RATIO)
 
-Identified Faults:
-{faults_description}
+    def plan_max_tokens(self, code, prompt, mode=None):
+        """
+        Fix 요청의 max_tokens (TOKEN_BUDGET_ENABLED가 아니면 모드별 고정값)
 
-Instructions:
-- Output ONLY valid Java code that can be compiled directly
-- Do NOT use markdown code blocks (no ```)
-- Do NOT add explanations before or after the code
-- You may add comments (// or /* */) inside the code
-- Start with package/import/class declaration immediately
+        full 모드는 적어도 원본 코드만큼의 출력 공간이 context에 남아야 합니다.
 
-Fixed Code:
-"""
+        Raises:
+            ContextLengthError: 프롬프트 뒤에 필요한 출력 공간이 없을 때
+        """
+        if not TOKEN_BUDGET_ENABLED:
+            return self._max_tokens(mode)
+        expected = self.expected_fix_tokens(code, mode)
+        if (mode or FIX_MODE) == 'edit':
+            return plan_max_tokens(prompt, expected)
+        return plan_max_tokens(prompt, expected, required=min(prompt_token_count(code), expected))
 
-        try:
-            response = self.llm_client(prompt, max_tokens=4000)
-            fixed_code = response['text'].strip()
+    def _too_large_result(self, file_path, error, tokens=None):
+        print(f"    Skipping fix for {os.path.basename(file_path)}: {error}")
+        return {'fixed_code': None, 'fixed_file': None, 'tokens': tokens or {},
+                'status': 'input_too_large', 'error': str(error)}
 
-            # 코드 추출
-            fixed_code = self._clean_code(fixed_code)
+    def _sampling_kwargs(self):
+        # NUM_CANDIDATES > 1이면 한 요청으로 후보 여러 개 샘플링
+        return {'n': NUM_CANDIDATES} if NUM_CANDIDATES > 1 else {}
 
-            # 저장
-            filename = os.path.basename(file_path)
-            fixed_output_path = os.path.join(FIXES_OUTPUT_DIR, filename)
-            write_file(fixed_output_path, fixed_code)
+    def _finish(self, file_path, code, fl_result, response):
+        """
+        응답으로부터 결과를 만들고, edit 모드 적용 실패 시 full-file 모드로 다시 생성
+        """
+        texts = response.get('texts') or [response['text']]
+        candidates = []
+        try:
+            with metrics.span('clean_up', file=file_path):
+                for index, text in enumerate(texts):
+                    try:
+                        candidates.append({'index': index, 'fixed_code': self._extract_code(code, text, FIX_MODE)})
+                    except PatchApplyError as e:
+                        candidates.append({'index': index, 'fixed_code': None, 'error': str(e)})
+        except Exception as e:
+            print(f"    Error generating fix: {e}")
+            return {'fixed_code': None, 'fixed_file': None, 'tokens': {}, 'error': str(e)}
 
-            fix_result = {
-                'fixed_code': fixed_code,
-                'fixed_file': fixed_output_path,
-                'tokens': response
-            }
+        valid = [c for c in candidates if c['fixed_code'] is not None]
+        if valid:
+            result = self._save_fix(file_path, valid[0]['fixed_code'], response, FIX_MODE)
+            if len(texts) > 1:
+                result['candidates'] = dedupe_candidates(candidates)
+            return result
+
+        print(f"    Edit mode failed ({candidates[0].get('error')}), falling back to full-file fix...")
+        full_prompt = self.build_prompt(code, fl_result, mode='full')
+        try:
+            max_tokens = self.plan_max_tokens(code, full_prompt, mode='full')
+        except ContextLengthError as e:
+            return self._too_large_result(file_path, e, tokens=response)
 
-            print(f"    Fixed code saved to: {fixed_output_path}")
-            return fix_result
+        try:
+            with metrics.span('fix_generation', file=file_path, fallback=True):
+                full_response = self.llm_client(full_prompt, max_tokens=max_tokens)
+            with metrics.span('clean_up', file=file_path):
+                fixed_code = self._extract_code(code, full_response['text'], 'full')
+            result = self._save_fix(file_path, fixed_code, full_response, 'full')
         except Exception as e:
             print(f"    Error generating fix: {e}")
-            return {'fixed_code': None, 'fixed_file': None, 'tokens': {}}
+            return {'fixed_code': None, 'fixed_file': None, 'tokens': response, 'error': str(e)}
+
+        # 두 호출의 토큰 사용량 합산
+        result['tokens'] = {
+            **full_response,
+            'prompt_tokens': response.get('prompt_tokens', 0) + full_response.get('prompt_tokens', 0),
+            'completion_tokens': response.get('completion_tokens', 0) + full_response.get('completion_tokens', 0),
+            'total_tokens': response.get('total_tokens', 0) + full_response.get('total_tokens', 0),
+        }
+        result['fix_mode'] = 'full (edit fallback)'
+        return result
+
+    def _extract_code(self, code, text, mode):
+        if mode == 'edit':
+            # line-range edit을 원본 코드에 적용
+            return apply_edits(code, parse_edits(text))
+
+        # 코드 추출
+        return self.clean_code(text.strip())
+
+    def _save_fix(self, file_path, fixed_code, response, mode):
+        # 저장
+        fixed_output_path = os.path.join(FIXES_OUTPUT_DIR, output_relpath(file_path))
+        write_file(fixed_output_path, fixed_code)
+
+        fix_result = {
+            'fixed_code': fixed_code,
+            'fixed_file': fixed_output_path,
+            'tokens': response,
+            'fix_mode': mode
+        }
+
+        print(f"    Fixed code saved to: {fixed_output_path}")
+        return fix_result
 
-    def _clean_code(self, code):
+    def clean_code(self, code):
         """
         코드 블록만 추출: 마크다운, 설명문 등을 제거하고 순수 코드만 반환
         """
         # 1. 마크다운 코드 블록 제거
         code = re.sub(r'^```(?:java)?\s*\n', '', code, flags=re.MULTILINE)
         code = re.sub(r'\n```\s*$', '', code, flags=re.MULTILINE)
-        
+
+        # 줄 번호가 붙은 프롬프트의 코드를 번호째 복사한 경우 번호 제거
+        numbered = [line for line in code.split('\n') if line.strip()]
+        if numbered and all(LINE_NUMBER_PREFIX_RE.match(line) for line in numbered):
+            code = '\n'.join(LINE_NUMBER_PREFIX_RE.sub('', line, count=1) for line in code.split('\n'))
+
         # 2. 코드 시작 전 설명문 제거 (package/import/public class 이전의 텍스트)
         # Java 코드의 시작점을 찾음
         match = re.search(r'^(package\s+|import\s+|public\s+class\s+|class\s+|public\s+interface\s+|interface\s+|/\*|//)', 
@@ -103,12 +359,12 @@ Fixed Code:
         
         return code.strip()
        
-    def save_complete_result(self, file_path, fl_result, fix_result, test_result):
+    def save_complete_result(self, file_path, fl_result, fix_result, test_result, fingerprint=None):
         """
-        FL, Fix, Test 결과를 하나의 JSON 파일에 저장합니다.
+        FL, Fix, Test 결과를 하나의 JSON 파일(WRITE_RESULT_JSON)과 result sink에 저장하고
+        저장한 dict를 반환합니다. fingerprint가 주어지면 incremental 실행을 위해 함께 기록합니다.
         """
         filename = os.path.basename(file_path)
-        json_output_path = os.path.join(FIXES_OUTPUT_DIR, f"{filename}.json")
 
         complete_result = {
             'file': filename,
@@ -123,22 +379,51 @@ Fixed Code:
             },
             'fix': {
                 'fixed_file': fix_result.get('fixed_file'),
+                'mode': fix_result.get('fix_mode'),
                 'token_usage': {
                     'prompt_tokens': fix_result.get('tokens', {}).get('prompt_tokens', 0),
                     'completion_tokens': fix_result.get('tokens', {}).get('completion_tokens', 0),
                     'total_tokens': fix_result.get('tokens', {}).get('total_tokens', 0)
                 }
             },
-            'test': {
-                'compiled': test_result.get('compiled', False),
-                'tests_run': test_result.get('tests_run', 0),
-                'passed': test_result.get('passed', 0),
-                'failed': test_result.get('failed', 0),
-                'errors': test_result.get('errors', [])
-            }
+            'test': test_summary(test_result)
         }
 
-        with open(json_output_path, 'w', encoding='utf-8') as f:
-            json.dump(complete_result, f, indent=2, ensure_ascii=False)
+        # Token budget으로 생성하지 않았거나 (input_too_large) LLM/파일 오류로 실패한 단계
+        for stage, result in (('fl', fl_result), ('fix', fix_result)):
+            if 'status' in result or 'error' in result:
+                complete_result[stage]['status'] = result.get('status', 'error')
+                complete_result[stage]['error'] = result.get('error')
+
+        # Spectrum-based FL 요약 (실패 테스트, 상위 의심 줄, LLM 호출 생략 여부)
+        if 'sbfl' in fl_result:
+            complete_result['fl']['sbfl'] = fl_result['sbfl']
+
+        # Repair loop: 반복별 피드백 종류, 토큰, 시간, 테스트 결과
+        if 'repair' in fix_result:
+            complete_result['fix']['repair'] = fix_result['repair']
 
-        print(f"    Complete result saved to: {json_output_path}")
\ No newline at end of file
+        # Multi-candidate: 후보별 코드와 검증 결과 기록
+        candidates = test_result.get('candidates') or fix_result.get('candidates')
+        if candidates:
+            complete_result['fix']['selected_candidate'] = test_result.get('selected_candidate')
+            complete_result['fix']['candidates'] = candidates
+
+        # 실패한 결과는 다음 incremental 실행에서 다시 처리하도록 fingerprint를 남기지 않음
+        if fingerprint is not None and is_successful(fl_result, fix_result):
+            complete_result['fingerprint'] = fingerprint
+
+        self.store_result(file_path, complete_result)
+        return complete_result
+
+    def store_result(self, file_path, complete_result):
+        """
+        완성된 결과 dict를 결과 JSON(WRITE_RESULT_JSON)과 result sink에 저장
+        """
+        if WRITE_RESULT_JSON:
+            json_output_path = result_json_path(file_path)
+            _write_result_json(file_path, json_output_path, complete_result)
+            print(f"    Complete result saved to: {json_output_path}")
+        if self.result_sink is not None:
+            with metrics.span('sink_write', file=file_path):
+                self.result_sink.append(compact_record(output_relpath(file_path), complete_result))
\ No newline at end of file
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+from config import (
+    LLM_MODEL_NAME, BACKEND, CPU_DTYPE, SPECULATIVE_MODE, DRAFT_MODEL_NAME, MAX_TOKENS, TEMPERATURE, FIX_MODE, FL_CHUNKING, FL_CHUNK_MAX_LINES,
+    NUM_CANDIDATES, WRITE_RESULT_JSON, RESULT_SINK, RESULT_SINK_PATH,
+    SBFL_ENABLED, SBFL_FORMULA, SBFL_SKIP_LLM_SCORE, SBFL_SKIP_MAX_LINES, SBFL_TOP_K,
+    PROMPT_LAYOUT, REPAIR_LOOP_ENABLED, REPAIR_MAX_ITERATIONS, REPAIR_TOKEN_BUDGET, REPAIR_TIME_BUDGET, REPAIR_SNIPPET_CONTEXT,
+    TOKEN_BUDGET_ENABLED, MODEL_CONTEXT_LENGTH, FL_OUTPUT_RATIO, FIX_OUTPUT_RATIO, OUTPUT_MARGIN_TOKENS
+)
+from src.file_utils import read_file, output_relpath
+from src.find_FL import FL_PROMPT_TEMPLATE, FL_CHUNK_PROMPT_TEMPLATE, FL_SBFL_PROMPT_TEMPLATE
+from src.fix_code import (
+    FIX_PROMPT_TEMPLATE, FIX_MAX_TOKENS, EDIT_FIX_PROMPT_TEMPLATE, EDIT_FIX_MAX_TOKENS, result_json_path
+)
+from src.prompts import PREFIX_TEMPLATE, FL_TASK_TEMPLATE, FIX_TASK_TEMPLATE, EDIT_FIX_TASK_TEMPLATE
+from src.repair_loop import REPAIR_FEEDBACK_TEMPLATE
+from src.result_sink import latest_records
+from src.test_fix import find_test_file
+
+
+def compute_fingerprint(file_path):
+    """
+    파일 결과에 영향을 주는 모든 입력의 해시를 계산합니다.
+    (대상 파일, 대응 테스트 파일, FL/Fix 프롬프트 템플릿, 모델 설정)
+
+    Returns:
+        str: sha256 hex digest
+    """
+    test_file = find_test_file(file_path)
+    test_code = read_file(test_file) if os.path.exists(test_file) else None
+
+    payload = {
+        'source': read_file(file_path),
+        'test': test_code,
+        'fl_prompt': FL_PROMPT_TEMPLATE,
+        'fl_chunk_prompt': FL_CHUNK_PROMPT_TEMPLATE,
+        'fl_chunking': [FL_CHUNKING, FL_CHUNK_MAX_LINES],
+        'fl_sbfl_prompt': FL_SBFL_PROMPT_TEMPLATE,
+        'sbfl': [SBFL_ENABLED, SBFL_FORMULA, SBFL_SKIP_LLM_SCORE, SBFL_SKIP_MAX_LINES, SBFL_TOP_K],
+        'fix_prompt': FIX_PROMPT_TEMPLATE,
+        'edit_fix_prompt': EDIT_FIX_PROMPT_TEMPLATE,
+        'fix_mode': FIX_MODE,
+        'prompt_layout': [PROMPT_LAYOUT, PREFIX_TEMPLATE, FL_TASK_TEMPLATE, FIX_TASK_TEMPLATE, EDIT_FIX_TASK_TEMPLATE],
+        'repair_prompt': REPAIR_FEEDBACK_TEMPLATE,
+        'repair': [REPAIR_LOOP_ENABLED, REPAIR_MAX_ITERATIONS, REPAIR_TOKEN_BUDGET, REPAIR_TIME_BUDGET,
+                   REPAIR_SNIPPET_CONTEXT],
+        'model': {
+            'name': LLM_MODEL_NAME,
+            'backend': BACKEND,
+            # 양자화/정밀도와 speculative decoding도 출력에 영향
+            'cpu_dtype': CPU_DTYPE,
+            'speculative': [SPECULATIVE_MODE, DRAFT_MODEL_NAME],
+            'max_tokens': MAX_TOKENS,
+            'fix_max_tokens': FIX_MAX_TOKENS,
+            'edit_fix_max_tokens': EDIT_FIX_MAX_TOKENS,
+            'token_budget': [TOKEN_BUDGET_ENABLED, MODEL_CONTEXT_LENGTH, FL_OUTPUT_RATIO, FIX_OUTPUT_RATIO,
+                             OUTPUT_MARGIN_TOKENS],
+            'temperature': TEMPERATURE,
+            'num_candidates': NUM_CANDIDATES,
+        },
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def is_up_to_date(file_path, fingerprint, previous_fingerprints=None):
+    """
+    기존 결과 JSON (또는 result sink 레코드)의 fingerprint가 현재 입력과 같으면 True
+    """
+    if previous_fingerprints is not None:
+        return previous_fingerprints.get(output_relpath(file_path)) == fingerprint
+
+    json_path = result_json_path(file_path)
+    if not os.path.exists(json_path):
+        return False
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        # 중간에 끊긴 쓰기 등으로 깨진 결과는 다시 처리
+        return False
+    return previous.get('fingerprint') == fingerprint
+
+
+def filter_changed_files(files):
+    """
+    변경된 파일만 남깁니다.
+
+    Returns:
+        tuple: (changed_files, skipped_files, fingerprints)
+               fingerprints는 file_path -> fingerprint (전체 파일)
+    """
+    changed = []
+    skipped = []
+    fingerprints = {}
+
+    # 파일별 JSON을 쓰지 않으면 result sink의 마지막 레코드 기준으로 비교
+    previous_fingerprints = None
+    if not WRITE_RESULT_JSON:
+        previous_fingerprints = {}
+        if RESULT_SINK is not None and os.path.exists(RESULT_SINK_PATH):
+            previous_fingerprints = latest_records(RESULT_SINK_PATH, lambda record: record.get('fingerprint'))
+
+    for file_path in files:
+        fingerprint = compute_fingerprint(file_path)
+        fingerprints[file_path] = fingerprint
+        if is_up_to_date(file_path, fingerprint, previous_fingerprints):
+            skipped.append(file_path)
+        else:
+            changed.append(file_path)
+    return changed, skipped, fingerprints
\ No newline at end of file
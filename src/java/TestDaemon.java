@@ -0,0 +1,214 @@
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.net.URI;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.TimeoutException;
+
+import javax.tools.Diagnostic;
+import javax.tools.DiagnosticCollector;
+import javax.tools.FileObject;
+import javax.tools.ForwardingJavaFileManager;
+import javax.tools.JavaCompiler;
+import javax.tools.JavaFileObject;
+import javax.tools.SimpleJavaFileObject;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.ToolProvider;
+
+/**
+ * Long-running compile-and-test helper used by src/jvm_daemon.py.
+ *
+ * Sources are compiled in memory with javax.tools.JavaCompiler and each
+ * request's classes are loaded by a fresh classloader, so one JVM can
+ * validate many fixes without paying startup and JIT warm-up each time.
+ *
+ * Tests are run with TestRunner (same prioritisation and fail-fast options).
+ *
+ * Protocol: one request per line on stdin, one JSON object per line on stdout.
+ *   request:  <fixed source path> TAB <test source path> [TAB fail-fast TAB <first tests, comma separated>]
+ *   response: {"compiled", "test_compiled", "diagnostics", "tests_run",
+ *              "failed", "stopped_early", "tests", "errors", "output"}
+ */
+public class TestDaemon {
+    private static final long TIMEOUT_MS = Long.getLong("daemon.timeout.ms", 30000L);
+
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+
+        JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null) {
+            protocol.println("{\"fatal\": \"no system Java compiler (JRE without javac?)\"}");
+            return;
+        }
+        protocol.println("{\"ready\": true}");
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            String[] parts = line.split("\t");
+            String response;
+            boolean exitAfter = false;
+            try {
+                boolean failFast = parts.length > 2 && parts[2].equals("fail-fast");
+                List<String> first = TestRunner.parseFirst(parts.length > 3 ? parts[3] : "");
+                response = handle(compiler, parts[0], parts[1], failFast, first);
+            } catch (TimeoutException e) {
+                response = "{\"compiled\": true, \"test_compiled\": true, \"timeout\": true}";
+                // A runaway test thread cannot be stopped safely; let Python restart us.
+                exitAfter = true;
+            } catch (Throwable t) {
+                response = "{\"error\": " + TestRunner.quote(t.toString()) + "}";
+            }
+            protocol.println(response);
+            if (exitAfter) {
+                System.exit(2);
+            }
+        }
+    }
+
+    private static String handle(JavaCompiler compiler, String fixedPath, String testPath,
+                                 final boolean failFast, final List<String> first) throws Exception {
+        DiagnosticCollector<JavaFileObject> diagnostics = new DiagnosticCollector<JavaFileObject>();
+        StandardJavaFileManager standard = compiler.getStandardFileManager(diagnostics, null, StandardCharsets.UTF_8);
+        MemoryFileManager fileManager = new MemoryFileManager(standard);
+        List<String> options = Arrays.asList("-classpath", System.getProperty("java.class.path"), "-nowarn");
+        boolean ok = compiler.getTask(null, fileManager, diagnostics, options, null,
+                standard.getJavaFileObjects(fixedPath, testPath)).call();
+        fileManager.close();
+
+        String fixedCanonical = new File(fixedPath).getCanonicalPath();
+        boolean fixedOk = true;
+        boolean testOk = true;
+        List<String> diagnosticJson = new ArrayList<String>();
+        for (Diagnostic<? extends JavaFileObject> d : diagnostics.getDiagnostics()) {
+            if (d.getKind() != Diagnostic.Kind.ERROR) {
+                continue;
+            }
+            String source = d.getSource() == null ? "" : new File(d.getSource().toUri()).getCanonicalPath();
+            if (source.equals(fixedCanonical)) {
+                fixedOk = false;
+            } else {
+                testOk = false;
+            }
+            diagnosticJson.add("{\"file\": " + TestRunner.quote(source)
+                    + ", \"line\": " + d.getLineNumber()
+                    + ", \"message\": " + TestRunner.quote(d.getMessage(null)) + "}");
+        }
+        if (!ok && fixedOk && testOk) {
+            fixedOk = false;
+        }
+        if (!fixedOk || !testOk) {
+            return "{\"compiled\": " + fixedOk + ", \"test_compiled\": false, \"diagnostics\": "
+                    + TestRunner.join(diagnosticJson) + "}";
+        }
+
+        String simpleName = new File(testPath).getName().replaceAll("\\.java$", "");
+        String testClass = null;
+        for (String name : fileManager.classes.keySet()) {
+            if (name.equals(simpleName) || name.endsWith("." + simpleName)) {
+                testClass = name;
+            }
+        }
+        if (testClass == null) {
+            return "{\"compiled\": true, \"test_compiled\": false, \"diagnostics\": [], "
+                    + "\"errors\": [" + TestRunner.quote("Test class not found: " + simpleName) + "]}";
+        }
+
+        final MemoryClassLoader loader = new MemoryClassLoader(fileManager.classes, TestDaemon.class.getClassLoader());
+        final String className = testClass;
+        ByteArrayOutputStream captured = new ByteArrayOutputStream();
+        PrintStream capture = new PrintStream(captured, true, "UTF-8");
+        PrintStream oldOut = System.out;
+        PrintStream oldErr = System.err;
+        System.setOut(capture);
+        System.setErr(capture);
+        ExecutorService executor = Executors.newSingleThreadExecutor(r -> {
+            Thread t = new Thread(r, "junit-runner");
+            t.setDaemon(true);
+            t.setContextClassLoader(loader);
+            return t;
+        });
+        TestRunner.Report report;
+        try {
+            Future<TestRunner.Report> future = executor.submit(
+                    () -> TestRunner.run(loader.loadClass(className), first, failFast));
+            report = future.get(TIMEOUT_MS, TimeUnit.MILLISECONDS);
+        } finally {
+            System.setOut(oldOut);
+            System.setErr(oldErr);
+            executor.shutdownNow();
+        }
+
+        return "{\"compiled\": true, \"test_compiled\": true, "
+                + report.jsonFields()
+                + ", \"output\": " + TestRunner.quote(new String(captured.toByteArray(), StandardCharsets.UTF_8))
+                + "}";
+    }
+
+    /** Class file kept in memory instead of being written to disk. */
+    private static final class MemoryClass extends SimpleJavaFileObject {
+        final ByteArrayOutputStream bytes = new ByteArrayOutputStream();
+
+        MemoryClass(String className) {
+            super(URI.create("mem:///" + className.replace('.', '/') + ".class"), Kind.CLASS);
+        }
+
+        @Override
+        public OutputStream openOutputStream() {
+            return bytes;
+        }
+    }
+
+    private static final class MemoryFileManager extends ForwardingJavaFileManager<StandardJavaFileManager> {
+        final Map<String, MemoryClass> classes = new HashMap<String, MemoryClass>();
+
+        MemoryFileManager(StandardJavaFileManager fileManager) {
+            super(fileManager);
+        }
+
+        @Override
+        public JavaFileObject getJavaFileForOutput(Location location, String className,
+                                                   JavaFileObject.Kind kind, FileObject sibling) {
+            MemoryClass memoryClass = new MemoryClass(className);
+            classes.put(className, memoryClass);
+            return memoryClass;
+        }
+    }
+
+    /** Fresh loader per request so classes from different fixes never collide. */
+    private static final class MemoryClassLoader extends ClassLoader {
+        private final Map<String, MemoryClass> classes;
+
+        MemoryClassLoader(Map<String, MemoryClass> classes, ClassLoader parent) {
+            super(parent);
+            this.classes = classes;
+        }
+
+        @Override
+        protected Class<?> findClass(String name) throws ClassNotFoundException {
+            MemoryClass memoryClass = classes.get(name);
+            if (memoryClass == null) {
+                throw new ClassNotFoundException(name);
+            }
+            byte[] bytes = memoryClass.bytes.toByteArray();
+            return defineClass(name, bytes, 0, bytes.length);
+        }
+    }
+}
@@ -0,0 +1,258 @@
+import java.io.FileOutputStream;
+import java.io.OutputStreamWriter;
+import java.io.Writer;
+import java.lang.reflect.Method;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.Collections;
+import java.util.Comparator;
+import java.util.List;
+
+import org.junit.runner.Description;
+import org.junit.runner.Request;
+import org.junit.runner.Runner;
+import org.junit.runner.notification.Failure;
+import org.junit.runner.notification.RunListener;
+import org.junit.runner.notification.RunNotifier;
+import org.junit.runner.notification.StoppedByUserException;
+
+/**
+ * JUnit 4 runner with structured results, used by src/test_fix.py (as a
+ * subprocess) and by TestDaemon (in process).
+ *
+ * Tests named with --first run before the others, in the given order.
+ * With --fail-fast the run stops at the first failing test, which is
+ * enough to reject a fix candidate.
+ *
+ * With --coverage, the named probe class (generated by src/sbfl.py into
+ * instrumented sources) is drained around every test and the lines each
+ * test executed are reported as "covered".
+ *
+ * Usage: java TestRunner --report <json path> [--fail-fast] [--first a,b] [--coverage <probe class>] <test class>
+ * Report: {"tests_run", "failed", "stopped_early", "tests": [{"name", "method",
+ *          "passed", "time_ms", "message", "trace", "covered"}], "errors"}
+ */
+public class TestRunner {
+
+    public static void main(String[] args) throws Exception {
+        String reportPath = null;
+        String testClass = null;
+        boolean failFast = false;
+        String coverageProbe = null;
+        List<String> first = Collections.emptyList();
+        for (int i = 0; i < args.length; i++) {
+            if (args[i].equals("--report")) {
+                reportPath = args[++i];
+            } else if (args[i].equals("--fail-fast")) {
+                failFast = true;
+            } else if (args[i].equals("--first")) {
+                first = parseFirst(args[++i]);
+            } else if (args[i].equals("--coverage")) {
+                coverageProbe = args[++i];
+            } else {
+                testClass = args[i];
+            }
+        }
+
+        Class<?> klass = Class.forName(testClass);
+        Method drain = coverageProbe == null ? null
+                : Class.forName(coverageProbe, true, klass.getClassLoader()).getMethod("drain");
+        Report report = run(klass, first, failFast, drain);
+        Writer writer = new OutputStreamWriter(new FileOutputStream(reportPath), StandardCharsets.UTF_8);
+        try {
+            writer.write(report.toJson());
+        } finally {
+            writer.close();
+        }
+        System.exit(report.failed == 0 && report.testsRun > 0 ? 0 : 1);
+    }
+
+    static List<String> parseFirst(String value) {
+        if (value == null || value.isEmpty()) {
+            return Collections.emptyList();
+        }
+        return Arrays.asList(value.split(","));
+    }
+
+    /** Run one test class, prioritised tests first, optionally stopping at the first failure. */
+    public static Report run(Class<?> testClass, List<String> first, boolean failFast) {
+        return run(testClass, first, failFast, null);
+    }
+
+    /** Same as above; drain (static, returns the covered lines as a BitSet string) is called around each test. */
+    public static Report run(Class<?> testClass, final List<String> first, boolean failFast, Method drain) {
+        Request request = Request.aClass(testClass);
+        if (!first.isEmpty()) {
+            request = request.sortWith(new Comparator<Description>() {
+                @Override
+                public int compare(Description a, Description b) {
+                    return rank(a) - rank(b);
+                }
+
+                private int rank(Description d) {
+                    int index = d.getMethodName() == null ? -1 : first.indexOf(d.getMethodName());
+                    return index < 0 ? first.size() : index;
+                }
+            });
+        }
+
+        Runner runner = request.getRunner();
+        RunNotifier notifier = new RunNotifier();
+        Collector collector = new Collector(notifier, failFast, drain);
+        notifier.addListener(collector);
+        Report report = collector.report;
+        try {
+            notifier.fireTestRunStarted(runner.getDescription());
+            runner.run(notifier);
+        } catch (StoppedByUserException e) {
+            report.stoppedEarly = true;
+        }
+        return report;
+    }
+
+    /** Structured outcome of one run. */
+    public static final class Report {
+        int testsRun;
+        int failed;
+        boolean stoppedEarly;
+        final List<String> tests = new ArrayList<String>();
+        final List<String> errors = new ArrayList<String>();
+
+        /** JSON object fields without the surrounding braces (TestDaemon adds its own). */
+        String jsonFields() {
+            return "\"tests_run\": " + testsRun
+                    + ", \"failed\": " + failed
+                    + ", \"stopped_early\": " + stoppedEarly
+                    + ", \"tests\": " + join(tests)
+                    + ", \"errors\": " + join(errors);
+        }
+
+        String toJson() {
+            return "{" + jsonFields() + "}";
+        }
+    }
+
+    /** Per-test outcome and timing; asks the notifier to stop after a failure in fail-fast mode. */
+    private static final class Collector extends RunListener {
+        final Report report = new Report();
+        private final RunNotifier notifier;
+        private final boolean failFast;
+        private final Method drain;
+        private long start;
+        private Failure failure;
+
+        Collector(RunNotifier notifier, boolean failFast, Method drain) {
+            this.notifier = notifier;
+            this.failFast = failFast;
+            this.drain = drain;
+        }
+
+        @Override
+        public void testStarted(Description description) {
+            drainCoverage();
+            start = System.nanoTime();
+            failure = null;
+        }
+
+        /** Lines hit since the last call, as a JSON array (null without a probe). */
+        private String drainCoverage() {
+            if (drain == null) {
+                return null;
+            }
+            try {
+                // BitSet.toString(): "{3, 7, 12}"
+                String lines = (String) drain.invoke(null);
+                return "[" + lines.substring(1, lines.length() - 1) + "]";
+            } catch (Exception e) {
+                return "[]";
+            }
+        }
+
+        @Override
+        public void testFailure(Failure f) {
+            if (!f.getDescription().isTest()) {
+                // @BeforeClass/@AfterClass failures have no testStarted/testFinished
+                report.failed++;
+                report.tests.add(entry(f.getDescription(), false, 0, f));
+                report.errors.add(quote(f.getTestHeader() + ": " + f.getMessage()));
+                stopIfFailFast();
+                return;
+            }
+            failure = f;
+        }
+
+        @Override
+        public void testFinished(Description description) {
+            long elapsedMs = (System.nanoTime() - start) / 1000000L;
+            String covered = drainCoverage();
+            report.testsRun++;
+            String entry = entry(description, failure == null, elapsedMs, failure);
+            if (covered != null) {
+                entry = entry.substring(0, entry.length() - 1) + ", \"covered\": " + covered + "}";
+            }
+            report.tests.add(entry);
+            if (failure != null) {
+                report.failed++;
+                report.errors.add(quote(failure.getTestHeader() + ": " + failure.getMessage()));
+                failure = null;
+                stopIfFailFast();
+            }
+        }
+
+        private void stopIfFailFast() {
+            if (failFast) {
+                // the next testStarted throws StoppedByUserException
+                notifier.pleaseStop();
+            }
+        }
+
+        private static String entry(Description description, boolean passed, long elapsedMs, Failure f) {
+            StringBuilder json = new StringBuilder();
+            json.append("{\"name\": ").append(quote(description.getDisplayName()))
+                .append(", \"method\": ").append(quote(description.getMethodName()))
+                .append(", \"passed\": ").append(passed)
+                .append(", \"time_ms\": ").append(elapsedMs);
+            if (f != null) {
+                json.append(", \"message\": ").append(quote(f.getMessage()))
+                    .append(", \"trace\": ").append(quote(f.getTrace()));
+            }
+            return json.append('}').toString();
+        }
+    }
+
+    static String join(List<String> items) {
+        StringBuilder b = new StringBuilder("[");
+        for (int i = 0; i < items.size(); i++) {
+            if (i > 0) {
+                b.append(", ");
+            }
+            b.append(items.get(i));
+        }
+        return b.append(']').toString();
+    }
+
+    static String quote(String s) {
+        if (s == null) {
+            return "null";
+        }
+        StringBuilder b = new StringBuilder("\"");
+        for (int i = 0; i < s.length(); i++) {
+            char c = s.charAt(i);
+            switch (c) {
+                case '"': b.append("\\\""); break;
+                case '\\': b.append("\\\\"); break;
+                case '\n': b.append("\\n"); break;
+                case '\r': b.append("\\r"); break;
+                case '\t': b.append("\\t"); break;
+                default:
+                    if (c < 0x20) {
+                        b.append(String.format("\\u%04x", (int) c));
+                    } else {
+                        b.append(c);
+                    }
+            }
+        }
+        return b.append('"').toString();
+    }
+}
@@ -0,0 +1,222 @@
+import bisect
+import re
+
+CLASS_DECL_RE = re.compile(r'(?<![.\w])(class|interface|enum|record)\s+(\w+)')
+ANNOTATION_RE = re.compile(r'@\w+(?:\.\w+)*(?:\s*\([^)]*\))?')
+CALL_RE = re.compile(r'(\w+)\s*\(')
+CONTROL_KEYWORDS = {
+    'if', 'for', 'while', 'switch', 'catch', 'synchronized', 'try', 'do', 'else',
+    'return', 'new', 'throw', 'finally'
+}
+COMMENT_LINE_RE = re.compile(r'^\s*(/\*|\*|//)')
+
+
+class JavaMember:
+    def __init__(self, kind, name, start, end):
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"JavaMember({self.kind} {self.name}, lines {self.start}-{self.end})"
+
+
+class JavaIndex:
+    """
+    Structural map of a Java source file. All line numbers are 1-based and inclusive.
+    """
+
+    def __init__(self, line_count):
+        self.line_count = line_count
+        self.imports = []
+        self.classes = []
+        self.methods = []
+        self.fields = []
+
+
+def mask_code(code):
+    """
+    주석과 문자열/문자 리터럴을 공백으로 치환 (줄바꿈은 유지하여 줄 번호 보존)
+    """
+    out = list(code)
+    n = len(code)
+    i = 0
+
+    def blank(begin, end):
+        for k in range(begin, min(end, n)):
+            if out[k] != '\n':
+                out[k] = ' '
+
+    while i < n:
+        if code.startswith('//', i):
+            end = code.find('\n', i)
+            end = n if end == -1 else end
+            blank(i, end)
+            i = end
+        elif code.startswith('/*', i):
+            end = code.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            blank(i, end)
+            i = end
+        elif code.startswith('"""', i):
+            end = code.find('"""', i + 3)
+            end = n if end == -1 else end + 3
+            blank(i + 1, end - 1)
+            i = end
+        elif code[i] in '"\'':
+            quote = code[i]
+            j = i + 1
+            while j < n and code[j] != quote and code[j] != '\n':
+                j += 2 if code[j] == '\\' else 1
+            blank(i + 1, j)
+            i = j + 1
+        else:
+            i += 1
+    return ''.join(out)
+
+
+def _classify(header, parent_kind):
+    """
+    '{' 앞의 선언부를 보고 블록 종류(class/method/field/other)와 이름을 판단
+    """
+    match = CLASS_DECL_RE.search(header)
+    if match and '=' not in header:
+        return 'class', match.group(2)
+    if parent_kind != 'class':
+        return 'other', None
+
+    stripped = ANNOTATION_RE.sub(' ', header).strip()
+    if '=' in stripped:
+        # 배열 초기화 / 익명 클래스를 가진 필드
+        return 'field', None
+    if stripped in ('', 'static'):
+        return 'method', '<initializer>'
+    call = CALL_RE.search(stripped)
+    if call and call.group(1) not in CONTROL_KEYWORDS:
+        return 'method', call.group(1)
+    return 'other', None
+
+
+def index_java(code):
+    """
+    Build a JavaIndex (imports, classes, methods, fields with line ranges)
+    from Java source using a brace-matching lexer. Does not need the code
+    to compile.
+    """
+    masked = mask_code(code)
+    newlines = [i for i, ch in enumerate(masked) if ch == '\n']
+    index = JavaIndex(len(newlines) + 1)
+
+    def line_of(pos):
+        return bisect.bisect_left(newlines, pos) + 1
+
+    def header_start(begin, end):
+        text = masked[begin:end]
+        offset = len(text) - len(text.lstrip())
+        return line_of(begin + offset) if text.strip() else line_of(end)
+
+    stack = []
+    stmt_start = 0
+    for i, ch in enumerate(masked):
+        if ch == '{':
+            parent_kind = stack[-1][0] if stack else None
+            kind, name = _classify(masked[stmt_start:i], parent_kind)
+            stack.append((kind, name, header_start(stmt_start, i)))
+            stmt_start = i + 1
+        elif ch == '}':
+            if stack:
+                kind, name, start = stack.pop()
+                parent_kind = stack[-1][0] if stack else None
+                member = JavaMember(kind, name, start, line_of(i))
+                if kind == 'class':
+                    index.classes.append(member)
+                elif kind == 'method':
+                    index.methods.append(member)
+                elif kind == 'field' and parent_kind == 'class':
+                    index.fields.append(member)
+            stmt_start = i + 1
+        elif ch == ';':
+            header = masked[stmt_start:i]
+            if header.strip():
+                start = header_start(stmt_start, i)
+                if not stack:
+                    index.imports.append(JavaMember('import', None, start, line_of(i)))
+                elif stack[-1][0] == 'class':
+                    index.fields.append(JavaMember('field', None, start, line_of(i)))
+            stmt_start = i + 1
+
+    index.methods.sort(key=lambda m: m.start)
+    index.fields.sort(key=lambda m: m.start)
+    index.classes.sort(key=lambda m: m.start)
+    _attach_leading_comments(code.split('\n'), index.methods)
+    return index
+
+
+def _attach_leading_comments(lines, methods):
+    """
+    메서드 바로 위의 Javadoc/주석 줄을 메서드 범위에 포함
+    """
+    for method in methods:
+        start = method.start
+        while start > 1 and COMMENT_LINE_RE.match(lines[start - 2]):
+            start -= 1
+        method.start = start
+
+
+def context_ranges(index):
+    """
+    메서드 밖에서 필요한 줄 범위 (import, 클래스 선언 줄, 필드)
+    """
+    context = [(m.start, m.end) for m in index.imports]
+    context += [(c.start, c.start) for c in index.classes]
+    context += [(f.start, f.end) for f in index.fields]
+    return sorted(context)
+
+
+def build_chunks(code, max_lines):
+    """
+    Split a file into fault-localization chunks of whole methods.
+
+    Returns:
+        list: [{'context': [(start, end), ...], 'ranges': [(start, end), ...]}]
+              Line ranges refer to the original file. Files that fit in
+              max_lines (or have no recognizable methods) give one chunk
+              covering the whole file with no separate context.
+    """
+    index = index_java(code)
+    if index.line_count <= max_lines or not index.methods:
+        return [{'context': [], 'ranges': [(1, index.line_count)]}]
+
+    context = context_ranges(index)
+
+    chunks = []
+    current = []
+    current_lines = 0
+    for method in index.methods:
+        size = method.end - method.start + 1
+        if current and current_lines + size > max_lines:
+            chunks.append({'context': context, 'ranges': current})
+            current, current_lines = [], 0
+        current.append((method.start, method.end))
+        current_lines += size
+    if current:
+        chunks.append({'context': context, 'ranges': current})
+    return chunks
+
+
+def render_ranges(lines, ranges):
+    """
+    주어진 줄 범위들을 원본 줄 번호와 함께 출력 (불연속 구간은 "..."로 구분)
+    """
+    rendered = []
+    previous_end = None
+    for start, end in ranges:
+        if previous_end is not None and start > previous_end + 1:
+            rendered.append('...')
+        if previous_end is not None and start <= previous_end:
+            start = previous_end + 1
+        for number in range(start, end + 1):
+            rendered.append(f"{number}: {lines[number - 1]}")
+        previous_end = max(end, previous_end or 0)
+    return '\n'.join(rendered)
\ No newline at end of file
@@ -0,0 +1,250 @@
+import atexit
+import json
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from config import JUNIT_CLASSPATH, TEST_SCRATCH_DIR, JVM_DAEMON_TIMEOUT, TEST_OUTPUT_MAX_CHARS
+
+JAVA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'java')
+DAEMON_SOURCE = os.path.join(JAVA_DIR, 'TestDaemon.java')
+RUNNER_SOURCE = os.path.join(JAVA_DIR, 'TestRunner.java')
+
+# TestDaemon/TestRunner.class는 실행당 한 번만 컴파일, 데몬 프로세스는 재사용 풀로 관리
+_classes_dir = None
+_classes_lock = threading.Lock()
+_idle = queue.LifoQueue()
+_started = []
+_started_lock = threading.Lock()
+# 후보 검증 취소 여부를 확인하는 간격 (초)
+CANCEL_POLL_SECONDS = 0.05
+
+
+class JvmDaemonError(Exception):
+    """Raised when the helper JVM cannot serve a request (caller falls back to subprocesses)."""
+
+
+def compile_helpers():
+    """
+    Compile TestDaemon and TestRunner once per run.
+
+    Returns:
+        str: directory holding the compiled helper classes
+    """
+    global _classes_dir
+    with _classes_lock:
+        if _classes_dir is None:
+            classes_dir = tempfile.mkdtemp(prefix='llmfix_daemon_', dir=TEST_SCRATCH_DIR)
+            try:
+                result = subprocess.run(
+                    ['javac', '-d', classes_dir, '-cp', JUNIT_CLASSPATH, DAEMON_SOURCE, RUNNER_SOURCE],
+                    capture_output=True,
+                    text=True,
+                    timeout=120
+                )
+            except Exception as e:
+                shutil.rmtree(classes_dir, ignore_errors=True)
+                raise JvmDaemonError(f"Failed to compile test helpers: {e}")
+            if result.returncode != 0:
+                shutil.rmtree(classes_dir, ignore_errors=True)
+                raise JvmDaemonError(f"Failed to compile test helpers: {result.stderr.strip()}")
+            _classes_dir = classes_dir
+        return _classes_dir
+
+
+class JvmTestDaemon:
+    """
+    One long-lived helper JVM that compiles and runs JUnit tests in memory.
+    Requests are served one at a time over stdin/stdout.
+    """
+
+    def __init__(self):
+        self.process = None
+        # 취소로 종료된 데몬은 풀에 되돌리지 않음 (lock으로 kill과 재사용 판단을 직렬화)
+        self.lock = threading.Lock()
+        self.cancelled = False
+
+    def start(self):
+        classpath = os.pathsep.join([compile_helpers(), JUNIT_CLASSPATH])
+        try:
+            self.process = subprocess.Popen(
+                ['java', f'-Ddaemon.timeout.ms={int(JVM_DAEMON_TIMEOUT * 1000)}',
+                 '-cp', classpath, 'TestDaemon'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding='utf-8',
+                bufsize=1
+            )
+        except Exception as e:
+            raise JvmDaemonError(f"Failed to start TestDaemon: {e}")
+
+        ready = self._read()
+        if not ready.get('ready'):
+            self.close()
+            raise JvmDaemonError(ready.get('fatal', 'TestDaemon did not start'))
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def request(self, test_file, fixed_file, fail_fast=False, first_tests=None):
+        """
+        Compile fixed_file + test_file and run the test class
+        (first_tests first, stopping at the first failure if fail_fast).
+
+        Returns:
+            dict: raw daemon response
+        """
+        options = f"{'fail-fast' if fail_fast else ''}\t{','.join(first_tests or [])}"
+        try:
+            self.process.stdin.write(f"{os.path.abspath(fixed_file)}\t{os.path.abspath(test_file)}\t{options}\n")
+            self.process.stdin.flush()
+        except Exception as e:
+            raise JvmDaemonError(f"TestDaemon request failed: {e}")
+        return self._read()
+
+    def _read(self):
+        line = self.process.stdout.readline()
+        if not line:
+            raise JvmDaemonError("TestDaemon exited unexpectedly")
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise JvmDaemonError(f"Malformed TestDaemon response: {line[:200]}")
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+
+def _to_test_result(response):
+    """
+    데몬 응답을 run_java_tests와 같은 형식의 결과로 변환
+    """
+    if 'error' in response:
+        raise JvmDaemonError(response['error'])
+
+    if not response.get('compiled'):
+        return {
+            'compiled': False,
+            'tests_run': 0,
+            'passed': 0,
+            'failed': 0,
+            'errors': ['Compilation failed'],
+            'diagnostics': response.get('diagnostics', [])
+        }
+    if not response.get('test_compiled'):
+        return {
+            'compiled': True,
+            'tests_run': 0,
+            'passed': 0,
+            'failed': 0,
+            'errors': ['Test compilation failed'] + response.get('errors', []),
+            'diagnostics': response.get('diagnostics', [])
+        }
+    if response.get('timeout'):
+        return {
+            'compiled': True,
+            'tests_run': 0,
+            'passed': 0,
+            'failed': 0,
+            'errors': ['Test execution timed out']
+        }
+
+    tests_run = response.get('tests_run', 0)
+    failed = response.get('failed', 0)
+    return {
+        'compiled': True,
+        'tests_run': tests_run,
+        'passed': tests_run - failed,
+        'failed': failed,
+        'errors': response.get('errors', []),
+        'all_passed': tests_run > 0 and failed == 0,
+        'stopped_early': response.get('stopped_early', False),
+        'tests': response.get('tests', []),
+        'output': response.get('output', '')[-TEST_OUTPUT_MAX_CHARS:]
+    }
+
+
+def _kill_on_cancel(daemon, cancel_event, finished):
+    """
+    요청이 끝나기 전에 cancel_event가 설정되면 helper JVM을 종료 (다음 요청 때 새로 시작)
+    """
+    while not finished.is_set():
+        if cancel_event.wait(CANCEL_POLL_SECONDS):
+            with daemon.lock:
+                if not finished.is_set() and daemon.process is not None:
+                    daemon.cancelled = True
+                    daemon.process.kill()
+            return
+
+
+def run_java_tests_daemon(test_file, fixed_file, fail_fast=False, first_tests=None, cancel_event=None):
+    """
+    Run Java tests for a fixed file on a pooled helper JVM.
+
+    If cancel_event is set before the request is sent, or while it runs
+    (the helper JVM is killed), nothing more is run and None is returned.
+
+    Raises:
+        JvmDaemonError: if no helper JVM could serve the request
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    try:
+        daemon = _idle.get_nowait()
+    except queue.Empty:
+        daemon = JvmTestDaemon()
+        daemon.start()
+        with _started_lock:
+            _started.append(daemon)
+    if cancel_event is not None and cancel_event.is_set():
+        _idle.put(daemon)
+        return None
+
+    finished = threading.Event()
+    if cancel_event is not None:
+        threading.Thread(target=_kill_on_cancel, args=(daemon, cancel_event, finished), daemon=True).start()
+    try:
+        response = daemon.request(test_file, fixed_file, fail_fast, first_tests)
+    except JvmDaemonError:
+        daemon.close()
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        raise
+    finally:
+        with daemon.lock:
+            finished.set()
+
+    if daemon.cancelled or response.get('timeout') or not daemon.alive():
+        # 타임아웃 후 데몬은 스스로 종료 → 다음 요청 때 새로 시작
+        daemon.close()
+    else:
+        _idle.put(daemon)
+    return _to_test_result(response)
+
+
+@atexit.register
+def shutdown_daemons():
+    """
+    Stop every helper JVM and remove the compiled TestDaemon classes.
+    """
+    global _classes_dir
+    with _started_lock:
+        for daemon in _started:
+            daemon.close()
+        _started.clear()
+    while not _idle.empty():
+        _idle.get_nowait()
+    if _classes_dir is not None:
+        shutil.rmtree(_classes_dir, ignore_errors=True)
+        _classes_dir = None
\ No newline at end of file
@@ -0,0 +1,148 @@
+import difflib
+import re
+
+# EDIT <start>-<end>
+# <<<<<<< ORIGINAL
+# ...original lines...
+# =======
+# ...replacement lines...
+# >>>>>>> FIXED
+EDIT_BLOCK_RE = re.compile(
+    r'^EDIT\s+(?:Line\s+)?(\d+)(?:\s*-\s*(\d+))?[^\n]*\n'
+    r'<<<<<<<\s*ORIGINAL[^\n]*\n(.*?)'
+    r'^=======[^\n]*\n(.*?)'
+    r'^>>>>>>>\s*FIXED',
+    re.DOTALL | re.MULTILINE | re.IGNORECASE
+)
+LINE_NUMBER_PREFIX_RE = re.compile(r'^\s*\d+\s*[:|]\s?')
+
+# 명시된 줄 번호 주변에서 원본 블록을 찾을 범위와 최소 유사도
+FUZZY_WINDOW = 20
+FUZZY_THRESHOLD = 0.8
+
+
+class PatchApplyError(Exception):
+    """Raised when model edits cannot be parsed or anchored in the source."""
+
+
+class Edit:
+    def __init__(self, start, end, original, replacement):
+        self.start = start
+        self.end = end
+        self.original = original
+        self.replacement = replacement
+
+    def __repr__(self):
+        return f"Edit({self.start}-{self.end}, {len(self.original)} -> {len(self.replacement)} lines)"
+
+
+def _block_lines(block):
+    lines = block.split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()
+    # 모델이 줄 번호("12: ...")까지 복사한 경우 제거
+    non_empty = [line for line in lines if line.strip()]
+    if non_empty and all(LINE_NUMBER_PREFIX_RE.match(line) for line in non_empty):
+        lines = [LINE_NUMBER_PREFIX_RE.sub('', line, count=1) for line in lines]
+    return lines
+
+
+def parse_edits(text):
+    """
+    Parse EDIT blocks from an LLM response.
+
+    Returns:
+        list: Edit objects in response order
+
+    Raises:
+        PatchApplyError: if the response contains no EDIT block
+    """
+    text = re.sub(r'^```[a-zA-Z]*\s*$', '', text, flags=re.MULTILINE)
+    edits = []
+    for match in EDIT_BLOCK_RE.finditer(text):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else start
+        edits.append(Edit(start, end, _block_lines(match.group(3)), _block_lines(match.group(4))))
+    if not edits:
+        raise PatchApplyError("No EDIT blocks found in response")
+    return edits
+
+
+def _normalize(lines):
+    return [line.strip() for line in lines]
+
+
+def _locate(lines, edit):
+    """
+    Find the [begin, end) slice of lines that edit.original refers to.
+
+    Order of preference: the stated line range, the nearest exact
+    (whitespace-insensitive) match anywhere, then the most similar block
+    within FUZZY_WINDOW lines of the stated position.
+
+    An empty ORIGINAL section is an insertion before the stated start line;
+    no existing line is replaced.
+    """
+    stated = edit.start - 1
+
+    if not edit.original:
+        if 0 <= stated <= len(lines):
+            return stated, stated
+        raise PatchApplyError(f"Insertion line {edit.start} is out of bounds")
+
+    size = len(edit.original)
+    target = _normalize(edit.original)
+
+    if _normalize(lines[stated:stated + size]) == target:
+        return stated, stated + size
+
+    matches = [
+        i for i in range(len(lines) - size + 1)
+        if _normalize(lines[i:i + size]) == target
+    ]
+    if matches:
+        best = min(matches, key=lambda i: abs(i - stated))
+        return best, best + size
+
+    target_text = '\n'.join(target)
+    best, best_ratio = None, 0.0
+    low = max(0, stated - FUZZY_WINDOW)
+    high = min(len(lines) - size, stated + FUZZY_WINDOW)
+    for i in range(low, high + 1):
+        candidate = '\n'.join(_normalize(lines[i:i + size]))
+        ratio = difflib.SequenceMatcher(None, candidate, target_text).ratio()
+        if ratio > best_ratio:
+            best, best_ratio = i, ratio
+    if best is not None and best_ratio >= FUZZY_THRESHOLD:
+        return best, best + size
+
+    raise PatchApplyError(f"Could not anchor edit at lines {edit.start}-{edit.end}")
+
+
+def apply_edits(code, edits):
+    """
+    Apply edits to code.
+
+    All edits are anchored against the original code first, so line numbers
+    in later edits stay valid regardless of the order they are applied in.
+
+    Returns:
+        str: patched code
+
+    Raises:
+        PatchApplyError: if an edit cannot be anchored or edits overlap
+    """
+    lines = code.split('\n')
+    located = sorted(
+        ((_locate(lines, edit), edit) for edit in edits),
+        key=lambda item: item[0]
+    )
+
+    for (prev, _), (cur, edit) in zip(located, located[1:]):
+        if cur[0] < prev[1]:
+            raise PatchApplyError(f"Overlapping edits at lines {edit.start}-{edit.end}")
+
+    for (begin, end), edit in reversed(located):
+        lines[begin:end] = edit.replacement
+
+    return '\n'.join(lines)
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Shared-prefix prompt layout (PROMPT_LAYOUT = "shared_prefix")
+
+Every FL and fix prompt for a file starts with the same text: static
+instructions followed by the original code and an end marker. Only the
+task section after the marker differs, so a backend with prefix caching
+prefills the file once and reuses it for the other calls on that file
+(and the static instructions across files).
+
+    [PREFIX_TEMPLATE: rules + code + CODE_END_MARKER] [task section]
+"""
+
+from config import FIX_MODE
+from src.file_utils import number_lines
+
+CODE_END_MARKER = "=== END OF CODE ==="
+
+# 모든 파일/작업에 공통인 지시문 + 원본 코드 (이 부분까지가 공유 prefix)
+PREFIX_TEMPLATE = """You are reviewing a single Java source file for bugs.
+The file is shown first; the task to perform on it follows after the end marker.
+
+General rules:
+- Do NOT use markdown formatting or code blocks (no ```)
+- Do NOT add explanations unless the task asks for them
+- Each line of the original code starts with its line number ("12: ..."); line numbers refer to these
+
+Original Code (with line numbers):
+{code}
+""" + CODE_END_MARKER + "\n\n"
+
+# FL 지시 (shared prefix FL 작업과 legacy / chunk / SBFL FL 프롬프트 공통, 끝은 "Faults:")
+FL_INSTRUCTIONS = """- List each fault on a new line
+- Format: "Line X: [brief description]" using the line numbers shown in the code
+- Focus on logical errors, missing returns, type mismatches, etc.
+- Do NOT use markdown formatting
+- Example format:
+  Line 5: Method returns wrong value
+  Line 12: Missing return statement
+
+Faults:
+"""
+
+FL_TASK_TEMPLATE = """Task: identify potential bugs in the code above.
+
+Instructions:
+""" + FL_INSTRUCTIONS
+
+# Full-file fix 지시 (shared prefix 작업과 legacy FIX_PROMPT_TEMPLATE 공통, 끝은 "Fixed Code:")
+FIX_INSTRUCTIONS = """- Output ONLY valid Java code that can be compiled directly
+- Do NOT use markdown code blocks (no ```)
+- Do NOT include line numbers
+- Do NOT add explanations before or after the code
+- You may add comments (// or /* */) inside the code
+- Start with package/import/class declaration immediately
+
+Fixed Code:
+"""
+
+# Edit 모드 지시 (shared prefix 작업과 legacy EDIT_FIX_PROMPT_TEMPLATE 공통, 끝은 "Edits:")
+EDIT_FIX_INSTRUCTIONS = """- For each change, output one block in exactly this format:
+  EDIT <first line>-<last line>
+  <<<<<<< ORIGINAL
+  <the original lines, copied exactly, without line numbers>
+  =======
+  <the replacement lines>
+  >>>>>>> FIXED
+- Use the line numbers shown in the original code
+- To insert code, include the neighbouring line in ORIGINAL and repeat it in the replacement
+- To delete code, leave the replacement empty
+- Do NOT output the whole file, markdown, or explanations
+
+Edits:
+"""
+
+FIX_TASK_TEMPLATE = """Task: fix the code above based on the identified faults.
+
+Identified Faults:
+{faults}
+
+Instructions:
+""" + FIX_INSTRUCTIONS
+
+EDIT_FIX_TASK_TEMPLATE = """Task: fix the code above based on the identified faults.
+Return ONLY edits for the lines that change, not the whole file.
+
+Identified Faults:
+{faults}
+
+Instructions:
+""" + EDIT_FIX_INSTRUCTIONS
+
+
+def shared_prefix(code):
+    """
+    파일의 공유 prefix (FL은 줄 번호로 fault를 보고하므로 모든 모드에서 줄 번호가 붙은 코드 사용)
+    """
+    return PREFIX_TEMPLATE.format(code=number_lines(code))
+
+
+def fl_prompt(code):
+    return shared_prefix(code) + FL_TASK_TEMPLATE
+
+
+def fix_prompt(code, faults_description, mode=None):
+    template = EDIT_FIX_TASK_TEMPLATE if (mode or FIX_MODE) == 'edit' else FIX_TASK_TEMPLATE
+    return shared_prefix(code) + template.format(faults=faults_description)
+
+
+def split_prefix(prompt):
+    """
+    프롬프트에서 공유 prefix 부분 (shared layout이 아니면 None)
+    """
+    if not prompt.startswith(PREFIX_TEMPLATE[:PREFIX_TEMPLATE.index('{code}')]):
+        return None
+    end = prompt.find(CODE_END_MARKER)
+    if end < 0:
+        return None
+    return prompt[:end + len(CODE_END_MARKER) + 2]
@@ -0,0 +1,234 @@
+import os
+import re
+import time
+from config import (
+    FIXES_OUTPUT_DIR, REPAIR_LOOP_ENABLED, REPAIR_MAX_ITERATIONS, REPAIR_TOKEN_BUDGET, REPAIR_TIME_BUDGET,
+    REPAIR_SNIPPET_CONTEXT
+)
+from llm_client import ContextLengthError
+from metrics import metrics
+from src.file_utils import read_file, write_file, output_relpath
+from src.java_index import render_ranges
+from src.test_fix import find_test_file, validate_fixed_file
+
+# 이전 프롬프트 + 이전 수정 코드 뒤에 이어 붙이는 피드백 (끝이 FIX_PROMPT_TEMPLATE과 같은 "Fixed Code:")
+REPAIR_FEEDBACK_TEMPLATE = """
+
+Result of compiling and testing the code above:
+{feedback}
+
+Instructions:
+- Fix these problems and output the complete corrected Java code
+- Do NOT use markdown code blocks (no ```)
+- Do NOT add explanations before or after the code
+
+Fixed Code:
+"""
+
+FEEDBACK_MAX_ITEMS = 10
+FEEDBACK_MESSAGE_MAX_CHARS = 300
+
+# stack trace에서 "(Foo.java:12)" 형식의 위치
+TRACE_LINE_RE = r'\({name}:(\d+)\)'
+
+
+def _snippet(code, lines):
+    """
+    lines 주변 REPAIR_SNIPPET_CONTEXT줄을 원본 줄 번호와 함께 출력
+    """
+    code_lines = code.split('\n')
+    ranges = sorted({
+        (max(1, line - REPAIR_SNIPPET_CONTEXT), min(len(code_lines), line + REPAIR_SNIPPET_CONTEXT))
+        for line in lines if 1 <= line <= len(code_lines)
+    })
+    return render_ranges(code_lines, ranges)
+
+
+def _message(text):
+    text = ' '.join((text or '').split())
+    return text[:FEEDBACK_MESSAGE_MAX_CHARS]
+
+
+def build_feedback(test_result, fixed_file, fixed_code, test_file):
+    """
+    테스트 결과에서 모델에 돌려줄 피드백 (javac 오류 또는 실패 테스트 + 관련 코드 부분만)
+
+    Returns:
+        tuple: (kind, feedback text, item count) - kind는 'compile', 'test_compile', 'tests' 또는 'error'
+    """
+    fixed_name = os.path.basename(fixed_file)
+    diagnostics = test_result.get('diagnostics') or []
+
+    if not test_result.get('compiled') or (diagnostics and not test_result.get('tests_run')):
+        fixed_errors = [d for d in diagnostics if os.path.basename(d.get('file', '')) == fixed_name]
+        if not test_result.get('compiled') and fixed_errors:
+            items = fixed_errors[:FEEDBACK_MAX_ITEMS]
+            lines = [f"- Line {d['line']}: {_message(d['message'])}" for d in items]
+            return 'compile', (
+                "The code does not compile:\n" + '\n'.join(lines)
+                + "\n\nRelevant code:\n" + _snippet(fixed_code, [d['line'] for d in items])
+            ), len(fixed_errors)
+
+        test_errors = [d for d in diagnostics if d not in fixed_errors]
+        if test_errors:
+            items = test_errors[:FEEDBACK_MAX_ITEMS]
+            test_code = read_file(test_file) or ''
+            lines = [f"- {os.path.basename(test_file)} line {d['line']}: {_message(d['message'])}" for d in items]
+            return 'test_compile', (
+                "The test class does not compile against the code:\n" + '\n'.join(lines)
+                + "\n\nRelevant test code:\n" + _snippet(test_code, [d['line'] for d in items])
+            ), len(test_errors)
+
+    failing = [t for t in test_result.get('tests') or [] if not t.get('passed')]
+    if failing:
+        items = failing[:FEEDBACK_MAX_ITEMS]
+        trace_re = re.compile(TRACE_LINE_RE.format(name=re.escape(fixed_name)))
+        lines, code_lines = [], []
+        for test in items:
+            lines.append(f"- {test.get('method') or test.get('name')}: {_message(test.get('message')) or 'failed'}")
+            # 실패 위치 중 수정된 파일의 줄 (가장 안쪽 frame)
+            match = trace_re.search(test.get('trace') or '')
+            if match:
+                code_lines.append(int(match.group(1)))
+        feedback = "Failing tests:\n" + '\n'.join(lines)
+        if code_lines:
+            feedback += "\n\nRelevant code:\n" + _snippet(fixed_code, code_lines)
+        return 'tests', feedback, len(failing)
+
+    errors = test_result.get('errors') or ['Tests did not pass']
+    return 'error', "Errors:\n" + '\n'.join(f"- {_message(e)}" for e in errors[:FEEDBACK_MAX_ITEMS]), len(errors)
+
+
+def _score(test_result):
+    return (bool(test_result.get('all_passed')), test_result.get('compiled', False),
+            test_result.get('passed', 0))
+
+
+def repair_fix(code_fixer, file_path, fl_result, fix_result, test_result, test_file=None):
+    """
+    테스트를 통과하지 못한 수정 코드를 javac/JUnit 피드백으로 반복 수정합니다.
+
+    프롬프트는 매번 이전 프롬프트 + 이전 수정 코드 + 새 피드백 형태로 길어지므로
+    prefix caching 백엔드(vLLM enable_prefix_caching 등)는 앞부분의 KV cache를 재사용합니다.
+    edit 모드 결과도 full-file 프롬프트를 기준으로 이어 갑니다.
+    테스트 통과, 반복 횟수, 토큰/시간 예산, 모델 context 한도 중 먼저 도달한 조건에서 멈추고,
+    가장 좋은 결과(통과 > 컴파일 > 통과 테스트 수)를 output/fixes에 남깁니다.
+
+    반복별 비용은 fix_result['repair']에 기록됩니다 (save_complete_result가 결과 JSON에 저장).
+
+    Returns:
+        dict: 최종 test_result
+    """
+    fixed_file = fix_result.get('fixed_file') or os.path.join(FIXES_OUTPUT_DIR, output_relpath(file_path))
+    if test_file is None:
+        test_file = find_test_file(file_path)
+    if test_result.get('all_passed') or not os.path.exists(fixed_file) or not os.path.exists(test_file):
+        return test_result
+
+    code = read_file(file_path)
+    fixed_code = read_file(fixed_file)
+    if code is None or fixed_code is None:
+        return test_result
+
+    filename = os.path.basename(file_path)
+    initial_result = test_result
+    conversation = code_fixer.build_prompt(code, fl_result, mode='full')
+    best_code, best_result = fixed_code, test_result
+    iterations = []
+    used_tokens = 0
+    start = time.perf_counter()
+    stop_reason = 'max_iterations'
+
+    for iteration in range(1, REPAIR_MAX_ITERATIONS + 1):
+        if time.perf_counter() - start >= REPAIR_TIME_BUDGET:
+            stop_reason = 'time_budget'
+            break
+        # 남은 예산으로 전체 파일을 다시 출력할 수 없으면 잘린 코드를 만들지 않고 중단
+        remaining = REPAIR_TOKEN_BUDGET - used_tokens
+        if remaining < code_fixer.expected_fix_tokens(code, mode='full'):
+            stop_reason = 'token_budget'
+            break
+
+        kind, feedback, items = build_feedback(test_result, fixed_file, fixed_code, test_file)
+        conversation += fixed_code + REPAIR_FEEDBACK_TEMPLATE.format(feedback=feedback)
+        print(f"    Repair {iteration}/{REPAIR_MAX_ITERATIONS} for {filename}: {items} {kind} problem(s)")
+        try:
+            max_tokens = min(code_fixer.plan_max_tokens(code, conversation, mode='full'), remaining)
+        except ContextLengthError as e:
+            # 대화가 길어져 전체 파일을 다시 출력할 공간이 없음
+            print(f"    Repair conversation for {filename} no longer fits the model context ({e})")
+            stop_reason = 'context_limit'
+            break
+
+        iteration_start = time.perf_counter()
+        try:
+            with metrics.span('repair_generation', file=file_path, iteration=iteration):
+                response = code_fixer.llm_client(conversation, max_tokens=max_tokens)
+        except Exception as e:
+            print(f"    Error generating repair: {e}")
+            stop_reason = 'error'
+            break
+        fixed_code = code_fixer.clean_code(response['text'].strip())
+        used_tokens += response.get('prompt_tokens', 0) + response.get('completion_tokens', 0)
+
+        write_file(fixed_file, fixed_code)
+        test_result = validate_fixed_file(file_path, test_file=test_file)
+        iterations.append({
+            'iteration': iteration,
+            'feedback': kind,
+            'feedback_items': items,
+            'prompt_tokens': response.get('prompt_tokens', 0),
+            'completion_tokens': response.get('completion_tokens', 0),
+            'seconds': round(time.perf_counter() - iteration_start, 3),
+            'compiled': test_result.get('compiled', False),
+            'passed': test_result.get('passed', 0),
+            'failed': test_result.get('failed', 0),
+            'all_passed': test_result.get('all_passed', False)
+        })
+
+        if _score(test_result) > _score(best_result):
+            best_code, best_result = fixed_code, test_result
+        if test_result.get('all_passed'):
+            stop_reason = 'passed'
+            break
+
+    if best_code != fixed_code:
+        # 마지막 시도가 이전보다 나쁘면 가장 좋은 코드로 되돌림
+        write_file(fixed_file, best_code)
+    if 'fixed_code' in fix_result:
+        fix_result['fixed_code'] = best_code
+
+    prompt_tokens = sum(i['prompt_tokens'] for i in iterations)
+    completion_tokens = sum(i['completion_tokens'] for i in iterations)
+    fix_result['repair'] = {
+        'iterations': iterations,
+        'stop_reason': stop_reason,
+        'seconds': round(time.perf_counter() - start, 3),
+        'token_usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+    }
+    print(f"    Repair for {filename} stopped ({stop_reason}) after {len(iterations)} iteration(s)")
+
+    final = dict(best_result)
+    for key in ('selected_candidate', 'candidates'):
+        # 후보 검증 결과는 첫 테스트 결과에만 있음
+        if key in initial_result:
+            final.setdefault(key, initial_result[key])
+    return final
+
+
+def test_and_repair(code_fixer, file_path, fl_result, fix_result, test_file=None):
+    """
+    validate_fixed_file 후 REPAIR_LOOP_ENABLED이면 실패한 수정 코드를 repair_fix로 반복 수정
+    """
+    test_result = validate_fixed_file(file_path, fix_result, test_file=test_file)
+    if not REPAIR_LOOP_ENABLED or not fix_result or not fix_result.get('fixed_file'):
+        return test_result
+    try:
+        return repair_fix(code_fixer, file_path, fl_result, fix_result, test_result, test_file=test_file)
+    except Exception as e:
+        print(f"    Error in repair loop for {os.path.basename(file_path)}: {e}")
+        return test_result
@@ -0,0 +1,215 @@
+"""
+Repair server protocol (one JSON object per line over a Unix socket)
+
+Requests:
+    {"id": "1", "file": "/abs/path/Foo.java", "test_file": "/abs/path/FooTest.java"}
+    {"id": "2", "filename": "Foo.java", "source": "...", "test_source": "..."}
+    {"command": "ping"}
+    {"command": "shutdown"}
+
+Responses (per job, streamed as jobs finish, in any order):
+    {"id": "1", "status": "accepted"}
+    {"id": "1", "status": "done", "result": {... same JSON as save_complete_result ...}}
+    {"id": "1", "status": "error" | "rejected", "error": "..."}
+
+test_file is optional for "file" jobs (default: find_test_file).
+"""
+
+import json
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import SERVER_SOCKET_PATH, SERVER_MAX_JOBS, SERVER_MAX_PENDING, TEST_SCRATCH_DIR
+from src.file_utils import output_relpath
+from src.repair_loop import test_and_repair
+
+
+class RepairServer:
+    """
+    Keeps the LLM warm and runs FL -> Fix -> Test jobs submitted over a
+    Unix socket, at most max_jobs at a time.
+    """
+
+    def __init__(self, fault_localizer, code_fixer, socket_path=None, max_jobs=None, max_pending=None):
+        self.fault_localizer = fault_localizer
+        self.code_fixer = code_fixer
+        self.socket_path = socket_path or SERVER_SOCKET_PATH
+        self.max_pending = max_pending or SERVER_MAX_PENDING
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_jobs or SERVER_MAX_JOBS),
+                                            thread_name_prefix='repair-job')
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        # 출력 경로가 같은 작업은 output/fixes/<name>을 공유하므로 순서대로 처리
+        self._file_locks = {}
+        self._server = None
+
+    def process_job(self, job):
+        """
+        Run one repair job and return the saved complete result.
+        """
+        workspace = None
+        try:
+            if 'source' in job:
+                # 소스/테스트 텍스트로 받은 작업은 임시 작업 디렉토리에 파일로 저장
+                workspace = tempfile.mkdtemp(prefix='llmfix_job_', dir=TEST_SCRATCH_DIR)
+                filename = os.path.basename(job['filename'])
+                file_path = os.path.join(workspace, filename)
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    f.write(job['source'])
+                test_file = None
+                if job.get('test_source') is not None:
+                    test_file = os.path.join(workspace, filename.replace('.java', 'Test.java'))
+                    with open(test_file, 'w', encoding='utf-8') as f:
+                        f.write(job['test_source'])
+            else:
+                file_path = job['file']
+                test_file = job.get('test_file')
+
+            with self._file_lock(output_relpath(file_path)):
+                fl_result = self.fault_localizer.localize_faults(file_path)
+                fix_result = self.code_fixer.generate_fix(file_path, fl_result)
+                test_result = test_and_repair(self.code_fixer, file_path, fl_result, fix_result, test_file=test_file)
+                return self.code_fixer.save_complete_result(file_path, fl_result, fix_result, test_result)
+        finally:
+            if workspace is not None:
+                shutil.rmtree(workspace, ignore_errors=True)
+
+    def _file_lock(self, filename):
+        with self._pending_lock:
+            return self._file_locks.setdefault(filename, threading.Lock())
+
+    def submit(self, job, respond):
+        """
+        Queue a job; respond(message) is called with the final status.
+
+        Returns:
+            Future or None: None if the job was rejected
+        """
+        job_id = job.get('id')
+        if 'file' not in job and not ('source' in job and 'filename' in job):
+            respond({'id': job_id, 'status': 'error', 'error': "job needs 'file' or 'filename' + 'source'"})
+            return None
+
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                respond({'id': job_id, 'status': 'rejected', 'error': 'server busy'})
+                return None
+            self._pending += 1
+
+        def run():
+            try:
+                respond({'id': job_id, 'status': 'done', 'result': self.process_job(job)})
+            except Exception as e:
+                respond({'id': job_id, 'status': 'error', 'error': str(e)})
+            finally:
+                with self._pending_lock:
+                    self._pending -= 1
+
+        respond({'id': job_id, 'status': 'accepted'})
+        try:
+            return self._executor.submit(run)
+        except RuntimeError:
+            # shutdown 이후에 도착한 작업
+            with self._pending_lock:
+                self._pending -= 1
+            respond({'id': job_id, 'status': 'rejected', 'error': 'server shutting down'})
+            return None
+
+    def serve_forever(self):
+        """
+        Accept jobs until a shutdown command, SIGINT or SIGTERM, then finish
+        running jobs and remove the socket.
+        """
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        directory = os.path.dirname(self.socket_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, _make_handler(self))
+        self._server.daemon_threads = True
+
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda signum, frame: self.shutdown())
+
+        print(f"Repair server listening on {self.socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            print("Repair server shutting down (waiting for running jobs)...")
+            self._executor.shutdown(wait=True)
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def shutdown(self):
+        # serve_forever를 실행 중인 스레드에서 직접 호출하면 교착되므로 별도 스레드에서 호출
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+
+def _make_handler(server):
+    class RepairHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            write_lock = threading.Lock()
+            futures = []
+
+            def respond(message):
+                data = (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8')
+                with write_lock:
+                    try:
+                        self.wfile.write(data)
+                        self.wfile.flush()
+                    except OSError:
+                        pass  # client disconnected; the result JSON is still saved
+
+            for line in self.rfile:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    respond({'status': 'error', 'error': 'malformed JSON'})
+                    continue
+
+                command = request.get('command')
+                if command == 'ping':
+                    respond({'status': 'ok'})
+                elif command == 'shutdown':
+                    respond({'status': 'shutting_down'})
+                    server.shutdown()
+                    break
+                else:
+                    future = server.submit(request, respond)
+                    if future is not None:
+                        futures.append(future)
+
+            # 이 연결로 받은 작업의 결과를 모두 보낸 뒤 연결 종료
+            for future in futures:
+                future.result()
+
+    return RepairHandler
+
+
+def submit_jobs(jobs, socket_path=None):
+    """
+    Send jobs to a running repair server and yield every response line
+    until all jobs are finished (client side, e.g. for CI).
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path or SERVER_SOCKET_PATH)
+        for job in jobs:
+            sock.sendall((json.dumps(job, ensure_ascii=False) + '\n').encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+
+        with sock.makefile('r', encoding='utf-8') as responses:
+            for line in responses:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,328 @@
+import codecs
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import zlib
+
+# .gz sink는 실행 중에는 압축하지 않은 이 파일에 기록하고, close 시 gzip member 하나로 이어 붙임
+STAGING_SUFFIX = '.part'
+
+
+def compact_record(path, complete_result):
+    """
+    Sink에 저장할 한 줄 결과 (후보 코드, 테스트 stack trace 등 큰 필드 제외)
+    """
+    record = {'path': path, **complete_result}
+    tests = complete_result.get('test', {}).get('tests')
+    if tests:
+        record['test'] = {
+            **complete_result['test'],
+            'tests': [{key: value for key, value in test.items() if key != 'trace'} for test in tests]
+        }
+    candidates = complete_result.get('fix', {}).get('candidates')
+    if candidates:
+        record['fix'] = {
+            **complete_result['fix'],
+            'candidates': [
+                {key: value for key, value in candidate.items() if key != 'fixed_code'}
+                for candidate in candidates
+            ]
+        }
+    return record
+
+
+def _gzip_chunks(f):
+    """
+    Decompress concatenated gzip members from f, stopping quietly at a
+    truncated or corrupt trailing member.
+
+    Returns (as the generator's return value) the byte offset where the last
+    complete member ends.
+    """
+    complete = offset = 0
+    decompressor = zlib.decompressobj(31)
+    buffer = b''
+    while True:
+        if not buffer:
+            buffer = f.read(1 << 16)
+            if not buffer:
+                return complete
+        try:
+            data = decompressor.decompress(buffer)
+        except zlib.error:
+            return complete
+        if data:
+            yield data
+        if decompressor.eof:
+            offset += len(buffer) - len(decompressor.unused_data)
+            complete = offset
+            buffer = decompressor.unused_data
+            decompressor = zlib.decompressobj(31)
+        else:
+            offset += len(buffer)
+            buffer = b''
+
+
+def _complete_gzip_length(path):
+    """
+    path에서 끝까지 온전한 gzip member들의 길이 (비정상 종료로 잘린 마지막 member 제외)
+    """
+    with open(path, 'rb') as f:
+        chunks = _gzip_chunks(f)
+        while True:
+            try:
+                next(chunks)
+            except StopIteration as stop:
+                return stop.value
+
+
+def _gzip_lines(path):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ''
+    with open(path, 'rb') as f:
+        for data in _gzip_chunks(f):
+            pending += decoder.decode(data)
+            *lines, pending = pending.split('\n')
+            yield from lines
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+class JsonlResultSink:
+    """
+    Appends one compact JSON line per file and fsyncs every fsync_every
+    records. For a .gz path the lines go to an uncompressed staging file
+    (path + STAGING_SUFFIX) that close() appends to path as one complete gzip
+    member, so a crash never leaves a broken member behind; a staging file
+    left by a crashed run is compressed on the next open.
+    """
+
+    def __init__(self, path, fsync_every=50):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._compressed = path.endswith('.gz')
+        if self._compressed:
+            # 이전 실행이 남긴 staging 파일을 먼저 압축 (--summary가 path를 찾을 수 있도록 빈 파일도 생성)
+            open(path, 'ab').close()
+            self._compress_staging()
+        self._raw = open(path + STAGING_SUFFIX if self._compressed else path, 'ab')
+
+    def append(self, record):
+        line = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._lock:
+            self._raw.write(line)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self._sync()
+            else:
+                # 프로세스가 죽어도 OS에는 남도록 매번 flush
+                self._raw.flush()
+
+    def _sync(self):
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._unsynced = 0
+
+    def _compress_staging(self):
+        """
+        Staging 파일을 gzip member 하나로 path에 추가한 뒤 삭제
+        (압축 도중 죽었다면 잘린 member를 먼저 잘라냄 - staging 파일은 그대로 남아 있음)
+        """
+        staging = self.path + STAGING_SUFFIX
+        if not os.path.exists(staging):
+            return
+        complete = _complete_gzip_length(self.path)
+        with open(self.path, 'r+b') as raw:
+            raw.truncate(complete)
+            raw.seek(complete)
+            with open(staging, 'rb') as source, gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                shutil.copyfileobj(source, gz)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.remove(staging)
+
+    def close(self):
+        with self._lock:
+            if self._raw.closed:
+                return
+            self._sync()
+            self._raw.close()
+            if self._compressed:
+                self._compress_staging()
+
+
+class SqliteResultSink:
+    """
+    Upserts one row per file into a SQLite table, committing every fsync_every records.
+    """
+
+    def __init__(self, path, fsync_every=50):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                   path TEXT PRIMARY KEY,
+                   record TEXT NOT NULL
+               )"""
+        )
+        self._conn.commit()
+
+    def append(self, record):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (path, record) VALUES (?, ?)",
+                (record['path'], json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+            )
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self._conn.commit()
+                self._unsynced = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+def open_result_sink(kind, path, fsync_every=50):
+    """
+    RESULT_SINK 설정에 맞는 sink (kind가 None이면 None)
+    """
+    if kind is None:
+        return None
+    if kind == 'jsonl':
+        return JsonlResultSink(path, fsync_every)
+    if kind == 'sqlite':
+        return SqliteResultSink(path, fsync_every)
+    raise ValueError(f"Unsupported RESULT_SINK: {kind}")
+
+
+def iter_records(path):
+    """
+    Sink 파일의 레코드를 하나씩 반환 (JSONL, gzip JSONL, SQLite - 파일 header로 구분)
+    JSONL은 같은 파일이 여러 번 기록될 수 있으므로 latest_records()로 중복을 정리합니다.
+    gzip은 잘린 마지막 member에서 멈추고, 아직 압축되지 않은 staging 파일의 레코드도 이어서 반환합니다.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(16)
+
+    if header == b'SQLite format 3\x00':
+        conn = sqlite3.connect(path)
+        try:
+            for (record,) in conn.execute("SELECT record FROM results ORDER BY path"):
+                yield json.loads(record)
+        finally:
+            conn.close()
+        return
+
+    staging = path + STAGING_SUFFIX
+    yield from _parse_lines(_gzip_lines(path) if header[:2] == b'\x1f\x8b' else _text_lines(path))
+    if os.path.exists(staging):
+        yield from _parse_lines(_text_lines(staging))
+
+
+def _text_lines(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        yield from f
+
+
+def _parse_lines(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # 비정상 종료로 잘린 마지막 줄
+            continue
+
+
+def latest_records(path, project=None):
+    """
+    path -> 마지막 레코드 (project가 주어지면 project(record)만 보관해 메모리 절약)
+    """
+    latest = {}
+    for record in iter_records(path):
+        latest[record.get('path', record.get('file'))] = project(record) if project else record
+    return latest
+
+
+def _summary_fields(record):
+    test = record.get('test', {})
+    usages = [record.get(stage, {}).get('token_usage', {}) for stage in ('fl', 'fix')]
+    # Repair loop 반복에서 쓴 토큰 (fix.repair.token_usage)
+    usages.append(record.get('fix', {}).get('repair', {}).get('token_usage', {}))
+    tokens = [
+        sum(usage.get(key, 0) for usage in usages)
+        for key in ('prompt_tokens', 'completion_tokens', 'total_tokens')
+    ]
+    return bool(test.get('compiled')), bool(test.get('all_passed')), tokens, record.get('fix', {}).get('mode')
+
+
+def summarize(path):
+    """
+    Sink 전체 집계
+
+    Returns:
+        dict: files, compiled, all_tests_passed, failed_or_errored, token 합계, fix mode별 개수
+    """
+    summary = {
+        'files': 0,
+        'compiled': 0,
+        'all_tests_passed': 0,
+        'failed_or_errored': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'total_tokens': 0,
+        'fix_modes': {},
+    }
+    for compiled, all_passed, tokens, mode in latest_records(path, _summary_fields).values():
+        summary['files'] += 1
+        if compiled:
+            summary['compiled'] += 1
+        if all_passed:
+            summary['all_tests_passed'] += 1
+        else:
+            summary['failed_or_errored'] += 1
+        for key, count in zip(('prompt_tokens', 'completion_tokens', 'total_tokens'), tokens):
+            summary[key] += count
+        mode = mode or 'none'
+        summary['fix_modes'][mode] = summary['fix_modes'].get(mode, 0) + 1
+    return summary
+
+
+def format_summary(path):
+    """
+    --summary 출력용 텍스트
+    """
+    summary = summarize(path)
+    lines = [
+        f"Results: {path}",
+        f"Files: {summary['files']}",
+        f"  - Compiled: {summary['compiled']}",
+        f"  - All tests passed: {summary['all_tests_passed']}",
+        f"  - Failed or errored: {summary['failed_or_errored']}",
+        f"Total Tokens Used: {summary['total_tokens']}",
+        f"  - Prompt Tokens: {summary['prompt_tokens']}",
+        f"  - Completion Tokens: {summary['completion_tokens']}",
+        "Fix Modes: " + ', '.join(f"{mode}: {count}" for mode, count in sorted(summary['fix_modes'].items())),
+    ]
+    return '\n'.join(lines)
@@ -0,0 +1,277 @@
+import math
+import os
+import re
+from config import SBFL_FORMULA, SBFL_SKIP_LLM_SCORE, SBFL_SKIP_MAX_LINES, SBFL_TOP_K, SBFL_TIMEOUT
+from metrics import metrics
+from src.java_index import index_java, mask_code, context_ranges
+from src.test_fix import PACKAGE_RE, find_test_file, run_coverage_tests
+
+PROBE_CLASS = 'SbflProbe__'
+
+# 대상 클래스와 같은 package에 생성하는 coverage probe (TestRunner --coverage가 테스트마다 drain)
+PROBE_TEMPLATE = """{package}public final class SbflProbe__ {{
+    private static final java.util.BitSet HITS = new java.util.BitSet();
+
+    public static synchronized void hit(int line) {{
+        HITS.set(line);
+    }}
+
+    public static synchronized String drain() {{
+        String lines = HITS.toString();
+        HITS.clear();
+        return lines;
+    }}
+}}
+"""
+
+# 이 토큰으로 시작하는 줄 앞에는 문장을 넣을 수 없음 (블록 닫기, 이어지는 절, case label, 생성자 첫 문장 등)
+NO_PROBE_RE = re.compile(r'^(\}|\)|else\b|catch\b|finally\b|case\b|default\b|super\s*\(|this\s*\(|@)')
+
+# '{'가 여는 블록이 클래스 본문인지 판별 (named/local 클래스 선언, 익명 클래스 생성)
+CLASS_DECL_RE = re.compile(r'\b(class|interface|enum|record)\s+[\w$]+')
+ANONYMOUS_NEW_RE = re.compile(r'\bnew\s+[\w$.]+\s*(?:<[^;{}]*>)?\s*\(')
+
+FAILURE_MESSAGE_MAX_CHARS = 200
+
+
+def _is_anonymous_class(header):
+    """
+    header가 `new Foo(...)`로 끝나는지 (다음 '{'가 익명 클래스 본문)
+    """
+    header = header.rstrip()
+    for match in reversed(list(ANONYMOUS_NEW_RE.finditer(header))):
+        depth = 0
+        for index in range(match.end() - 1, len(header)):
+            if header[index] == '(':
+                depth += 1
+            elif header[index] == ')':
+                depth -= 1
+                if depth == 0:
+                    if index == len(header) - 1:
+                        return True
+                    break
+    return False
+
+
+def _block_kind(header, parent):
+    """
+    '{'가 여는 블록 종류: 'class' (클래스/익명 클래스 본문), 'enum' (enum 상수 목록이 끝나기 전),
+    'data' (배열 초기화, annotation 값), 'code' (메서드/생성자/초기화 블록과 그 안의 블록)
+
+    Args:
+        header (str): 직전 ';', '{', '}' 이후의 코드 (주석/문자열 제외)
+        parent (str): 바깥 블록 종류 (최상위는 None)
+    """
+    declaration = CLASS_DECL_RE.search(header)
+    if declaration:
+        return 'enum' if declaration.group(1) == 'enum' else 'class'
+    if parent == 'enum' or _is_anonymous_class(header):
+        # enum 상수 본문, 익명 클래스 본문
+        return 'class'
+    stripped = header.rstrip()
+    if parent == 'data' or (stripped and stripped[-1] in '=],('):
+        return 'data'
+    if parent is None:
+        return 'class'
+    return 'code'
+
+
+def instrument(code):
+    """
+    메서드 본문에서 새 문장이 시작되는 줄 앞에 `SbflProbe__.hit(<줄 번호>);`를 삽입합니다.
+    줄 수는 바뀌지 않으므로 coverage 줄 번호가 원본과 같습니다.
+    메서드 안의 익명/local 클래스 본문(멤버 선언 위치)과 배열 초기화에는 넣지 않습니다.
+
+    Returns:
+        tuple: (instrumented code, probed line numbers)
+    """
+    masked_lines = mask_code(code).split('\n')
+    lines = code.split('\n')
+
+    # 줄 시작 시점의 괄호 깊이, 직전 두 개의 의미 있는 문자, 감싸는 블록 종류 (주석/문자열 제외)
+    depth_at, previous_at, block_at = [], [], []
+    depth, previous = 0, ('', '')
+    blocks, header = [], ''
+    for masked_line in masked_lines:
+        depth_at.append(depth)
+        previous_at.append(previous)
+        block_at.append(blocks[-1] if blocks else None)
+        for ch in masked_line:
+            if ch == '(':
+                depth += 1
+            elif ch == ')':
+                depth -= 1
+            if ch == '{':
+                blocks.append(_block_kind(header, blocks[-1] if blocks else None))
+                header = ''
+            elif ch == '}':
+                if blocks:
+                    blocks.pop()
+                header = ''
+            elif ch == ';':
+                if blocks and blocks[-1] == 'enum' and depth == 0:
+                    # enum 상수 목록 끝 → 이후는 일반 클래스 본문
+                    blocks[-1] = 'class'
+                header = ''
+            else:
+                header += ch
+            if not ch.isspace():
+                previous = (previous[1], ch)
+        header += ' '
+
+    body_lines = set()
+    for method in index_java(code).methods:
+        # 메서드 선언의 '{' 다음 줄부터 닫는 '}' 앞 줄까지
+        for number in range(method.start, method.end + 1):
+            if '{' in masked_lines[number - 1]:
+                body_lines.update(range(number + 1, method.end))
+                break
+
+    probed = []
+    for number in sorted(body_lines):
+        index = number - 1
+        stripped = masked_lines[index].strip()
+        before, last = previous_at[index]
+        if not stripped or depth_at[index] != 0 or block_at[index] != 'code' or NO_PROBE_RE.match(stripped):
+            continue
+        # 이전 문장/블록이 끝난 위치만 (배열 초기화 `= {`, `[] {` 내부는 제외)
+        if last not in ';{}' or (last == '{' and before in '=],'):
+            continue
+        line = lines[index]
+        indent = len(line) - len(line.lstrip())
+        lines[index] = f"{line[:indent]}{PROBE_CLASS}.hit({number}); {line[indent:]}"
+        probed.append(number)
+    return '\n'.join(lines), probed
+
+
+def suspiciousness(failed_covering, passed_covering, failed_total, passed_total, formula=None):
+    """
+    Ochiai: ef / sqrt(F * (ef + ep))
+    Tarantula: (ef / F) / (ef / F + ep / P)
+    """
+    if failed_covering == 0:
+        return 0.0
+    if (formula or SBFL_FORMULA) == 'tarantula':
+        fail_ratio = failed_covering / failed_total
+        pass_ratio = passed_covering / passed_total if passed_total else 0.0
+        return fail_ratio / (fail_ratio + pass_ratio)
+    return failed_covering / math.sqrt(failed_total * (failed_covering + passed_covering))
+
+
+def rank_lines(tests, formula=None):
+    """
+    Args:
+        tests (list): TestRunner 결과 (각 항목에 'passed', 'covered')
+
+    Returns:
+        list: [(line, score)] 의심도 내림차순 (같으면 줄 번호 순), 실패 테스트가 실행한 줄만
+    """
+    failed_total = sum(1 for t in tests if not t['passed'])
+    passed_total = len(tests) - failed_total
+    counts = {}
+    for test in tests:
+        for line in test['covered']:
+            failed, passed = counts.get(line, (0, 0))
+            counts[line] = (failed + 1, passed) if not test['passed'] else (failed, passed + 1)
+
+    ranking = [
+        (line, suspiciousness(failed, passed, failed_total, passed_total, formula))
+        for line, (failed, passed) in counts.items()
+        if failed
+    ]
+    ranking.sort(key=lambda item: (-item[1], item[0]))
+    return ranking
+
+
+def spectrum_localize(file_path, code):
+    """
+    수정 전 코드를 coverage probe와 함께 테스트해 의심 줄 순위를 계산합니다.
+
+    Returns:
+        dict or None: {'formula', 'failing_tests': [{'name', 'message'}], 'passing_tests',
+                       'ranking': [(line, score)], 'confident'}
+                      테스트가 없거나, 모두 통과하거나, 실행에 실패하면 None
+    """
+    test_file = find_test_file(file_path)
+    if not os.path.exists(test_file):
+        return None
+
+    instrumented, probed = instrument(code)
+    if not probed:
+        return None
+    package = PACKAGE_RE.search(code)
+    sources = {
+        os.path.basename(file_path): instrumented,
+        f"{PROBE_CLASS}.java": PROBE_TEMPLATE.format(package=f"package {package.group(1)};\n\n" if package else ''),
+    }
+    probe_class = f"{package.group(1)}.{PROBE_CLASS}" if package else PROBE_CLASS
+
+    with metrics.span('sbfl', file=file_path):
+        report = run_coverage_tests(sources, test_file, probe_class, timeout=SBFL_TIMEOUT)
+    if report is None:
+        return None
+
+    tests = [t for t in report.get('tests', []) if 'covered' in t]
+    failing = [t for t in tests if not t['passed']]
+    if not failing:
+        print(f"    SBFL: no failing test for {os.path.basename(file_path)}, using LLM fault localization")
+        return None
+
+    ranking = rank_lines(tests)
+    top_score = ranking[0][1] if ranking else 0.0
+    tied = [line for line, score in ranking if score == top_score]
+    return {
+        'formula': SBFL_FORMULA,
+        'failing_tests': [
+            {'name': t.get('method') or t['name'], 'message': (t.get('message') or '')[:FAILURE_MESSAGE_MAX_CHARS]}
+            for t in failing
+        ],
+        'passing_tests': len(tests) - len(failing),
+        'ranking': ranking,
+        'confident': bool(ranking) and top_score >= SBFL_SKIP_LLM_SCORE and len(tied) <= SBFL_SKIP_MAX_LINES,
+    }
+
+
+def spectrum_faults(spectrum):
+    """
+    LLM 없이 만든 fault 목록 (의심도가 가장 높은 줄들, "Line X: ..." 형식)
+    """
+    top_score = spectrum['ranking'][0][1]
+    failing = spectrum['failing_tests']
+    tests = ', '.join(t['name'] for t in failing[:3])
+    message = next((t['message'] for t in failing if t['message']), '')
+    detail = f"; {message}" if message else ''
+    return [
+        f"Line {line}: Statement executed by failing test(s) {tests}{detail} "
+        f"({spectrum['formula']} {score:.2f})"
+        for line, score in spectrum['ranking']
+        if score == top_score
+    ]
+
+
+def suspicious_regions(code, spectrum, top_k=None):
+    """
+    상위 top_k개 의심 줄이 속한 메서드 범위와 context 범위
+
+    Returns:
+        tuple: (context ranges, code ranges) - render_ranges 형식
+    """
+    index = index_java(code)
+    ranges = set()
+    for line, score in spectrum['ranking'][:top_k or SBFL_TOP_K]:
+        method = next((m for m in index.methods if m.start <= line <= m.end), None)
+        ranges.add((method.start, method.end) if method else (line, line))
+    return context_ranges(index), sorted(ranges)
+
+
+def spectrum_summary(spectrum, llm_skipped):
+    """
+    결과 JSON에 남길 SBFL 요약
+    """
+    return {
+        'formula': spectrum['formula'],
+        'failing_tests': [t['name'] for t in spectrum['failing_tests']],
+        'passing_tests': spectrum['passing_tests'],
+        'top_lines': [{'line': line, 'score': round(score, 4)} for line, score in spectrum['ranking'][:SBFL_TOP_K]],
+        'llm_skipped': llm_skipped,
+    }
@@ -0,0 +1,146 @@
+import queue
+import threading
+import time
+from config import (
+    BATCH_MODE, LLM_BATCH_SIZE, GENERATION_WORKERS, TEST_WORKERS, STAGE_QUEUE_SIZE
+)
+from metrics import metrics
+from src.repair_loop import test_and_repair
+
+_DONE = object()
+
+
+def _empty_fl_result():
+    return {'faults': [], 'tokens': {}}
+
+
+def _empty_fix_result():
+    return {'fixed_code': None, 'fixed_file': None, 'tokens': {}}
+
+
+class _StageCloser:
+    """
+    마지막 worker가 끝날 때 다음 stage에 종료 신호를 보냄
+    """
+
+    def __init__(self, workers, downstream, signals):
+        self._remaining = workers
+        self._lock = threading.Lock()
+        self._downstream = downstream
+        self._signals = signals
+
+    def worker_done(self):
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last:
+            for _ in range(self._signals):
+                self._downstream.put(_DONE)
+
+
+def run_streaming(buggy_files, fault_localizer, code_fixer, on_complete,
+                  generation_workers=None, test_workers=None, queue_size=None):
+    """
+    FL/Fix 생성 → 테스트 → 저장을 동시에 실행하는 스트리밍 파이프라인
+
+    생성된 fix는 곧바로 테스트 stage로 넘어가고, 테스트가 끝난 파일은
+    곧바로 on_complete로 전달됩니다. stage 사이의 큐는 queue_size로
+    제한되어 테스트가 밀리면 생성도 잠시 멈춥니다 (backpressure).
+
+    Args:
+        buggy_files (list): 처리할 파일 경로
+        fault_localizer (FaultLocalizer): FL stage
+        code_fixer (CodeFixer): Fix stage
+        on_complete (callable): on_complete(file, fl_result, fix_result, test_result),
+            호출 스레드에서 실행
+        generation_workers (int): 동시 생성 worker 수 (기본값: GENERATION_WORKERS)
+        test_workers (int): 동시 테스트 worker 수 (기본값: TEST_WORKERS)
+        queue_size (int): stage 간 큐 크기 (기본값: STAGE_QUEUE_SIZE)
+    """
+    generation_workers = max(1, generation_workers or GENERATION_WORKERS)
+    test_workers = max(1, test_workers or TEST_WORKERS)
+    queue_size = queue_size or STAGE_QUEUE_SIZE
+
+    # BATCH_MODE면 LLM_BATCH_SIZE 단위로 묶어서 생성
+    chunk_size = LLM_BATCH_SIZE if BATCH_MODE else 1
+    work_queue = queue.Queue()
+    for start in range(0, len(buggy_files), chunk_size):
+        work_queue.put(buggy_files[start:start + chunk_size])
+    for _ in range(generation_workers):
+        work_queue.put(_DONE)
+
+    test_queue = queue.Queue(maxsize=queue_size)
+    result_queue = queue.Queue(maxsize=queue_size)
+    generation_closer = _StageCloser(generation_workers, test_queue, test_workers)
+    test_closer = _StageCloser(test_workers, result_queue, 1)
+
+    def generate(files):
+        if len(files) == 1 and not BATCH_MODE:
+            file = files[0]
+            fl_result = fault_localizer.localize_faults(file)
+            fix_result = code_fixer.generate_fix(file, fl_result)
+            return [(file, fl_result, fix_result)]
+
+        fl_results = fault_localizer.localize_faults_batch(files)
+        fix_results = code_fixer.generate_fix_batch(fl_results)
+        return [(file, fl_results[file], fix_results[file]) for file in files]
+
+    def generation_worker():
+        try:
+            while True:
+                files = work_queue.get()
+                if files is _DONE:
+                    break
+                try:
+                    generated = generate(files)
+                except Exception as e:
+                    print(f"    Error generating fix for {len(files)} file(s): {e}")
+                    generated = [(file, _empty_fl_result(), _empty_fix_result()) for file in files]
+                for item in generated:
+                    test_queue.put((time.perf_counter(), item))
+        finally:
+            generation_closer.worker_done()
+
+    def test_worker():
+        try:
+            while True:
+                item = test_queue.get()
+                if item is _DONE:
+                    break
+                queued_at, (file, fl_result, fix_result) = item
+                metrics.record_span('queue_wait', time.perf_counter() - queued_at, queue='test', file=file)
+                try:
+                    test_result = test_and_repair(code_fixer, file, fl_result, fix_result)
+                except Exception as e:
+                    test_result = {
+                        'compiled': False,
+                        'tests_run': 0,
+                        'passed': 0,
+                        'failed': 0,
+                        'errors': [str(e)]
+                    }
+                result_queue.put((time.perf_counter(), (file, fl_result, fix_result, test_result)))
+        finally:
+            test_closer.worker_done()
+
+    threads = [
+        threading.Thread(target=generation_worker, name=f'generate-{i}', daemon=True)
+        for i in range(generation_workers)
+    ] + [
+        threading.Thread(target=test_worker, name=f'test-{i}', daemon=True)
+        for i in range(test_workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    # Save stage: 호출 스레드에서 완료 순서대로 처리
+    while True:
+        item = result_queue.get()
+        if item is _DONE:
+            break
+        queued_at, result = item
+        metrics.record_span('queue_wait', time.perf_counter() - queued_at, queue='save', file=result[0])
+        on_complete(*result)
+
+    for thread in threads:
+        thread.join()
\ No newline at end of file
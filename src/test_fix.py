@@ -1,125 +1,559 @@
 import os
+import json
+import re
+import shutil
 import subprocess
-from config import TEST_DIR, FIXES_OUTPUT_DIR
+import tempfile
+import time
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from config import (
+    TEST_DIR, FIXES_OUTPUT_DIR, JUNIT_CLASSPATH, TEST_WORKERS, TEST_SCRATCH_DIR, USE_JVM_DAEMON,
+    JVM_DAEMON_MAX_FAILURES, CANDIDATE_WORKERS, TEST_OUTPUT_MAX_CHARS, PRIORITIZE_TESTS, FAIL_FAST_CANDIDATES
+)
+from metrics import metrics
+from src.candidates import unique_candidates
+from src.file_utils import write_file, read_file, iter_files, output_relpath
+from src.jvm_daemon import JvmDaemonError, compile_helpers, run_java_tests_daemon
+from src.test_priority import record_outcome, prioritized_tests
 
-def compile_java_file(java_file):
+_daemon_disabled = False
+_daemon_failures = 0
+_daemon_failures_lock = threading.Lock()
+
+PACKAGE_RE = re.compile(r'^\s*package\s+([\w.]+)\s*;', re.MULTILINE)
+
+# TestRunner를 쓸 수 없을 때 JUnitCore 텍스트 출력에서 결과 추출
+JUNIT_OK_RE = re.compile(r'^OK \((\d+) tests?\)', re.MULTILINE)
+JUNIT_FAILURES_RE = re.compile(r'^Tests run: (\d+),\s+Failures: (\d+)', re.MULTILINE)
+
+# javac 오류 줄 ("Foo.java:12: error: cannot find symbol")과 이어지는 symbol/location 설명
+JAVAC_ERROR_RE = re.compile(r'^(.+?\.java):(\d+): error: (.*)$')
+JAVAC_DETAIL_RE = re.compile(r'^\s+(symbol|location|required|found|reason):')
+
+# test file name -> paths under TEST_DIR (find_test_file fallback, built on first use)
+_test_index = None
+_test_index_lock = threading.Lock()
+
+class ValidationCancelled(Exception):
+    """Raised when a validation is cancelled because another candidate already passed."""
+
+def _run_process(command, timeout=30, cwd=None, cancel_event=None):
+    """
+    subprocess.run equivalent that kills the process early when cancel_event is set.
+    """
+    if cancel_event is None:
+        return subprocess.run(command, capture_output=True, text=True, timeout=timeout, cwd=cwd)
+
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=cwd
+    )
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=0.1)
+            return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+        except subprocess.TimeoutExpired:
+            if cancel_event.is_set():
+                process.kill()
+                process.communicate()
+                raise ValidationCancelled()
+            if time.monotonic() > deadline:
+                process.kill()
+                process.communicate()
+                raise subprocess.TimeoutExpired(command, timeout)
+
+def parse_javac_errors(output):
+    """
+    Structured javac errors, in the same shape as the JVM daemon's diagnostics.
+
+    Returns:
+        list: [{'file', 'line', 'message'}]
+    """
+    diagnostics = []
+    for line in output.splitlines():
+        match = JAVAC_ERROR_RE.match(line)
+        if match:
+            diagnostics.append({'file': match.group(1), 'line': int(match.group(2)), 'message': match.group(3)})
+        elif diagnostics and JAVAC_DETAIL_RE.match(line):
+            diagnostics[-1]['message'] += f"; {line.strip()}"
+    return diagnostics
+
+def compile_java_file(java_file, output_dir=None, classpath=None, cancel_event=None, diagnostics=None):
     """
     Compile a Java file.
-    
+
+    Args:
+        java_file (str): Source file to compile
+        output_dir (str): Directory for .class files (javac -d); next to the source if None
+        classpath (str): Classpath used to resolve dependencies (javac -cp)
+        diagnostics (list): If given, javac errors are appended to it (see parse_javac_errors)
+
     Returns:
         bool: True if compilation succeeded, False otherwise
     """
+    command = ['javac']
+    if output_dir:
+        command += ['-d', output_dir]
+    if classpath:
+        command += ['-cp', classpath]
+    command.append(java_file)
+
     try:
-        result = subprocess.run(
-            ['javac', java_file],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        with metrics.span('javac', file=java_file):
+            result = _run_process(command, timeout=30, cancel_event=cancel_event)
+        if result.returncode != 0 and diagnostics is not None:
+            diagnostics.extend(parse_javac_errors(result.stdout + result.stderr))
         return result.returncode == 0
+    except ValidationCancelled:
+        raise
     except Exception as e:
         print(f"Compilation error: {e}")
         return False
 
-def run_java_tests(test_file, fixed_file):
+def run_java_tests(test_file, fixed_file, build_dir=None, cancel_event=None, fail_fast=False, first_tests=None):
     """
     Run Java tests for a fixed file.
-    
+
+    Each call compiles into its own scratch build directory (on tmpfs when
+    available), so several validations can run at the same time without
+    sharing .class files. If cancel_event is set while javac/java is
+    running, the process is killed and ValidationCancelled is raised.
+
+    Tests run through TestRunner, which reports per-test outcome, timing,
+    message and stack trace; first_tests run before the others and
+    fail_fast stops at the first failing test. If either file does not
+    compile, the javac errors are returned as 'diagnostics'.
+
     Returns:
         dict: Test results
     """
+    own_build_dir = build_dir is None
+    if own_build_dir:
+        build_dir = tempfile.mkdtemp(prefix='llmfix_', dir=TEST_SCRATCH_DIR)
+    classpath = os.pathsep.join([build_dir, JUNIT_CLASSPATH])
+
     try:
         # Compile fixed file and test file
-        compile_success = compile_java_file(fixed_file)
+        diagnostics = []
+        compile_success = compile_java_file(fixed_file, output_dir=build_dir, classpath=classpath,
+                                            cancel_event=cancel_event, diagnostics=diagnostics)
         if not compile_success:
             return {
                 'compiled': False,
                 'tests_run': 0,
                 'passed': 0,
                 'failed': 0,
-                'errors': ['Compilation failed']
+                'errors': ['Compilation failed'],
+                'diagnostics': diagnostics
             }
-        
-        compile_test_success = compile_java_file(test_file)
+
+        compile_test_success = compile_java_file(test_file, output_dir=build_dir, classpath=classpath,
+                                                 cancel_event=cancel_event, diagnostics=diagnostics)
         if not compile_test_success:
             return {
                 'compiled': True,
                 'tests_run': 0,
                 'passed': 0,
                 'failed': 0,
-                'errors': ['Test compilation failed']
+                'errors': ['Test compilation failed'],
+                'diagnostics': diagnostics
             }
-        
+
         # Run tests (JUnit)
-        test_class = os.path.splitext(os.path.basename(test_file))[0]
-        result = subprocess.run(
-            ['java', '-cp', f'.:{os.path.dirname(test_file)}:/usr/share/java/junit4.jar', 
-             'org.junit.runner.JUnitCore', test_class],
-            capture_output=True,
-            text=True,
-            timeout=30,
-            cwd=os.path.dirname(test_file)
-        )
-        
+        test_class = java_class_name(test_file)
+        report_path = os.path.join(build_dir, 'junit_report.json')
+        try:
+            runner_classpath = os.pathsep.join([classpath, compile_helpers()])
+            command = ['java', '-cp', runner_classpath, 'TestRunner', '--report', report_path]
+            if fail_fast:
+                command.append('--fail-fast')
+            if first_tests:
+                command += ['--first', ','.join(first_tests)]
+        except JvmDaemonError as e:
+            print(f"Warning: TestRunner unavailable, using JUnitCore: {e}")
+            command = ['java', '-cp', classpath, 'org.junit.runner.JUnitCore']
+        command.append(test_class)
+
+        with metrics.span('junit', file=test_file):
+            result = _run_process(command, timeout=30, cwd=build_dir, cancel_event=cancel_event)
+
         # Parse test results
-        output = result.stdout + result.stderr
-        test_results = {
+        output = (result.stdout + result.stderr)[-TEST_OUTPUT_MAX_CHARS:]
+        try:
+            with open(report_path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            report = _parse_junit_output(output)
+
+        tests_run = report.get('tests_run', 0)
+        failed = report.get('failed', 0)
+        return {
             'compiled': True,
+            'tests_run': tests_run,
+            'passed': tests_run - failed,
+            'failed': failed,
+            'errors': report.get('errors', []),
+            'stopped_early': report.get('stopped_early', False),
+            'tests': report.get('tests', []),
+            'output': output,
+            # TestRunner/JUnitCore exit with 0 only when every test passed
+            'all_passed': result.returncode == 0 and tests_run > 0 and failed == 0
+        }
+
+    except ValidationCancelled:
+        raise
+    except Exception as e:
+        return {
+            'compiled': False,
             'tests_run': 0,
             'passed': 0,
             'failed': 0,
-            'errors': [],
-            'output': output
+            'errors': [str(e)]
         }
-        
-        # Simple parsing
-        if 'OK' in output:
-            test_results['passed'] = test_results['tests_run']
-        
-        return test_results
-        
+    finally:
+        if own_build_dir:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+def run_coverage_tests(sources, test_file, probe_class, timeout=30):
+    """
+    Compile instrumented sources together with the test and run every test
+    with per-test line coverage (TestRunner --coverage probe_class).
+
+    Args:
+        sources (dict): file name -> Java source (instrumented class + probe class)
+
+    Returns:
+        dict or None: TestRunner report whose 'tests' entries carry 'covered',
+                      None if compilation or the run failed
+    """
+    build_dir = tempfile.mkdtemp(prefix='llmfix_sbfl_', dir=TEST_SCRATCH_DIR)
+    classes_dir = os.path.join(build_dir, 'classes')
+    classpath = os.pathsep.join([classes_dir, JUNIT_CLASSPATH])
+    try:
+        os.makedirs(classes_dir)
+        paths = []
+        for name, code in sources.items():
+            paths.append(os.path.join(build_dir, 'src', name))
+            write_file(paths[-1], code)
+
+        with metrics.span('javac', file=test_file, coverage=True):
+            result = _run_process(['javac', '-d', classes_dir, '-cp', classpath] + paths, timeout=timeout)
+        if result.returncode != 0:
+            print(f"Coverage: instrumented sources do not compile for {os.path.basename(test_file)}")
+            return None
+        if not compile_java_file(test_file, output_dir=classes_dir, classpath=classpath):
+            return None
+
+        report_path = os.path.join(build_dir, 'coverage_report.json')
+        command = ['java', '-cp', os.pathsep.join([classpath, compile_helpers()]), 'TestRunner',
+                   '--report', report_path, '--coverage', probe_class, java_class_name(test_file)]
+        with metrics.span('junit', file=test_file, coverage=True):
+            _run_process(command, timeout=timeout, cwd=build_dir)
+        with open(report_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
     except Exception as e:
+        print(f"Coverage run failed for {os.path.basename(test_file)}: {e}")
+        return None
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+def _parse_junit_output(output):
+    """
+    JUnitCore 텍스트 출력의 요약 줄 ("OK (N tests)" / "Tests run: N,  Failures: M")
+    """
+    match = JUNIT_OK_RE.search(output)
+    if match:
+        return {'tests_run': int(match.group(1)), 'failed': 0}
+    match = JUNIT_FAILURES_RE.search(output)
+    if match:
+        return {'tests_run': int(match.group(1)), 'failed': int(match.group(2))}
+    return {'tests_run': 0, 'failed': 0, 'errors': ['Could not parse JUnit output']}
+
+def java_class_name(java_file):
+    """
+    Fully qualified class name of a Java source file, from its package declaration.
+    """
+    class_name = os.path.splitext(os.path.basename(java_file))[0]
+    match = PACKAGE_RE.search(read_file(java_file) or '')
+    return f"{match.group(1)}.{class_name}" if match else class_name
+
+def _find_indexed_test(test_filename):
+    global _test_index
+    with _test_index_lock:
+        if _test_index is None:
+            _test_index = {}
+            if os.path.isdir(TEST_DIR):
+                for path in iter_files(TEST_DIR, extension='Test.java'):
+                    _test_index.setdefault(os.path.basename(path), []).append(path)
+    paths = _test_index.get(test_filename)
+    return paths[0] if paths else None
+
+def find_test_file(file_path):
+    """
+    Return the path of the JUnit test matching a target file. The test is looked
+    up in the same package directory under TEST_DIR, then directly in TEST_DIR,
+    then anywhere under TEST_DIR
+    (e.g. data/target/com/acme/StringUtil.java -> data/test/com/acme/StringUtilTest.java).
+    If no test exists, the path in the same package directory is returned.
+    """
+    test_filename = os.path.basename(file_path).replace('.java', 'Test.java')
+    package_dir = os.path.dirname(output_relpath(file_path))
+    expected = os.path.join(TEST_DIR, package_dir, test_filename)
+    if os.path.exists(expected):
+        return expected
+
+    flat = os.path.join(TEST_DIR, test_filename)
+    if os.path.exists(flat):
+        return flat
+    return _find_indexed_test(test_filename) or expected
+
+def validate_fixed_file(original_file, fix_result=None, test_file=None):
+    """
+    Validate the fix generated for one original file against its JUnit test.
+    If fix_result holds several candidates, they are validated concurrently
+    and the first passing one wins. test_file overrides the test found by
+    find_test_file (e.g. tests submitted with a server job).
+
+    If fix_result says no fix was produced, nothing is run (a fixed file
+    left over from an earlier run must not be tested in its place).
+    """
+    filename = os.path.basename(original_file)
+    fixed_file = os.path.join(FIXES_OUTPUT_DIR, output_relpath(original_file))
+
+    # fixed_code는 테스트 전에 메모리에서 해제될 수 있으므로 fixed_file로 판단
+    if fix_result is not None and not fix_result.get('fixed_file'):
+        print(f"Skipping tests for {filename}: no fix was generated")
         return {
             'compiled': False,
             'tests_run': 0,
             'passed': 0,
             'failed': 0,
-            'errors': [str(e)]
+            'errors': ['No fix was generated']
+        }
+
+    # Find corresponding test file
+    if test_file is None:
+        test_file = find_test_file(original_file)
+
+    if not os.path.exists(test_file):
+        print(f"Warning: Test file not found for {filename}")
+        return {
+            'compiled': False,
+            'tests_run': 0,
+            'passed': 0,
+            'failed': 0,
+            'errors': ['Test file not found']
+        }
+
+    original_code = read_file(original_file) if PRIORITIZE_TESTS else None
+    candidates = (fix_result or {}).get('candidates')
+    if candidates and len(unique_candidates(candidates)) > 1:
+        print(f"Running tests for {filename} ({len(unique_candidates(candidates))} candidates)...")
+        return validate_candidates(test_file, fixed_file, fix_result, original_code=original_code)
+
+    print(f"Running tests for {filename}...")
+    first_tests = prioritized_tests(test_file, original_code, read_file(fixed_file)) if PRIORITIZE_TESTS else None
+    return validate(test_file, fixed_file, first_tests=first_tests)
+
+def validate(test_file, fixed_file, cancel_event=None, fail_fast=False, first_tests=None):
+    """
+    Run Java tests on the helper JVM when enabled, otherwise (or if the
+    daemon is unavailable) with separate javac/java subprocesses.
+    Failing tests are remembered so later validations of the same test
+    file run them first.
+
+    Raises:
+        ValidationCancelled: if cancel_event is set before or during the run
+    """
+    global _daemon_disabled, _daemon_failures
+    test_result = None
+    if USE_JVM_DAEMON and not _daemon_disabled:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ValidationCancelled()
+        try:
+            with metrics.span('jvm_daemon', file=test_file):
+                test_result = run_java_tests_daemon(test_file, fixed_file, fail_fast, first_tests, cancel_event)
+        except JvmDaemonError as e:
+            print(f"Warning: JVM daemon request failed, falling back to subprocess: {e}")
+            with _daemon_failures_lock:
+                _daemon_failures += 1
+                if _daemon_failures >= JVM_DAEMON_MAX_FAILURES:
+                    print(f"Warning: JVM daemon failed {_daemon_failures} times in a row, disabling it for this run")
+                    _daemon_disabled = True
+        else:
+            if test_result is None:
+                raise ValidationCancelled()
+            with _daemon_failures_lock:
+                _daemon_failures = 0
+    if test_result is None:
+        test_result = run_java_tests(test_file, fixed_file, cancel_event=cancel_event,
+                                     fail_fast=fail_fast, first_tests=first_tests)
+    record_outcome(test_file, test_result)
+    return test_result
+
+def _candidate_score(test_result):
+    return (bool(test_result.get('all_passed')), test_result.get('compiled', False),
+            test_result.get('passed', 0))
+
+def validate_candidates(test_file, fixed_file, fix_result, max_workers=None, original_code=None):
+    """
+    Validate fix candidates concurrently; as soon as one passes every test,
+    the remaining validations are cancelled.
+
+    With FAIL_FAST_CANDIDATES each candidate stops at its first failing
+    test (prioritised tests run first), so only candidates that survive
+    run the whole suite.
+
+    The selected candidate (the first passing one, otherwise the best
+    scoring one) is written to fixed_file.
+
+    Returns:
+        dict: test result of the selected candidate, plus 'selected_candidate'
+              and 'candidates' (code and outcome of every candidate)
+    """
+    if max_workers is None:
+        max_workers = CANDIDATE_WORKERS
+
+    candidates = fix_result['candidates']
+    to_validate = unique_candidates(candidates)
+    filename = os.path.basename(fixed_file)
+    scratch_dir = tempfile.mkdtemp(prefix='llmfix_candidates_', dir=TEST_SCRATCH_DIR)
+    cancel_event = threading.Event()
+    outcomes = {}
+    winner = None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {}
+            for candidate in to_validate:
+                # public class 이름과 파일명이 같아야 하므로 후보마다 별도 디렉토리 사용
+                candidate_file = os.path.join(scratch_dir, f"candidate_{candidate['index']}", filename)
+                write_file(candidate_file, candidate['fixed_code'])
+                first_tests = (prioritized_tests(test_file, original_code, candidate['fixed_code'])
+                               if PRIORITIZE_TESTS else None)
+                future = executor.submit(validate, test_file, candidate_file, cancel_event,
+                                         FAIL_FAST_CANDIDATES, first_tests)
+                futures[future] = candidate['index']
+
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    outcomes[index] = future.result()
+                except (CancelledError, ValidationCancelled):
+                    continue
+                except Exception as e:
+                    # 후보 하나의 javac/daemon/파일 오류가 나머지 후보 검증을 멈추지 않도록 후보 결과로 기록
+                    print(f"    Error validating candidate {index} for {filename}: {e}")
+                    outcomes[index] = {
+                        'compiled': False,
+                        'tests_run': 0,
+                        'passed': 0,
+                        'failed': 0,
+                        'errors': [str(e)]
+                    }
+                if winner is None and outcomes[index].get('all_passed'):
+                    winner = index
+                    cancel_event.set()
+                    for pending in futures:
+                        pending.cancel()
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if winner is None and outcomes:
+        winner = max(outcomes, key=lambda index: _candidate_score(outcomes[index]))
+
+    for candidate in candidates:
+        if candidate.get('fixed_code') is None:
+            candidate['status'] = 'invalid'
+        elif 'duplicate_of' in candidate:
+            candidate['status'] = 'duplicate'
+        elif candidate['index'] not in outcomes:
+            candidate['status'] = 'cancelled'
+        else:
+            outcome = outcomes[candidate['index']]
+            candidate['status'] = 'passed' if outcome.get('all_passed') else 'failed'
+            candidate['test'] = {
+                key: outcome.get(key)
+                for key in ('compiled', 'tests_run', 'passed', 'failed', 'errors', 'stopped_early')
+            }
+
+    if winner is None:
+        return {
+            'compiled': False,
+            'tests_run': 0,
+            'passed': 0,
+            'failed': 0,
+            'errors': ['No candidate could be validated'],
+            'candidates': candidates
         }
 
-def run_tests(fixed_files_info):
+    selected = next(c for c in candidates if c['index'] == winner)
+    write_file(fixed_file, selected['fixed_code'])
+    fix_result['fixed_code'] = selected['fixed_code']
+
+    test_result = dict(outcomes[winner])
+    if test_result.get('stopped_early'):
+        # 통과한 후보가 없으면 결과 JSON에 남길 선택 후보만 전체 suite로 다시 실행
+        test_result = validate(test_file, fixed_file, first_tests=prioritized_tests(test_file, None, None))
+    test_result['selected_candidate'] = winner
+    test_result['candidates'] = candidates
+    return test_result
+
+def run_tests(fixed_files_info, max_workers=None, on_result=None, test=None):
     """
     Run tests for all fixed files.
-    
+
+    Validations run concurrently on a pool of max_workers threads; each one
+    drives its own javac/java subprocesses in an isolated build directory.
+    An exception while testing one file is recorded in that file's result.
+
     Args:
         fixed_files_info (dict): Dictionary mapping original files to fix info
-        
+        max_workers (int): Number of concurrent validations (default: TEST_WORKERS)
+        on_result (callable): Called as on_result(original_file, test_result)
+            in the calling thread as soon as each file finishes
+        test (callable): test(original_file, fix_info) -> test_result (default: validate_fixed_file)
+
     Returns:
-        dict: Overall test results
+        dict: output_relpath(original_file) -> test_result. Keys are paths
+            relative to INPUT_DIR rather than basenames, because files in
+            different packages can share a name.
     """
+    if max_workers is None:
+        max_workers = TEST_WORKERS
+    if test is None:
+        test = validate_fixed_file
+
     all_results = {}
-    
-    for original_file, fix_info in fixed_files_info.items():
-        filename = os.path.basename(original_file)
-        fixed_file = os.path.join(FIXES_OUTPUT_DIR, filename)
-        
-        # Find corresponding test file
-        test_filename = filename.replace('.java', 'Test.java')
-        test_file = os.path.join(TEST_DIR, test_filename)
-        
-        if not os.path.exists(test_file):
-            print(f"Warning: Test file not found for {filename}")
-            all_results[filename] = {
-                'compiled': False,
-                'tests_run': 0,
-                'passed': 0,
-                'failed': 0,
-                'errors': ['Test file not found']
-            }
-            continue
-        
-        print(f"Running tests for {filename}...")
-        test_results = run_java_tests(test_file, fixed_file)
-        all_results[filename] = test_results
-    
-    return all_results
+    if not fixed_files_info:
+        return all_results
+
+    def timed_test(original_file, fix_info, submitted):
+        metrics.record_span('queue_wait', time.perf_counter() - submitted, queue='test', file=original_file)
+        return test(original_file, fix_info)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(timed_test, original_file, fix_info, time.perf_counter()): original_file
+            for original_file, fix_info in fixed_files_info.items()
+        }
+        for future in as_completed(futures):
+            original_file = futures[future]
+            try:
+                test_results = future.result()
+            except Exception as e:
+                # 한 파일의 오류가 pool 전체와 다른 파일의 결과를 잃게 하지 않도록 파일별 결과로 기록
+                print(f"Error running tests for {output_relpath(original_file)}: {e}")
+                test_results = {
+                    'compiled': False,
+                    'tests_run': 0,
+                    'passed': 0,
+                    'failed': 0,
+                    'errors': [str(e)]
+                }
+            all_results[output_relpath(original_file)] = test_results
+            if on_result is not None:
+                on_result(original_file, test_results)
+
+    return all_results
\ No newline at end of file
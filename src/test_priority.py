@@ -0,0 +1,87 @@
+import difflib
+import re
+import threading
+from src.file_utils import read_file
+from src.java_index import index_java
+
+# test file -> 마지막 검증에서 실패한 테스트 메서드 (실행 중 누적, 실패 순서 유지)
+_failing_tests = {}
+_failing_lock = threading.Lock()
+
+
+def record_outcome(test_file, test_result):
+    """
+    Remember which test methods failed (and which passed) for test_file.
+    """
+    tests = test_result.get('tests') or []
+    if not tests:
+        return
+    with _failing_lock:
+        failing = _failing_tests.setdefault(test_file, [])
+        for test in tests:
+            method = test.get('method')
+            if not method:
+                continue
+            if test.get('passed'):
+                if method in failing:
+                    failing.remove(method)
+            elif method not in failing:
+                failing.append(method)
+
+
+def changed_methods(original_code, fixed_code):
+    """
+    수정된 코드에서 변경된 줄을 포함하는 메서드 이름
+    """
+    original_lines = original_code.split('\n')
+    fixed_lines = fixed_code.split('\n')
+    changed = set()
+    matcher = difflib.SequenceMatcher(None, original_lines, fixed_lines, autojunk=False)
+    for tag, _, _, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            # 삭제만 된 경우에도 삭제 위치의 줄을 변경된 것으로 봄
+            changed.update(range(j1 + 1, max(j2, j1 + 1) + 1))
+
+    return {
+        method.name for method in index_java(fixed_code).methods
+        if any(method.start <= line <= method.end for line in changed)
+    }
+
+
+def relevant_tests(test_code, method_names):
+    """
+    method_names 중 하나라도 호출하는 테스트 메서드 이름 (파일 순서)
+    """
+    if not method_names:
+        return []
+    call_re = re.compile(r'\b(' + '|'.join(re.escape(name) for name in sorted(method_names)) + r')\s*\(')
+    lines = test_code.split('\n')
+    tests = []
+    for method in index_java(test_code).methods:
+        body = '\n'.join(lines[method.start - 1:method.end])
+        # 메서드 선언 줄(자기 자신의 이름)은 제외하고 본문에서만 찾음
+        body = body.split('{', 1)[1] if '{' in body else ''
+        if call_re.search(body):
+            tests.append(method.name)
+    return tests
+
+
+def prioritized_tests(test_file, original_code, fixed_code):
+    """
+    먼저 실행할 테스트 메서드: 이전에 실패한 테스트 → 수정된 메서드를 호출하는 테스트
+
+    Returns:
+        list: test method names (TestRunner --first)
+    """
+    with _failing_lock:
+        first = list(_failing_tests.get(test_file, []))
+
+    if original_code is not None and fixed_code is not None:
+        try:
+            test_code = read_file(test_file) or ''
+            for name in relevant_tests(test_code, changed_methods(original_code, fixed_code)):
+                if name not in first:
+                    first.append(name)
+        except Exception as e:
+            print(f"Warning: could not rank tests in {test_file}: {e}")
+    return first
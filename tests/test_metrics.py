@@ -0,0 +1,10 @@
+from metrics import MetricsRecorder
+
+
+def test_batch_wall_time_is_counted_once():
+    recorder = MetricsRecorder()
+    for _ in range(4):
+        recorder.record_llm_call(10, 50, 2.0, batched=True)
+    recorder.record_llm_batch(2.0, 4)
+
+    assert recorder.summary()['llm']['tokens_per_sec'] == 100.0
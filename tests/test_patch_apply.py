@@ -0,0 +1,49 @@
+import pytest
+
+from src.patch_apply import PatchApplyError, apply_edits, parse_edits
+
+CODE = """public class A {
+    int f() {
+        return 1;
+    }
+}"""
+
+
+def test_empty_original_inserts_before_start_line():
+    edits = parse_edits("""EDIT 3-3
+<<<<<<< ORIGINAL
+=======
+        int unused = 0;
+>>>>>>> FIXED
+""")
+    patched = apply_edits(CODE, edits)
+    assert patched.split('\n') == [
+        "public class A {",
+        "    int f() {",
+        "        int unused = 0;",
+        "        return 1;",
+        "    }",
+        "}",
+    ]
+
+
+def test_empty_original_out_of_bounds():
+    edits = parse_edits("""EDIT 9
+<<<<<<< ORIGINAL
+=======
+// x
+>>>>>>> FIXED
+""")
+    with pytest.raises(PatchApplyError):
+        apply_edits(CODE, edits)
+
+
+def test_replacement_with_original():
+    edits = parse_edits("""EDIT 3-3
+<<<<<<< ORIGINAL
+        return 1;
+=======
+        return 2;
+>>>>>>> FIXED
+""")
+    assert "return 2;" in apply_edits(CODE, edits)
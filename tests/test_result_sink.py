@@ -0,0 +1,47 @@
+import gzip
+import os
+
+from src.result_sink import STAGING_SUFFIX, JsonlResultSink, iter_records
+
+
+def _write_run(path, paths):
+    sink = JsonlResultSink(path)
+    for name in paths:
+        sink.append({'path': name})
+    sink.close()
+
+
+def test_gzip_sink_appends_one_member_per_run(tmp_path):
+    path = str(tmp_path / 'results.jsonl.gz')
+    _write_run(path, ['A.java'])
+    _write_run(path, ['B.java'])
+
+    assert not os.path.exists(path + STAGING_SUFFIX)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 2
+    assert [record['path'] for record in iter_records(path)] == ['A.java', 'B.java']
+
+
+def test_iter_records_stops_at_truncated_gzip_member(tmp_path):
+    path = str(tmp_path / 'results.jsonl.gz')
+    _write_run(path, ['A.java'])
+    with open(path, 'ab') as f:
+        f.write(gzip.compress(b'{"path":"B.java"}\n' * 100)[:20])
+
+    assert [record['path'] for record in iter_records(path)] == ['A.java']
+
+
+def test_crashed_gzip_run_is_recovered_on_next_open(tmp_path):
+    path = str(tmp_path / 'results.jsonl.gz')
+    _write_run(path, ['A.java'])
+    crashed = JsonlResultSink(path)
+    crashed.append({'path': 'B.java'})
+    crashed._raw.flush()
+
+    # 비정상 종료 상태에서도 staging 레코드까지 읽힘
+    assert [record['path'] for record in iter_records(path)] == ['A.java', 'B.java']
+
+    _write_run(path, ['C.java'])
+    assert [record['path'] for record in iter_records(path)] == ['A.java', 'B.java', 'C.java']
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 3